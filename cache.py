@@ -0,0 +1,90 @@
+#! /usr/bin/env python
+# -*- coding: utf-8 -*-
+
+from __future__ import unicode_literals
+import logging
+import functools
+from collections import OrderedDict
+
+
+logger = logging.getLogger('data')
+
+
+class LruCache(object):
+    '''
+    A bounded cache that discards the least recently used entry when it is full.
+    Keeps a count of hits, misses, and evictions so we can check how well it's working.
+    '''
+    def __init__(self, capacity):
+        self.capacity = capacity
+        self.entries = OrderedDict()
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+
+    def lookup(self, key, compute_value):
+        '''
+        Get the value for a key.  If it's not in the cache, call `compute_value`
+        to produce it and then save it to the cache.
+        '''
+        if key in self.entries:
+            self.hits += 1
+            # Move the entry to the end of the ordered dictionary, where
+            # the most recently used entries are kept.
+            value = self.entries.pop(key)
+            self.entries[key] = value
+            return value
+
+        self.misses += 1
+        value = compute_value()
+        if self.capacity > 0:
+            self.entries[key] = value
+            self._evict()
+        return value
+
+    def resize(self, capacity):
+        ''' Change the capacity of the cache, evicting entries if it has become too small. '''
+        self.capacity = capacity
+        self._evict()
+
+    def clear(self):
+        ''' Remove all entries from the cache and reset its statistics. '''
+        self.entries.clear()
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+
+    def _evict(self):
+        while len(self.entries) > max(self.capacity, 0):
+            self.entries.popitem(last=False)
+            self.evictions += 1
+
+    def log_stats(self, name):
+        ''' Log the hits, misses, and evictions of this cache, if it has been used. '''
+        lookups = self.hits + self.misses
+        if lookups > 0:
+            logger.info(
+                "Cache for %s: %d hits, %d misses, %d evictions (%.1f%% hit rate)",
+                name, self.hits, self.misses, self.evictions,
+                100 * float(self.hits) / lookups,
+            )
+
+
+def lru_cache(capacity):
+    '''
+    Memoize a function in a bounded LRU cache.  The arguments of the function must be hashable.
+    The cache is available as the `cache` attribute of the decorated function.
+    '''
+
+    def decorator(func):
+
+        cache = LruCache(capacity)
+
+        @functools.wraps(func)
+        def lookup_in_cache(*args):
+            return cache.lookup(args, lambda: func(*args))
+
+        lookup_in_cache.cache = cache
+        return lookup_in_cache
+
+    return decorator
@@ -5,6 +5,8 @@ from __future__ import unicode_literals
 import logging
 from peewee import fn
 
+from dump._urls import standardize_url
+from dump._page_types import load_page_type_lookup
 from models import TaskPeriod, LocationEvent, LocationVisit
 
 
@@ -38,13 +40,22 @@ NEW_PAGE_EVENTS = [
 
 def create_location_visit(
         compute_index, task_period, user_id,
-        activating_event, deactivating_event):
+        activating_event, deactivating_event, page_type_lookup=None):
     '''
     Create a record of the start and end of a visit to a URL within a tab.
     Note that while an `activating_event` will necessarily be associated with the URL
     and page title for the visited page, the deactivating event may be associated
     with a different URL and page.
+    If a `page_type_lookup` is provided, it's used to save the page type of the URL.
     '''
+    standard_url = standardize_url(activating_event.url)
+    page_type = None
+    is_redirect = None
+    if page_type_lookup is not None and standard_url in page_type_lookup:
+        url_info = page_type_lookup[standard_url]
+        page_type = url_info['main_type']
+        is_redirect = url_info['redirect']
+
     LocationVisit.create(
         compute_index=compute_index,
         user_id=user_id,
@@ -61,10 +72,13 @@ def create_location_visit(
         url=activating_event.url,
         title=activating_event.title,
         tab_id=activating_event.tab_id,
+        standard_url=standard_url,
+        page_type=page_type,
+        is_redirect=is_redirect,
     )
 
 
-def compute_location_visits(task_compute_index=None):
+def compute_location_visits(task_compute_index=None, page_type_lookup=None):
 
     # Create a new index for this computation
     last_compute_index = LocationVisit.select(fn.Max(LocationVisit.compute_index)).scalar() or 0
@@ -132,6 +146,7 @@ def compute_location_visits(task_compute_index=None):
                                 user_id=user_id,
                                 activating_event=active_tab_latest_url_event,
                                 deactivating_event=event,
+                                page_type_lookup=page_type_lookup,
                             )
                             active_tab_latest_url_event = event
 
@@ -144,6 +159,7 @@ def compute_location_visits(task_compute_index=None):
                             user_id=user_id,
                             activating_event=active_tab_latest_url_event,
                             deactivating_event=event,
+                            page_type_lookup=page_type_lookup,
                         )
                         active_tab_id = None
                         active_tab_latest_url_event = None
@@ -159,6 +175,7 @@ def compute_location_visits(task_compute_index=None):
                             user_id=user_id,
                             activating_event=active_tab_latest_url_event,
                             deactivating_event=event,
+                            page_type_lookup=page_type_lookup,
                         )
 
                     # Set the new active tab
@@ -166,8 +183,14 @@ def compute_location_visits(task_compute_index=None):
                     active_tab_latest_url_event = event
 
 
-def main(task_compute_index, *args, **kwargs):
-    compute_location_visits(task_compute_index)
+def main(task_compute_index, page_types_json_filename, *args, **kwargs):
+
+    # Load a dictionary that describes the page types for URLs visited, if one was given
+    page_type_lookup = None
+    if page_types_json_filename is not None:
+        page_type_lookup = load_page_type_lookup(page_types_json_filename)
+
+    compute_location_visits(task_compute_index, page_type_lookup)
 
 
 def configure_parser(parser):
@@ -177,3 +200,12 @@ def configure_parser(parser):
         type=int,
         help="Which version of task periods to match visits to (default: latest)."
     )
+    parser.add_argument(
+        '--page-types-json-filename',
+        help=(
+            "Name of a JSON file that maps URLs to file types.  If given, the page type " +
+            "of each visit is saved with it.  The format of each row should be:" +
+            "\"<url>\": {\"main_type\": \"<main type>\", \"types\": " +
+            "[<list of all relevant types>]}"
+        )
+    )
@@ -5,10 +5,10 @@ from __future__ import unicode_literals
 import logging
 import itertools
 from peewee import fn
-import json
 from progressbar import ProgressBar, Percentage, Bar, ETA, Counter, RotatingMarker
 
 from dump._urls import standardize_url
+from dump._page_types import load_page_type_lookup
 from models import LocationVisit, NavigationVertex, NavigationEdge
 
 
@@ -101,7 +101,7 @@ def compute_navigation_graph(
             for visit in participant_concern_visits:
 
                 # Get the type of the page visited
-                standardized_url = standardize_url(visit.url)
+                standardized_url = visit.standard_url or standardize_url(visit.url)
                 if standardized_url in page_type_lookup:
                     url_info = page_type_lookup[standardized_url]
                     page_type = url_info['main_type']
@@ -221,8 +221,7 @@ def compute_navigation_graph(
 def main(page_types_json_filename, exclude_users, show_progress, concern_index, *args, **kwargs):
 
     # Load a dictionary that describes the page types for URLs visited
-    with open(page_types_json_filename) as page_types_file:
-        page_type_lookup = json.load(page_types_file)
+    page_type_lookup = load_page_type_lookup(page_types_json_filename)
 
     compute_navigation_graph(page_type_lookup, exclude_users, show_progress, concern_index)
 
@@ -4,15 +4,36 @@
 from __future__ import unicode_literals
 import logging
 from peewee import fn
-import json
 from nltk.util import ngrams as nltk_compute_ngrams
 
 from dump._urls import standardize_url
-from models import LocationVisit, NavigationNgram
+from dump._page_types import load_page_type_lookup
+from models import LocationVisit, NavigationNgram, BatchInserter
 
 
 logger = logging.getLogger('data')
 
+# N-grams are saved in batches of this many rows.  Each row has a handful of columns,
+# so this keeps each insert well under SQLite's limit on the number of bound parameters.
+NGRAM_BATCH_SIZE = 100
+
+
+def _get_page_types(visits, page_type_lookup):
+    '''
+    Yield the page type of each visit in sequence.
+    If a visit is to a redirect, then skip it.  For all intents and purposes,
+    someone is traveling between two the page type before and after it.
+    '''
+    for visit in visits:
+        url = visit.standard_url or standardize_url(visit.url)
+        if url in page_type_lookup:
+            url_info = page_type_lookup[url]
+            if not url_info['redirect']:
+                yield url_info['main_type']
+        else:
+            logger.warn("URL %s not in page type lookup.  Giving it 'Unknown' type", url)
+            yield "Unknown"
+
 
 def compute_navigation_ngrams(length, page_type_lookup):
     '''
@@ -31,53 +52,41 @@ def compute_navigation_ngrams(length, page_type_lookup):
     participant_ids = set([visit.user_id for visit in visits])
     concern_indexes = set([visit.concern_index for visit in visits])
 
+    # All n-grams are saved in one transaction, in batches of rows.
+    ngram_inserter = BatchInserter(NavigationNgram, batch_size=NGRAM_BATCH_SIZE)
+
     # Go through every concern for every participant.  For each page they visit,
     # increment the visits to a vertex.  For each transition from one page to the next,
     # increment the occurrence of a transition between two page types.
-    for participant_id in participant_ids:
-        for concern_index in concern_indexes:
-
-            participant_concern_visits = visits.where(
-                LocationVisit.user_id == participant_id,
-                LocationVisit.concern_index == concern_index,
-            ).order_by(LocationVisit.start.asc())
-
-            # Create a list of unique URLs that each participant visited
-            urls = [visit.url for visit in participant_concern_visits]
-            standardized_urls = [standardize_url(url) for url in urls]
-
-            # Create a list of all page types visited.
-            # If this is a redirect, then skip it.  For all intents and purposes,
-            # someone is traveling between two the page type before and after it.
-            page_types = []
-            for url in standardized_urls:
-                if url in page_type_lookup:
-                    url_info = page_type_lookup[url]
-                    if not url_info['redirect']:
-                        page_types.append(url_info['main_type'])
-                else:
-                    logger.warn("URL %s not in page type lookup.  Giving it 'Unknown' type", url)
-                    page_types.append("Unknown")
-
-            # Compute n-grams using NLTK command
-            ngrams = nltk_compute_ngrams(page_types, length)
-
-            # Save each n-gram to the database
-            for ngram_tuple in ngrams:
-                NavigationNgram.create(
-                    compute_index=compute_index,
-                    user_id=participant_id,
-                    concern_index=concern_index,
-                    length=length,
-                    ngram=", ".join(ngram_tuple),
-                )
+    with NavigationNgram._meta.database.atomic(), ngram_inserter:
+
+        for participant_id in participant_ids:
+            for concern_index in concern_indexes:
+
+                participant_concern_visits = visits.where(
+                    LocationVisit.user_id == participant_id,
+                    LocationVisit.concern_index == concern_index,
+                ).order_by(LocationVisit.start.asc())
+
+                # Compute n-grams using NLTK command.  Page types are streamed from the
+                # visits into the sliding window, and each n-gram straight to the inserter.
+                page_types = _get_page_types(participant_concern_visits, page_type_lookup)
+                ngrams = nltk_compute_ngrams(page_types, length)
+
+                for ngram_tuple in ngrams:
+                    ngram_inserter.insert({
+                        'compute_index': compute_index,
+                        'user_id': participant_id,
+                        'concern_index': concern_index,
+                        'length': length,
+                        'ngram': ", ".join(ngram_tuple),
+                    })
 
 
 def main(page_types_json_filename, min_length, max_length, *args, **kwargs):
 
     # Load a dictionary that describes the page types for URLs visited
-    with open(page_types_json_filename) as page_types_file:
-        page_type_lookup = json.load(page_types_file)
+    page_type_lookup = load_page_type_lookup(page_types_json_filename)
 
     # Compute n-grams for all requested lengths of n-gram
     for length in range(min_length, max_length + 1):
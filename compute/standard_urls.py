@@ -0,0 +1,79 @@
+#! /usr/bin/env python
+# -*- coding: utf-8 -*-
+
+from __future__ import unicode_literals
+import logging
+
+from dump._urls import standardize_urls
+from dump._page_types import load_page_type_lookup
+from models import LocationVisit, bump_table_version
+
+
+logger = logging.getLogger('data')
+
+
+def compute_standard_urls(page_type_lookup=None, process_count=None):
+    '''
+    Fill in the standardized URLs of all location visits that don't have them yet
+    (i.e., visits computed before standardized URLs were saved with each visit).
+    If a `page_type_lookup` is provided, the page types of these visits are filled in too.
+    Returns the number of distinct URLs that were standardized.
+    '''
+    urls = [
+        url for (url,) in
+        LocationVisit
+        .select(LocationVisit.url)
+        .where(LocationVisit.standard_url >> None)
+        .distinct()
+        .tuples()
+    ]
+    standard_urls = standardize_urls(urls, process_count=process_count)
+
+    # Update all visits to each URL at once.
+    with LocationVisit._meta.database.atomic():
+        if len(standard_urls) > 0:
+            bump_table_version(LocationVisit)
+        for url, standard_url in standard_urls.items():
+
+            updated_fields = {'standard_url': standard_url}
+            if page_type_lookup is not None and standard_url in page_type_lookup:
+                url_info = page_type_lookup[standard_url]
+                updated_fields['page_type'] = url_info['main_type']
+                updated_fields['is_redirect'] = url_info['redirect']
+
+            LocationVisit.update(**updated_fields).where(
+                LocationVisit.url == url,
+                LocationVisit.standard_url >> None,
+            ).execute()
+
+    return len(standard_urls)
+
+
+def main(page_types_json_filename, process_count, *args, **kwargs):
+
+    # Load a dictionary that describes the page types for URLs visited, if one was given
+    page_type_lookup = None
+    if page_types_json_filename is not None:
+        page_type_lookup = load_page_type_lookup(page_types_json_filename)
+
+    url_count = compute_standard_urls(page_type_lookup, process_count)
+    logger.info("Saved standardized URLs for visits to %d distinct URLs", url_count)
+
+
+def configure_parser(parser):
+    parser.description = "Save standardized URLs (and page types) for location visits " +\
+        "computed before they were saved with each visit."
+    parser.add_argument(
+        '--page-types-json-filename',
+        help=(
+            "Name of a JSON file that maps URLs to file types.  If given, the page type " +
+            "of each visit is saved with it.  The format of each row should be:" +
+            "\"<url>\": {\"main_type\": \"<main type>\", \"types\": " +
+            "[<list of all relevant types>]}"
+        )
+    )
+    parser.add_argument(
+        '--process-count',
+        type=int,
+        help="How many processes to standardize URLs with (default: one per CPU)."
+    )
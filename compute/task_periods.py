@@ -4,6 +4,7 @@
 from __future__ import unicode_literals
 import logging
 from peewee import fn
+from playhouse.shortcuts import case
 import datetime
 
 from models import QuestionEvent, TaskPeriod
@@ -107,6 +108,28 @@ def _get_concern_index(user_id, task_index):
     return (offset + task_index) % CONCERN_COUNT
 
 
+def _sql_modulo(dividend, divisor):
+    # The modulo operator is '%' in both SQLite and Postgres.  But peewee writes it into queries
+    # as-is, where the Postgres driver mistakes it for a parameter placeholder.  So we compute
+    # it with integer division instead, which gives the same result for non-negative integers.
+    return dividend - (dividend / divisor) * divisor
+
+
+def concern_index_expression(user_id, task_index):
+    '''
+    Make a SQL expression for the index of the concern assigned to a user for a task, which
+    gives the same result as `_get_concern_index`.  `user_id` and `task_index` are fields (or
+    other expressions) that hold the user ID and task index, such as `Question.user_id` and
+    `Question.question_index`.  The expression can be selected, or used to filter or group
+    records in the database, e.g.:
+
+        Question.select().where(concern_index_expression(
+            Question.user_id, Question.question_index) == 2)
+    '''
+    offset = _sql_modulo(user_id, CONCERN_COUNT)
+    return case(task_index, ((0, -1),), _sql_modulo(offset + task_index, CONCERN_COUNT))
+
+
 def compute_task_periods(discard_periods=DISCARD_TASK_PERIODS, extra_periods=EXTRA_TASK_PERIODS):
 
     # Create a new index for this computation
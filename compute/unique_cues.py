@@ -5,11 +5,84 @@ from __future__ import unicode_literals
 import logging
 from peewee import fn
 import json
+import io
+import re
+from collections import defaultdict
 
-from models import UniqueCue
+from models import UniqueCue, BatchInserter
 
 
 logger = logging.getLogger('data')
+UNIQUE_CUE_BATCH_SIZE = 100
+CUE_FILE_CHUNK_SIZE = 64 * 1024
+JSON_WHITESPACE = re.compile(r'[ \t\n\r]*')
+
+
+def _iterate_json_array(json_file, chunk_size=CUE_FILE_CHUNK_SIZE):
+    '''
+    Yield the elements of a JSON array from a file one at a time, reading only as much
+    of the file as is needed to decode the next element.  This lets us read very large
+    arrays without loading the whole file into memory.
+    '''
+    decoder = json.JSONDecoder()
+    buffer = ''
+    position = 0
+    end_of_file = False
+    array_started = False
+    expecting_value = True
+
+    while True:
+
+        # Skip whitespace between tokens.  If we've reached the end of the buffer,
+        # then read the next chunk of the file before continuing.
+        position = JSON_WHITESPACE.match(buffer, position).end()
+        if position == len(buffer):
+            if end_of_file:
+                raise ValueError("File ended before the end of the JSON array.")
+            chunk = json_file.read(chunk_size)
+            buffer = buffer[position:] + chunk
+            position = 0
+            end_of_file = (len(chunk) == 0)
+            continue
+
+        character = buffer[position]
+        if not array_started:
+            if character != '[':
+                raise ValueError("Expected file to contain a JSON array.")
+            array_started = True
+            position += 1
+        elif character == ']':
+            return
+        elif character == ',' and not expecting_value:
+            expecting_value = True
+            position += 1
+        elif expecting_value:
+
+            # An element might continue past the end of the buffer.  If it can't be
+            # decoded yet, or if it isn't followed by a ',' or ']' in the buffer (so it
+            # could be a truncated number or literal), read more of the file and try again.
+            try:
+                element, element_end = decoder.raw_decode(buffer, position)
+                next_token_position = JSON_WHITESPACE.match(buffer, element_end).end()
+                element_complete = buffer[next_token_position:next_token_position + 1] in\
+                    (',', ']')
+            except ValueError:
+                element_end = None
+                element_complete = False
+            if not element_complete and not end_of_file:
+                chunk = json_file.read(chunk_size)
+                buffer = buffer[position:] + chunk
+                position = 0
+                end_of_file = (len(chunk) == 0)
+                continue
+            elif element_end is None:
+                raise ValueError("Could not decode JSON array element at end of file.")
+
+            yield element
+            position = element_end
+            expecting_value = False
+        else:
+            raise ValueError("Unexpected character in JSON array: %s" % character)
 
 
 def compute_unique_cues(cues):
@@ -18,50 +91,32 @@ def compute_unique_cues(cues):
     last_compute_index = UniqueCue.select(fn.Max(UniqueCue.compute_index)).scalar() or 0
     compute_index = last_compute_index + 1
 
-    # Get the distinct participant IDs and concern indexes
-    participant_ids = set([cue['participant_id'] for cue in cues])
-
-    # Go through every concern for every participant.  Find the number of URLs
-    # they visited that no one else visited.
-    for participant_id in participant_ids:
-
-        participant_cues = filter(lambda cue: cue['participant_id'] == participant_id, cues)
-        participant_cue_names = [cue['cue'] for cue in participant_cues]
-
-        others_cues = filter(lambda cue: cue['participant_id'] != participant_id, cues)
-        others_cue_names = [cue['cue'] for cue in others_cues]
-
-        # Compute the URLs that this participant visited uniquely, and that they share with others
-        unique_participant_cue_names = set(participant_cue_names) - set(others_cue_names)
-        shared_participant_cue_names =\
-            set(participant_cue_names) - set(unique_participant_cue_names)
-
-        # Save all cues that the participant visited to the database, including
-        # whether they visited them uniquely.
-        for cue_name in unique_participant_cue_names:
-            UniqueCue.create(
-                compute_index=compute_index,
-                participant_id=participant_id,
-                cue=cue_name,
-                unique=True,
-            )
-
-        for cue_name in shared_participant_cue_names:
-            UniqueCue.create(
-                compute_index=compute_index,
-                participant_id=participant_id,
-                cue=cue_name,
-                unique=False,
-            )
+    # In one pass over the cues, find the set of participants who mentioned each cue.
+    cue_participants = defaultdict(set)
+    for cue in cues:
+        cue_participants[cue['cue']].add(cue['participant_id'])
+
+    # A cue is unique for a participant if no one else mentioned it.  Save all cues
+    # that each participant mentioned to the database, including whether they
+    # mentioned them uniquely.
+    cue_inserter = BatchInserter(UniqueCue, batch_size=UNIQUE_CUE_BATCH_SIZE)
+    with UniqueCue._meta.database.atomic(), cue_inserter:
+        for cue_name, participant_ids in cue_participants.items():
+            unique = len(participant_ids) == 1
+            for participant_id in participant_ids:
+                cue_inserter.insert({
+                    'compute_index': compute_index,
+                    'participant_id': participant_id,
+                    'cue': cue_name,
+                    'unique': unique,
+                })
 
 
 def main(cues_json_filename, *args, **kwargs):
 
-    # Load a list of all of the cues that participants mentioned
-    with open(cues_json_filename) as cues_file:
-        cues = json.load(cues_file)
-
-    compute_unique_cues(cues)
+    # Read the cues that participants mentioned one at a time from the file
+    with io.open(cues_json_filename, encoding='utf-8') as cues_file:
+        compute_unique_cues(_iterate_json_array(cues_file))
 
 
 def configure_parser(parser):
@@ -4,13 +4,15 @@
 from __future__ import unicode_literals
 import logging
 from peewee import fn
-import json
+from collections import defaultdict
 
 from dump._urls import standardize_url
-from models import LocationVisit, UniqueUrl
+from dump._page_types import load_page_type_lookup
+from models import LocationVisit, UniqueUrl, BatchInserter
 
 
 logger = logging.getLogger('data')
+UNIQUE_URL_BATCH_SIZE = 100
 
 
 def compute_unique_urls(page_type_lookup, exclude_users=None):
@@ -23,57 +25,41 @@ def compute_unique_urls(page_type_lookup, exclude_users=None):
 
     # Fetch the set of visits for the most recently computed visits
     visit_compute_index = LocationVisit.select(fn.Max(LocationVisit.compute_index)).scalar()
-    visits = LocationVisit.select().where(
+    visits = LocationVisit.select(
+        LocationVisit.user_id, LocationVisit.url, LocationVisit.standard_url
+    ).where(
         LocationVisit.compute_index == visit_compute_index,
         LocationVisit.user_id.not_in(exclude_users),
     )
 
-    # Get the distinct participant IDs and concern indexes
-    participant_ids = set([visit.user_id for visit in visits])
-
-    # Go through every concern for every participant.  Find the number of URLs
-    # they visited that no one else visited.
-    for participant_id in participant_ids:
-
-        participant_concern_visits = visits.where(LocationVisit.user_id == participant_id)
-        others_visits = visits.where(LocationVisit.user_id != participant_id)
-
-        # Create a list of unique URLs that this participant visited
-        participant_urls = [visit.url for visit in participant_concern_visits]
-        participant_standardized_urls = [standardize_url(url) for url in participant_urls]
-
-        # Create a list of unique URLs that all others visited
-        others_urls = [visit.url for visit in others_visits]
-        others_standardized_urls = [standardize_url(url) for url in others_urls]
-
-        # Compute the URLs that this participant visited uniquely, and that they share with others
-        unique_participant_urls = set(participant_standardized_urls) - set(others_standardized_urls)
-        shared_participant_urls = set(participant_standardized_urls) - set(unique_participant_urls)
-
-        # Save all URLs that the participant visited to the database, including
-        # whether they visited them uniquely.
-        for url in unique_participant_urls:
-            UniqueUrl.create(
-                compute_index=compute_index,
-                user_id=participant_id,
-                url=url,
-                unique=True,
-            )
-
-        for url in shared_participant_urls:
-            UniqueUrl.create(
-                compute_index=compute_index,
-                user_id=participant_id,
-                url=url,
-                unique=False,
-            )
+    # Build an inverted index from each standardized URL to the set of participants
+    # who visited it.  This reads and standardizes each visit's URL only once.
+    # Visits computed before standardized URLs were saved with them need to be standardized here.
+    url_users = defaultdict(set)
+    for visit in visits:
+        standard_url = visit.standard_url or standardize_url(visit.url)
+        url_users[standard_url].add(visit.user_id)
+
+    # A URL is unique for a participant if they were the only one to visit it.
+    # Save all URLs that each participant visited to the database, including
+    # whether they visited them uniquely.
+    url_inserter = BatchInserter(UniqueUrl, batch_size=UNIQUE_URL_BATCH_SIZE)
+    with UniqueUrl._meta.database.atomic(), url_inserter:
+        for url, user_ids in url_users.items():
+            unique = len(user_ids) == 1
+            for user_id in user_ids:
+                url_inserter.insert({
+                    'compute_index': compute_index,
+                    'user_id': user_id,
+                    'url': url,
+                    'unique': unique,
+                })
 
 
 def main(page_types_json_filename, exclude_users, *args, **kwargs):
 
     # Load a dictionary that describes the page types for URLs visited
-    with open(page_types_json_filename) as page_types_file:
-        page_type_lookup = json.load(page_types_file)
+    page_type_lookup = load_page_type_lookup(page_types_json_filename)
 
     compute_unique_urls(page_type_lookup, exclude_users)
 
@@ -0,0 +1,123 @@
+#! /usr/bin/env python
+# -*- coding: utf-8 -*-
+
+from __future__ import unicode_literals
+import logging
+from peewee import fn
+import numpy as np
+
+from dump._urls import standardize_url
+from models import LocationVisit, UrlDocumentFrequency, BatchInserter
+
+
+logger = logging.getLogger('data')
+URL_DOCUMENT_FREQUENCY_BATCH_SIZE = 100
+
+
+def _count_distinct_values_per_url(url_codes, values, url_count):
+    '''
+    Count how many distinct values (e.g., users or concerns) occur alongside each URL.
+    `url_codes` and `values` are parallel arrays with one element per visit.  URL codes
+    should be integers from 0 to (url_count - 1).  Returns an array of counts indexed by URL code.
+    '''
+    # Encode the values as integers from 0 to (value_count - 1)
+    distinct_values, value_codes = np.unique(values, return_inverse=True)
+    value_count = len(distinct_values)
+
+    # Combine each URL and value into a single integer key, so that we can find all
+    # distinct pairs of URLs and values with one call to `unique`.  Then count how
+    # many distinct pairs there are for each URL.
+    pair_keys = np.unique(url_codes * value_count + value_codes)
+    return np.bincount(pair_keys // value_count, minlength=url_count)
+
+
+def compute_url_document_frequencies(exclude_users=None):
+    '''
+    Compute how many participants and concerns each standardized URL was visited for.
+    Each URL is also given a "distinctiveness" score, like the inverse document frequency
+    (IDF) of a term in a corpus: the log of the number of participants divided by the
+    number of participants who visited the URL.  A URL that only one participant visited
+    has the highest score, and a URL that everyone visited has a score of 0.
+    '''
+    exclude_users = [] if exclude_users is None else exclude_users
+
+    # Create a new index for this computation
+    last_compute_index = UrlDocumentFrequency.select(
+        fn.Max(UrlDocumentFrequency.compute_index)
+    ).scalar() or 0
+    compute_index = last_compute_index + 1
+
+    # Fetch the set of visits for the most recently computed visits
+    visit_compute_index = LocationVisit.select(fn.Max(LocationVisit.compute_index)).scalar()
+    visits = (
+        LocationVisit
+        .select(
+            LocationVisit.user_id, LocationVisit.concern_index,
+            LocationVisit.url, LocationVisit.standard_url,
+        )
+        .where(
+            LocationVisit.compute_index == visit_compute_index,
+            LocationVisit.user_id.not_in(exclude_users),
+        )
+        .tuples()
+    )
+
+    # Encode each standardized URL as an integer, in the order they are first seen.
+    # Collect parallel lists of the URL, user, and concern of each visit.
+    # Visits computed before standardized URLs were saved with them need to be standardized here.
+    url_code_lookup = {}
+    urls = []
+    url_codes = []
+    user_ids = []
+    concern_indexes = []
+    for user_id, concern_index, url, standard_url in visits:
+        standardized_url = standard_url or standardize_url(url)
+        if standardized_url not in url_code_lookup:
+            url_code_lookup[standardized_url] = len(urls)
+            urls.append(standardized_url)
+        url_codes.append(url_code_lookup[standardized_url])
+        user_ids.append(user_id)
+        concern_indexes.append(concern_index)
+
+    if len(urls) == 0:
+        return
+
+    url_codes = np.array(url_codes, dtype=np.int64)
+    user_ids = np.array(user_ids, dtype=np.int64)
+    concern_indexes = np.array(concern_indexes, dtype=np.int64)
+
+    # Count the distinct users and concerns for each URL, and score each URL
+    # by how few of all participants visited it.
+    user_counts = _count_distinct_values_per_url(url_codes, user_ids, len(urls))
+    concern_counts = _count_distinct_values_per_url(url_codes, concern_indexes, len(urls))
+    total_user_count = len(np.unique(user_ids))
+    distinctiveness_scores = np.log(float(total_user_count) / user_counts)
+
+    url_inserter = BatchInserter(
+        UrlDocumentFrequency, batch_size=URL_DOCUMENT_FREQUENCY_BATCH_SIZE)
+    with UrlDocumentFrequency._meta.database.atomic(), url_inserter:
+        for url_code, url in enumerate(urls):
+            url_inserter.insert({
+                'compute_index': compute_index,
+                'url': url,
+                # Convert from numpy types so the values can be saved by Peewee
+                'user_count': int(user_counts[url_code]),
+                'concern_count': int(concern_counts[url_code]),
+                'distinctiveness': float(distinctiveness_scores[url_code]),
+            })
+
+
+def main(exclude_users, *args, **kwargs):
+    compute_url_document_frequencies(exclude_users)
+
+
+def configure_parser(parser):
+    parser.description = "Compute how many participants and concerns each URL was visited for, " +\
+        "and how distinctive it is of the participants who visited it."
+    parser.add_argument(
+        "--exclude-users",
+        default=[1, 2, 3, 4],
+        nargs='+',
+        type=int,
+        help="The IDs of participants to exclude from this analysis(default: %(default)s)",
+    )
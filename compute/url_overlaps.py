@@ -0,0 +1,295 @@
+#! /usr/bin/env python
+# -*- coding: utf-8 -*-
+
+from __future__ import unicode_literals
+import logging
+from collections import defaultdict
+import itertools
+import os.path
+from peewee import fn
+import numpy as np
+
+from dump._urls import standardize_url
+from models import LocationVisit
+
+
+logger = logging.getLogger('data')
+
+# For cohorts with at least this many participants, similarities are estimated with
+# MinHash instead of computed exactly, as the exact matrix grows quadratically.
+MINHASH_MIN_PARTICIPANTS = 200
+MINHASH_PERMUTATION_COUNT = 128
+MINHASH_BAND_COUNT = 32
+MINHASH_SEED = 0
+
+# A Mersenne prime larger than the number of distinct URLs we'll ever see.
+# Random hash functions are built as (a * x + b) mod this prime.
+MINHASH_PRIME = (1 << 31) - 1
+
+
+def _fetch_participant_url_codes(visit_compute_index, exclude_users):
+    '''
+    Fetch the set of standardized URLs each participant visited, encoding each URL as an integer.
+    Returns a sorted list of participant IDs, and a parallel list of sets of URL codes.
+    '''
+    visits = (
+        LocationVisit
+        .select(LocationVisit.user_id, LocationVisit.url, LocationVisit.standard_url)
+        .where(
+            LocationVisit.compute_index == visit_compute_index,
+            LocationVisit.user_id.not_in(exclude_users),
+        )
+        .tuples()
+    )
+
+    # Visits computed before standardized URLs were saved with them need to be standardized here.
+    url_code_lookup = {}
+    user_url_codes = defaultdict(set)
+    for user_id, url, standard_url in visits:
+        standardized_url = standard_url or standardize_url(url)
+        if standardized_url not in url_code_lookup:
+            url_code_lookup[standardized_url] = len(url_code_lookup)
+        user_url_codes[user_id].add(url_code_lookup[standardized_url])
+
+    user_ids = sorted(user_url_codes.keys())
+    return user_ids, [user_url_codes[user_id] for user_id in user_ids]
+
+
+def compute_exact_similarities(url_code_sets):
+    '''
+    Compute the Jaccard similarity between every pair of URL sets.
+    This builds a participant-by-URL incidence matrix, and finds the size of the
+    intersection of every pair of sets with one matrix product.
+    '''
+    url_count = max([max(codes) for codes in url_code_sets if len(codes) > 0] or [-1]) + 1
+    incidence = np.zeros((len(url_code_sets), url_count), dtype=np.int32)
+    for row_index, codes in enumerate(url_code_sets):
+        incidence[row_index, list(codes)] = 1
+
+    intersection_sizes = incidence.dot(incidence.T)
+    set_sizes = np.diag(intersection_sizes)
+    union_sizes = set_sizes[:, np.newaxis] + set_sizes[np.newaxis, :] - intersection_sizes
+
+    # Two empty sets have nothing in common, so we leave their similarity at 0.
+    similarities = np.zeros(intersection_sizes.shape, dtype=np.float32)
+    nonempty_unions = union_sizes > 0
+    similarities[nonempty_unions] =\
+        intersection_sizes[nonempty_unions] / union_sizes[nonempty_unions].astype(np.float32)
+    return similarities
+
+
+def _upper_triangle_entries(similarities):
+    '''
+    Convert a symmetric similarity matrix to its non-zero entries on and above the diagonal,
+    as parallel arrays of rows, columns, and similarities.
+    '''
+    rows, columns = np.nonzero(np.triu(similarities))
+    return rows.astype(np.int32), columns.astype(np.int32), similarities[rows, columns]
+
+
+def compute_minhash_signatures(url_code_sets, permutation_count, seed=MINHASH_SEED):
+    '''
+    Compute a MinHash signature for each set of URL codes.  Each row of the returned
+    array is the signature for one set.  The fraction of positions at which two signatures
+    agree is an unbiased estimate of the Jaccard similarity of their sets.
+    '''
+    random_state = np.random.RandomState(seed)
+    a = random_state.randint(1, MINHASH_PRIME, size=permutation_count).astype(np.int64)
+    b = random_state.randint(0, MINHASH_PRIME, size=permutation_count).astype(np.int64)
+
+    # Empty sets get the maximum value everywhere, which no non-empty set's signature shares.
+    signatures = np.full((len(url_code_sets), permutation_count), MINHASH_PRIME, dtype=np.int64)
+    for row_index, codes in enumerate(url_code_sets):
+        if len(codes) == 0:
+            continue
+        code_array = np.array(list(codes), dtype=np.int64)
+        hashes = (a[:, np.newaxis] * code_array[np.newaxis, :] + b[:, np.newaxis]) % MINHASH_PRIME
+        signatures[row_index] = hashes.min(axis=1)
+    return signatures
+
+
+def find_candidate_pairs(signatures, band_count):
+    '''
+    Use locality-sensitive hashing to find pairs of signatures that are likely similar.
+    Signatures are split into bands, and any two signatures that agree on all rows of
+    at least one band become a candidate pair.  Returns a set of (row, row) index pairs.
+    '''
+    permutation_count = signatures.shape[1]
+    if permutation_count % band_count != 0:
+        raise ValueError(
+            "The number of permutations (%d) must be divisible by the number of bands (%d)" %
+            (permutation_count, band_count)
+        )
+    rows_per_band = permutation_count // band_count
+
+    candidate_pairs = set()
+    for band_index in range(band_count):
+        band = signatures[:, band_index * rows_per_band:(band_index + 1) * rows_per_band]
+        buckets = defaultdict(list)
+        for row_index, band_values in enumerate(band):
+            buckets[band_values.tobytes()].append(row_index)
+        for bucket_rows in buckets.values():
+            for pair in itertools.combinations(bucket_rows, 2):
+                candidate_pairs.add(pair)
+
+    return candidate_pairs
+
+
+def compute_minhash_similarities(
+        url_code_sets, permutation_count=MINHASH_PERMUTATION_COUNT,
+        band_count=MINHASH_BAND_COUNT, seed=MINHASH_SEED):
+    '''
+    Estimate the Jaccard similarity between every pair of URL sets using MinHash.
+    Only pairs found to be candidates with LSH banding are compared; all other pairs
+    are assumed to have a similarity of 0.  As most pairs aren't candidates, similarities
+    are returned as the entries on and above the diagonal, as parallel arrays of rows,
+    columns, and similarities, and a full matrix is never built.
+    '''
+    signatures = compute_minhash_signatures(url_code_sets, permutation_count, seed)
+
+    entries = [
+        (row_index, row_index, 1)
+        for row_index, codes in enumerate(url_code_sets)
+        if len(codes) > 0
+    ]
+    for row_index, column_index in find_candidate_pairs(signatures, band_count):
+        similarity = np.mean(signatures[row_index] == signatures[column_index])
+        if similarity > 0:
+            entries.append((row_index, column_index, similarity))
+
+    entries.sort()
+    rows = np.array([entry[0] for entry in entries], dtype=np.int32)
+    columns = np.array([entry[1] for entry in entries], dtype=np.int32)
+    similarities = np.array([entry[2] for entry in entries], dtype=np.float32)
+    return rows, columns, similarities
+
+
+def compute_url_overlaps(
+        exclude_users=None, method='auto', visit_compute_index=None,
+        permutation_count=MINHASH_PERMUTATION_COUNT, band_count=MINHASH_BAND_COUNT):
+    '''
+    Compute the similarity of the sets of standardized URLs each pair of participants visited.
+    `method` is either 'exact', 'minhash', or 'auto' (to choose 'minhash' for large cohorts).
+    Returns the index of location visits used, a list of participant IDs, and the
+    non-zero similarities on and above the diagonal of the similarity matrix, as parallel
+    arrays of rows, columns, and similarities.  Rows and columns index into the participant IDs.
+    '''
+    exclude_users = [] if exclude_users is None else exclude_users
+
+    # Fetch the set of visits for the most recently computed visits if an index isn't given
+    if visit_compute_index is None:
+        visit_compute_index = LocationVisit.select(fn.Max(LocationVisit.compute_index)).scalar()
+
+    user_ids, url_code_sets = _fetch_participant_url_codes(visit_compute_index, exclude_users)
+
+    if method == 'auto':
+        method = 'minhash' if len(user_ids) >= MINHASH_MIN_PARTICIPANTS else 'exact'
+
+    if method == 'exact':
+        similarities = _upper_triangle_entries(compute_exact_similarities(url_code_sets))
+    elif method == 'minhash':
+        similarities = compute_minhash_similarities(url_code_sets, permutation_count, band_count)
+    else:
+        raise ValueError("Unknown method for computing URL overlaps: %s" % method)
+
+    return visit_compute_index, user_ids, similarities
+
+
+def make_url_overlaps_filename(visit_compute_index):
+    '''
+    Create the name of the file for URL overlaps computed from one version of location visits.
+    One side-effect of this function is the creation of a 'data' directory for the file.
+    '''
+    if not os.path.exists('data'):
+        os.makedirs('data')
+    return os.path.join(
+        'data', 'url_overlaps_visit_compute_index_' + str(visit_compute_index) + '.npz')
+
+
+def save_url_overlaps(filename, user_ids, similarities):
+    '''
+    Save similarities to a compressed numpy archive.  `similarities` are the non-zero
+    entries of the upper triangle of the (symmetric) similarity matrix, as returned by
+    `compute_url_overlaps`, and are saved as they are, in coordinate format.
+    '''
+    rows, columns, values = similarities
+    np.savez_compressed(
+        filename,
+        user_ids=np.array(user_ids, dtype=np.int32),
+        rows=np.asarray(rows, dtype=np.int32),
+        columns=np.asarray(columns, dtype=np.int32),
+        similarities=np.asarray(values, dtype=np.float32),
+    )
+
+
+def load_url_overlaps(filename, dense=False):
+    '''
+    Load a list of participant IDs and their similarities saved to a file.  Similarities
+    are loaded as parallel arrays of rows, columns, and similarities for the upper triangle
+    of the similarity matrix, unless `dense` is True, when they're loaded as a full matrix.
+    '''
+    archive = np.load(filename)
+    user_ids = archive['user_ids']
+    rows, columns, values = archive['rows'], archive['columns'], archive['similarities']
+    if not dense:
+        return list(user_ids), (rows, columns, values)
+
+    similarities = np.zeros((len(user_ids), len(user_ids)), dtype=np.float32)
+    similarities[rows, columns] = values
+    similarities[columns, rows] = values
+    return list(user_ids), similarities
+
+
+def main(exclude_users, method, permutation_count, band_count, *args, **kwargs):
+
+    visit_compute_index, user_ids, similarities = compute_url_overlaps(
+        exclude_users, method,
+        permutation_count=permutation_count,
+        band_count=band_count,
+    )
+    if visit_compute_index is None:
+        logger.warn("No location visits have been computed.  Not saving URL overlaps.")
+        return
+
+    filename = make_url_overlaps_filename(visit_compute_index)
+    save_url_overlaps(filename, user_ids, similarities)
+    logger.info("Saved URL overlaps for %d participants to %s", len(user_ids), filename)
+
+
+def configure_parser(parser):
+    parser.description = "Compute how similar the sets of URLs are that each pair of " +\
+        "participants visited, and save the similarity of each pair that overlaps to a " +\
+        "file in the 'data' directory."
+    parser.add_argument(
+        "--exclude-users",
+        default=[1, 2, 3, 4],
+        nargs='+',
+        type=int,
+        help="The IDs of participants to exclude from this analysis(default: %(default)s)",
+    )
+    parser.add_argument(
+        "--method",
+        choices=['auto', 'exact', 'minhash'],
+        default='auto',
+        help=(
+            "How to compute similarities.  'exact' computes the Jaccard similarity of " +
+            "every pair.  'minhash' estimates it for likely-similar pairs.  'auto' " +
+            "uses 'minhash' for " + str(MINHASH_MIN_PARTICIPANTS) + " or more participants " +
+            "(default: %(default)s)."
+        ),
+    )
+    parser.add_argument(
+        "--permutation-count",
+        default=MINHASH_PERMUTATION_COUNT,
+        type=int,
+        help="Length of the MinHash signature for each participant (default: %(default)s)",
+    )
+    parser.add_argument(
+        "--band-count",
+        default=MINHASH_BAND_COUNT,
+        type=int,
+        help=(
+            "Number of LSH bands to split MinHash signatures into.  More bands find more " +
+            "candidate pairs with lower similarity (default: %(default)s)"
+        ),
+    )
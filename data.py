@@ -21,15 +21,14 @@ data_logger.addHandler(log_handler)
 data_logger.propagate = False
 
 from models import create_tables, init_database, Command
+from dump._urls import standardize_url, STANDARDIZE_URL_CACHE_CAPACITY
+from dump.dump import COMPRESSORS
 from compute import task_periods, location_visits, location_ratings, navigation_graph,\
-    navigation_ngrams, unique_urls, unique_cues
+    navigation_ngrams, unique_urls, url_document_frequencies, url_overlaps, unique_cues,\
+    standard_urls
 from migrate import run_migration
-from dump import location_visits as dump_location_visits,\
-    location_ratings as dump_location_ratings, confidence_ratings, package_comparisons,\
-    package_documentation_quality, package_community_quality, package_preference,\
-    concern_ranks, open_responses, na_responses, perception_changes, location_events,\
-    participant_backgrounds, navigation_graph as dump_navigation_graph,\
-    navigation_ngrams as dump_navigation_ngrams
+from importers import page_types as import_page_types
+from dump import all as dump_all, navigation_graph as dump_navigation_graph
 
 
 COMMANDS = {
@@ -37,8 +36,8 @@ COMMANDS = {
         'description': "Compute derived fields from existing data.",
         'module_help': "Type of data to compute.",
         'modules': [
-            task_periods, location_visits, location_ratings, navigation_graph, navigation_ngrams,
-            unique_urls, unique_cues,
+            task_periods, location_visits, standard_urls, location_ratings, navigation_graph,
+            navigation_ngrams, unique_urls, url_document_frequencies, url_overlaps, unique_cues,
         ],
     },
     'migrate': {
@@ -48,15 +47,15 @@ COMMANDS = {
         'module_help': "Migration operation.",
         'modules': [run_migration],
     },
+    'import': {
+        'description': "Import external data into the database.",
+        'module_help': "Type of data to import.",
+        'modules': [import_page_types],
+    },
     'dump': {
         'description': "Dump data to a text file.",
         'module_help': "Type of data to dump.",
-        'modules': [
-            dump_location_visits, dump_location_ratings, confidence_ratings,
-            package_comparisons, package_documentation_quality, package_community_quality,
-            package_preference, concern_ranks, open_responses, na_responses, perception_changes,
-            location_events, participant_backgrounds, dump_navigation_graph, dump_navigation_ngrams
-        ],
+        'modules': [dump_all] + dump_all.DUMP_MODULES + [dump_navigation_graph],
     },
 }
 
@@ -95,6 +94,68 @@ if __name__ == '__main__':
                 '--db-config',
                 help="Name of file containing database configuration."
             )
+            module_parser.add_argument(
+                '--url-cache-size',
+                type=int,
+                default=STANDARDIZE_URL_CACHE_CAPACITY,
+                help="How many standardized URLs to keep in memory (default: %(default)s)."
+            )
+
+            # Modules that dump data to a file can compress it as it's written
+            if hasattr(module.main, 'dump_file_extension'):
+                module_parser.add_argument(
+                    '--compress',
+                    choices=sorted(COMPRESSORS.keys()),
+                    help="Compress the dump file as it's written with this type of compression."
+                )
+                module_parser.add_argument(
+                    '--output',
+                    metavar='FILENAME',
+                    help=(
+                        "Write the dump to this file instead of a new file in the data/ " +
+                        "directory.  Use \"-\" to stream it to standard output."
+                    )
+                )
+            if getattr(module.main, 'dump_watermark', None) is not None:
+                if module.main.dump_generation_watermark:
+                    since_last_help = "Only dump if there's a new computation since the " +\
+                        "last time this was dumped, to a new file that replaces earlier ones."
+                else:
+                    since_last_help = "Only dump rows added since the last time this was " +\
+                        "dumped, to a new file listed in the dump's manifest."
+                module_parser.add_argument(
+                    '--since-last',
+                    action='store_true',
+                    help=since_last_help,
+                )
+            if getattr(module.main, 'dump_sources', None) is not None:
+                module_parser.add_argument(
+                    '--no-cache',
+                    action='store_true',
+                    help=(
+                        "Dump records even if nothing the dump reads has changed since " +
+                        "an earlier dump, which would otherwise be reused."
+                    )
+                )
+            if getattr(module.main, 'dump_column_names', None) is not None:
+                module_parser.add_argument(
+                    '--columnar',
+                    action='store_true',
+                    help=(
+                        "Dump rows to a numpy archive of typed columns instead of a text " +
+                        "file, which can be loaded much faster for analysis."
+                    )
+                )
+                module_parser.add_argument(
+                    '--columns',
+                    nargs='+',
+                    choices=module.main.dump_column_names,
+                    metavar='COLUMN',
+                    help=(
+                        "Only dump these columns, in this order.  Columns can be any of: " +
+                        ", ".join('"%s"' % name for name in module.main.dump_column_names)
+                    )
+                )
 
             # Each module defines additional arguments
             module.configure_parser(module_parser)
@@ -115,6 +176,13 @@ if __name__ == '__main__':
         # Save a record of this command that we can refer back to later if needed
         Command.create(arguments=str(sys.argv))
 
+        # Set how many standardized URLs the command can keep in memory
+        standardize_url.cache.resize(args.url_cache_size)
+
     # Invoke the main program that was specified by the submodule
     if args.func is not None:
         args.func(**vars(args))
+
+    # Report how much work we saved by caching standardized URLs
+    if args.command != 'tests':
+        standardize_url.cache.log_stats('standardize_url')
@@ -0,0 +1,325 @@
+#! /usr/bin/env python
+# -*- coding: utf-8 -*-
+
+from __future__ import unicode_literals
+import logging
+from collections import OrderedDict, namedtuple
+from datetime import datetime
+import os
+import shutil
+import struct
+import tempfile
+import zipfile
+import numpy as np
+
+
+logger = logging.getLogger('data')
+
+'''
+Columnar dumps are saved as uncompressed numpy archives (.npz files), with one array per column:
+* integers are saved as int32 (with INT_NULL standing in for missing values)
+* floats are saved as float64 (with NaN standing in for missing values)
+* timestamps are saved as 'datetime64[us]': 64-bit microseconds since the epoch (NaT if missing)
+* strings are dictionary-encoded.  The array for the column holds int32 codes (-1 if missing),
+  and two more arrays, '<column>.values' and '<column>.value_offsets', hold the UTF-8
+  bytes of all distinct strings and the offset at which each string starts.
+
+Archives can be loaded with `np.load`.  Because the arrays are stored uncompressed,
+they can also be memory-mapped straight out of the archive with `load_columnar_dump`.
+'''
+
+COLUMNAR_ROWS_PER_WRITE = 10000
+INT_NULL = np.iinfo(np.int32).min
+INT64_NULL = np.iinfo(np.int64).min
+STRING_NULL = -1
+EPOCH = datetime(1970, 1, 1)
+
+VALUES_SUFFIX = '.values'
+VALUE_OFFSETS_SUFFIX = '.value_offsets'
+
+# All .npy headers written for columns are padded to this length, so that a header
+# can be written before we know how long the column is, and then rewritten at the end.
+NPY_HEADER_LENGTH = 128
+NPY_MAGIC = b'\x93NUMPY\x01\x00'
+
+# Size of the fixed part of a zip file's local file header, and the offset of the
+# lengths of the file name and "extra" field within it.
+ZIP_LOCAL_HEADER_LENGTH = 30
+ZIP_LOCAL_HEADER_NAME_LENGTHS_OFFSET = 26
+
+
+StringColumn = namedtuple('StringColumn', ['codes', 'values'])
+
+# The types of value that can be saved to each kind of column.
+COLUMN_KIND_TYPES = OrderedDict([
+    ('int', (bool, int, long)),
+    ('float', (float, int, long)),
+    ('datetime', (datetime,)),
+    ('string', (str, unicode)),
+])
+COLUMN_KIND_DTYPES = {
+    'int': np.int32,
+    'float': np.float64,
+    'datetime': 'datetime64[us]',
+    'string': np.int32,
+}
+
+
+def _to_epoch_microseconds(value):
+    if value.tzinfo is not None:
+        value = value.replace(tzinfo=None) - value.utcoffset()
+    delta = value - EPOCH
+    return (delta.days * 86400 + delta.seconds) * 1000000 + delta.microseconds
+
+
+def _write_npy_header(file_, dtype, length):
+    header = "{'descr': %r, 'fortran_order': False, 'shape': (%d,), }" % (
+        str(dtype.str), length)
+    header_size = NPY_HEADER_LENGTH - len(NPY_MAGIC) - 2
+    file_.write(NPY_MAGIC)
+    file_.write(struct.pack(str('<H'), header_size))
+    file_.write(header.encode('latin1').ljust(header_size - 1) + b'\n')
+
+
+class _ColumnFile(object):
+    ''' A typed column that is written to a temporary .npy file in chunks. '''
+
+    def __init__(self, path, dtype):
+        self.path = path
+        self.dtype = np.dtype(dtype)
+        self.length = 0
+        self.file = open(path, 'wb')
+        _write_npy_header(self.file, self.dtype, 0)
+
+    def write(self, array):
+        array.astype(self.dtype).tofile(self.file)
+        self.length += len(array)
+
+    def close(self):
+        # Now that we know how long the column is, update its header.
+        self.file.seek(0)
+        _write_npy_header(self.file, self.dtype, self.length)
+        self.file.close()
+
+
+class _ColumnBuilder(object):
+    '''
+    Collects the values of one column of a dump.  The type of the column is decided by the
+    first value that isn't None.  Values are passed in one chunk at a time and written to
+    disk as a typed array, so only one chunk of values is held in memory (and, for strings,
+    the dictionary of distinct values).
+    '''
+    def __init__(self, index, name, directory):
+        self.index = index
+        self.name = name
+        self.directory = directory
+        self.kind = None
+        self.leading_null_count = 0
+        self.codes = {}
+        self.column_file = None
+
+    def _set_kind(self, kind):
+        self.kind = kind
+        self.column_file = _ColumnFile(self._make_path(''), COLUMN_KIND_DTYPES[kind])
+
+    def _make_path(self, suffix):
+        # Columns are saved to files named by their position, as their names may not be
+        # valid file names.
+        return os.path.join(self.directory, '%d%s.npy' % (self.index, suffix))
+
+    def _check_types(self, values):
+        value_types = set([type(value) for value in values])
+        value_types.discard(type(None))
+
+        if self.kind is None:
+            if len(value_types) == 0:
+                return
+            first_value = next(value for value in values if value is not None)
+            for kind, types in COLUMN_KIND_TYPES.items():
+                if isinstance(first_value, types):
+                    self._set_kind(kind)
+                    break
+            else:
+                raise ValueError(
+                    "Column \"%s\" has a value of a type that can't be dumped to columns: %r" %
+                    (self.name, first_value))
+
+        for value_type in value_types:
+            if not issubclass(value_type, COLUMN_KIND_TYPES[self.kind]):
+                raise ValueError(
+                    "Column \"%s\" has values of more than one type, including %s" %
+                    (self.name, value_type.__name__))
+
+    def _encode(self, values):
+        ''' Convert a chunk of values to a typed array. '''
+
+        if self.kind == 'float':
+            # numpy converts None to NaN for us.
+            return np.array(values, dtype=np.float64)
+
+        elif self.kind == 'datetime':
+            microseconds = [
+                INT64_NULL if value is None else _to_epoch_microseconds(value)
+                for value in values
+            ]
+            return np.array(microseconds, dtype=np.int64).view('datetime64[us]')
+
+        elif self.kind == 'string':
+            add_code = self.codes.setdefault
+            codes = self.codes
+            return np.array([
+                STRING_NULL if value is None else add_code(value, len(codes))
+                for value in values
+            ], dtype=np.int32)
+
+        if None in values:
+            values = [INT_NULL if value is None else value for value in values]
+        # numpy silently wraps integers that don't fit in 32 bits, so check for them first.
+        array = np.array(values, dtype=np.int64)
+        if array.min() < INT_NULL or array.max() > np.iinfo(np.int32).max:
+            raise ValueError(
+                "Column \"%s\" has an integer that doesn't fit in 32 bits." % self.name)
+        return array
+
+    def extend(self, values):
+        self._check_types(values)
+        if self.kind is None:
+            self.leading_null_count += len(values)
+            return
+
+        if self.leading_null_count > 0:
+            values = [None] * self.leading_null_count + list(values)
+            self.leading_null_count = 0
+        if len(values) > 0:
+            self.column_file.write(self._encode(values))
+
+    def save(self, archive):
+        ''' Write this column (and its dictionary, for string columns) to a zip archive. '''
+
+        # A column that only ever had missing values is saved as a column of missing strings.
+        if self.kind is None:
+            self._set_kind('string')
+            self.column_file.write(np.full(self.leading_null_count, STRING_NULL, dtype=np.int32))
+
+        self.column_file.close()
+        archive.write(self.column_file.path, self.name + '.npy')
+
+        if self.kind == 'string':
+            values = sorted(self.codes.keys(), key=self.codes.get)
+            encoded_values = [value.encode('utf-8') for value in values]
+            value_offsets = np.cumsum([0] + [len(value) for value in encoded_values])
+            values_file = _ColumnFile(self._make_path(VALUES_SUFFIX), np.uint8)
+            values_file.write(np.frombuffer(b''.join(encoded_values), dtype=np.uint8))
+            values_file.close()
+            offsets_file = _ColumnFile(self._make_path(VALUE_OFFSETS_SUFFIX), np.int64)
+            offsets_file.write(value_offsets)
+            offsets_file.close()
+            archive.write(values_file.path, self.name + VALUES_SUFFIX + '.npy')
+            archive.write(offsets_file.path, self.name + VALUE_OFFSETS_SUFFIX + '.npy')
+
+
+def run_and_dump_columnar(harvest_func, dump_path, column_names, *args, **kwargs):
+    '''
+    Dump the rows yielded by a harvest function to a columnar archive.  Rows are collected
+    into chunks of `COLUMNAR_ROWS_PER_WRITE`, and each chunk is split into columns which are
+    appended to temporary files.  At the end, these files are stored in the archive.
+    Returns the number of rows dumped.
+    '''
+    temp_dir = tempfile.mkdtemp()
+    try:
+        columns = [
+            _ColumnBuilder(index, column_name, temp_dir)
+            for index, column_name in enumerate(column_names)
+        ]
+
+        def write_rows(rows):
+            # Transpose the rows into columns.  'zip' drops values past the end of a short row,
+            # so we make sure every row has a value for every column first.
+            for row in rows:
+                if len(row) != len(columns):
+                    raise ValueError(
+                        "Row has %d values, but the dump has %d columns: %r" %
+                        (len(row), len(columns), row))
+            for column, values in zip(columns, zip(*rows)):
+                column.extend(values)
+
+        rows = []
+        row_count = 0
+        for line_list in harvest_func(*args, **kwargs):
+            rows.extend(line_list)
+            if len(rows) >= COLUMNAR_ROWS_PER_WRITE:
+                write_rows(rows)
+                row_count += len(rows)
+                rows = []
+        if len(rows) > 0:
+            write_rows(rows)
+            row_count += len(rows)
+
+        # Arrays are stored without compression so they can be memory-mapped.
+        with zipfile.ZipFile(dump_path, 'w', zipfile.ZIP_STORED, allowZip64=True) as archive:
+            for column in columns:
+                column.save(archive)
+    finally:
+        shutil.rmtree(temp_dir)
+
+    return row_count
+
+
+def _decode_values(values, value_offsets):
+    values = values.tobytes()
+    return [
+        values[start:end].decode('utf-8')
+        for start, end in zip(value_offsets[:-1], value_offsets[1:])
+    ]
+
+
+def _memory_map_member(filename, archive_file, info):
+    ''' Memory-map an uncompressed .npy file stored in a zip archive. '''
+
+    # The data of a member begins after its local header, which has a name and "extra"
+    # field whose lengths can differ from those listed in the archive's central directory.
+    archive_file.seek(info.header_offset + ZIP_LOCAL_HEADER_NAME_LENGTHS_OFFSET)
+    name_length, extra_length = struct.unpack(str('<HH'), archive_file.read(4))
+    archive_file.seek(info.header_offset + ZIP_LOCAL_HEADER_LENGTH + name_length + extra_length)
+
+    np.lib.format.read_magic(archive_file)
+    shape, fortran_order, dtype = np.lib.format.read_array_header_1_0(archive_file)
+    if shape[0] == 0:
+        return np.zeros(shape, dtype=dtype)
+    return np.memmap(filename, dtype=dtype, mode='r', offset=archive_file.tell(), shape=shape)
+
+
+def load_columnar_dump(filename, mmap=True):
+    '''
+    Load the columns of a columnar dump into an ordered dictionary from column name to column.
+    Integer, float, and timestamp columns are numpy arrays.  String columns are `StringColumn`s,
+    where `codes` is an array of indexes into the list of distinct `values` (-1 if missing).
+    If `mmap` is True, arrays are memory-mapped from the file instead of read into memory.
+    '''
+    arrays = OrderedDict()
+    if mmap:
+        with zipfile.ZipFile(filename) as archive, open(filename, 'rb') as archive_file:
+            for info in archive.infolist():
+                if info.compress_type != zipfile.ZIP_STORED:
+                    raise ValueError("Can't memory-map the compressed array " + info.filename)
+                name = info.filename[:-len('.npy')]
+                arrays[name] = _memory_map_member(filename, archive_file, info)
+    else:
+        archive = np.load(filename)
+        with zipfile.ZipFile(filename) as zip_archive:
+            for info in zip_archive.infolist():
+                name = info.filename[:-len('.npy')]
+                arrays[name] = archive[name]
+        archive.close()
+
+    columns = OrderedDict()
+    for name, array in arrays.items():
+        if name.endswith(VALUES_SUFFIX) or name.endswith(VALUE_OFFSETS_SUFFIX):
+            continue
+        if name + VALUES_SUFFIX in arrays:
+            values = _decode_values(
+                arrays[name + VALUES_SUFFIX], arrays[name + VALUE_OFFSETS_SUFFIX])
+            columns[name] = StringColumn(array, values)
+        else:
+            columns[name] = array
+    return columns
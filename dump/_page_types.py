@@ -0,0 +1,111 @@
+#! /usr/bin/env python
+# -*- coding: utf-8 -*-
+
+from __future__ import unicode_literals
+import logging
+import contextlib
+import gc
+import hashlib
+import json
+import marshal
+import os
+import os.path
+
+
+logger = logging.getLogger('data')
+
+# Bump this if the format of the compiled lookup ever changes, so old snapshots get rebuilt.
+SNAPSHOT_FORMAT_VERSION = 1
+SNAPSHOT_EXTENSION = '.marshal'
+HASH_CHUNK_SIZE = 1024 * 1024
+
+
+def hash_file(filename):
+    ''' Compute the SHA-1 hash of the contents of a file. '''
+    file_hash = hashlib.sha1()
+    with open(filename, 'rb') as file_:
+        for chunk in iter(lambda: file_.read(HASH_CHUNK_SIZE), b''):
+            file_hash.update(chunk)
+    return file_hash.hexdigest()
+
+
+@contextlib.contextmanager
+def _garbage_collection_paused():
+    '''
+    Pause the garbage collector.  Loading a large lookup creates millions of containers,
+    and the collector would otherwise repeatedly scan them all, which more than doubles
+    the time that it takes to load the lookup.
+    '''
+    was_enabled = gc.isenabled()
+    gc.disable()
+    try:
+        yield
+    finally:
+        if was_enabled:
+            gc.enable()
+
+
+def _write_snapshot(snapshot_filename, header, page_type_lookup):
+    '''
+    Save a snapshot of the lookup.  It's written to a temporary file first and then
+    moved into place, so other commands never read a partially-written snapshot.
+    '''
+    temporary_filename = snapshot_filename + '.' + str(os.getpid()) + '.tmp'
+    try:
+        with open(temporary_filename, 'wb') as snapshot_file:
+            marshal.dump(header, snapshot_file)
+            marshal.dump(page_type_lookup, snapshot_file)
+        os.rename(temporary_filename, snapshot_filename)
+    except (IOError, OSError) as error:
+        logger.warn("Could not save compiled page type lookup to %s: %s", snapshot_filename, error)
+
+
+def load_page_type_lookup(page_types_json_filename):
+    '''
+    Load a dictionary that describes the page types for URLs visited from a JSON file.
+    The first time a file is loaded, it is compiled into a binary snapshot saved next to it,
+    which later commands can load much more quickly than the JSON.  The snapshot is rebuilt
+    whenever the contents of the JSON file change.
+    '''
+    snapshot_filename = page_types_json_filename + SNAPSHOT_EXTENSION
+    source_stat = os.stat(page_types_json_filename)
+    source_hash = None
+
+    if os.path.exists(snapshot_filename):
+        try:
+            with open(snapshot_filename, 'rb') as snapshot_file:
+                header = marshal.load(snapshot_file)
+
+                # If the modification time and size haven't changed, the snapshot is up to date.
+                # Otherwise, the file might have just been touched or copied, so we check
+                # whether its contents have changed before deciding to rebuild the snapshot.
+                up_to_date = header.get('version') == SNAPSHOT_FORMAT_VERSION and (
+                    header.get('mtime') == source_stat.st_mtime and
+                    header.get('size') == source_stat.st_size
+                )
+                if not up_to_date and header.get('version') == SNAPSHOT_FORMAT_VERSION:
+                    source_hash = hash_file(page_types_json_filename)
+                    up_to_date = header.get('sha1') == source_hash
+
+                if up_to_date:
+                    with _garbage_collection_paused():
+                        page_type_lookup = marshal.load(snapshot_file)
+                    if header.get('mtime') != source_stat.st_mtime:
+                        header['mtime'] = source_stat.st_mtime
+                        _write_snapshot(snapshot_filename, header, page_type_lookup)
+                    return page_type_lookup
+
+        except (EOFError, ValueError, TypeError, AttributeError):
+            logger.warn("Compiled page type lookup %s is corrupt.  Rebuilding.", snapshot_filename)
+
+    with open(page_types_json_filename) as page_types_file, _garbage_collection_paused():
+        page_type_lookup = json.load(page_types_file)
+
+    header = {
+        'version': SNAPSHOT_FORMAT_VERSION,
+        'mtime': source_stat.st_mtime,
+        'size': source_stat.st_size,
+        'sha1': source_hash or hash_file(page_types_json_filename),
+    }
+    _write_snapshot(snapshot_filename, header, page_type_lookup)
+    return page_type_lookup
@@ -5,11 +5,134 @@ from __future__ import unicode_literals
 import logging
 from urlparse import urlparse
 import re
+import multiprocessing
+
+from cache import lru_cache
 
 
 logger = logging.getLogger('data')
 
+# The same few thousand distinct URLs are standardized again and again across millions
+# of visits, so we keep recently standardized URLs in a cache.  The capacity can be changed
+# with `standardize_url.cache.resize`.
+STANDARDIZE_URL_CACHE_CAPACITY = 100000
+
+# When standardizing URLs in bulk, only start up a pool of processes once there are
+# enough distinct URLs that the work outweighs the cost of starting the processes.
+PARALLEL_STANDARDIZATION_THRESHOLD = 20000
+PARALLEL_STANDARDIZATION_CHUNK_SIZE = 1000
 
+
+# Site-specific rules for standardizing URLs.  Each rule applies to a set of domains
+# (without the "www." prefix).  A rule can include patterns for the path, query, and
+# fragment of the URL, and it applies only if all of its patterns are found.  The first rule
+# that applies for a domain produces the standardized URL by filling in its template with
+# the domain, path, query, and fragment of the URL, and with any named groups in the patterns.
+# If no rule applies, the standardized URL is the domain and path.
+STANDARDIZATION_RULES = [
+    # Preserve the query parameters that identify Panda3D topics and forums.
+    # Note that even though a URL for a Panda3D topic might include both
+    # a topic number and a forum number, a few tests on my part showed that
+    # the forum number isn't actually needed.  The topic numbers
+    # are probably unique and independent of forum number.
+    {
+        'domains': ["panda3d.org"],
+        'path': r"^(/forums)?/viewtopic\.php",
+        'query': r"(^|&)t=(?P<topic_id>\d+)",
+        'template': "{domain}{path}?t={topic_id}",
+    },
+    {
+        'domains': ["panda3d.org"],
+        'path': r"^(/forums)?/viewforum\.php",
+        'query': r"(^|&)f=(?P<forum_id>\d+)",
+        'template': "{domain}{path}?f={forum_id}",
+    },
+    {
+        'domains': ["panda3d.org"],
+        'path': r"^/showss\.php$",
+        'query': r"(^|&)shot=(?P<shot_name>[^&]+)",
+        'template': "{domain}{path}?shot={shot_name}",
+    },
+    {
+        'domains': ["youtube.com"],
+        'path': r"^/watch$",
+        'query': r"(^|&)v=(?P<video_id>\w+)",
+        'template': "{domain}{path}?v={video_id}",
+    },
+    # Convert all Google Groups forums and topics into their own URLs
+    {
+        'domains': ["groups.google.com"],
+        'fragment': r"^!(topic|forum)/",
+        'template': "{domain}{path}{fragment}",
+    },
+    # Coalesce all search anywhere on Google Groups into one URL
+    {
+        'domains': ["groups.google.com"],
+        'fragment': r"^!searchin",
+        'template': "{domain}{path}!searchin",
+    },
+    # Tigsource forums and topics all get their own URLs too
+    # We do topics before forums in case topic pages also have a
+    # forum ID as part of their query parameters
+    {
+        'domains': ["forums.tigsource.com"],
+        'query': r"(^|&)topic=(?P<topic_id>[0-9.]+)",
+        'template': "{domain}{path}?topic={topic_id}",
+    },
+    {
+        'domains': ["forums.tigsource.com"],
+        'query': r"(^|&)board=(?P<board_id>[0-9.]+)",
+        'template': "{domain}{path}?board={board_id}",
+    },
+    {
+        'domains': ["forums.tigsource.com"],
+        'query': r"(^|&)action=search2",
+        'template': "{domain}{path}?action=search2",
+    },
+    # r.search.yahoo.com links from this study tended to be redirects.  I expect
+    # that they were encountered as someone clicked on a search result from Yahoo.
+    # Here, we make all redirects just be one single URL.
+    {
+        'domains': ["r.search.yahoo.com"],
+        'path': r"^/_ylt=",
+        'template': "{domain}/_ylt=redirect",
+    },
+    # Stack Overflow questions can be referred to by their number alone, and by their number
+    # and a longer readable name, and after that there can be the ID of an answer.
+    # We consider the all to be the same page.
+    {
+        'domains': ["stackoverflow.com"],
+        'path': r"^/questions/(?P<question_id>\d+)/",
+        'template': "{domain}/questions/{question_id}",
+    },
+    # If this is the experiment site, return just one domain.  This squashes all visits
+    # to the experiment site into just one URL
+    {
+        'domains': ["searchlogger.tutorons.com", "bluejeans.com"],
+        'template': "{domain}",
+    },
+]
+URL_PARTS = ['path', 'query', 'fragment']
+
+
+def _compile_standardization_rules(rules):
+    '''
+    Compile a list of standardization rules into a dictionary from each domain to
+    the list of rules for that domain, in order.  Each compiled rule is a pair of a list of
+    (URL part, compiled pattern) pairs, and the rule's template.
+    '''
+    compiled_rules = {}
+    for rule in rules:
+        patterns = [(part, re.compile(rule[part])) for part in URL_PARTS if part in rule]
+        for domain in rule['domains']:
+            compiled_rules.setdefault(domain, []).append((patterns, rule['template']))
+    return compiled_rules
+
+
+COMPILED_STANDARDIZATION_RULES = _compile_standardization_rules(STANDARDIZATION_RULES)
+
+
+@lru_cache(STANDARDIZE_URL_CACHE_CAPACITY)
 def standardize_url(url):
     '''
     Standardize a URL.  This means reducing a URL to single unique URL that will
@@ -17,92 +140,75 @@ def standardize_url(url):
     In most cases, this means just removing query parameters and fragments.
     Though this behavior gets more complex for other pages.
     For example, fragments are needed to disambiguate between different forums
-    on Google Groups.  This routine takes care of all of that logic.
+    on Google Groups.  The site-specific logic is defined in `STANDARDIZATION_RULES`.
     '''
 
     url_parsed = urlparse(url)
     scheme = url_parsed.scheme
-    fragment = url_parsed.fragment
-    query = url_parsed.query
+
+    # Squash all browser pages (new tabs, preferences pages, etc.) into one unique URL
+    if scheme == "about":
+        return "browser_page"
 
     if scheme == "view-source":
         # If we are viewing source, the original scheme, domain, and path all get
         # shoved into the "path" (though the fragment and query remain separate).
         # Here we split out the domain and path again.
-        page_url = url_parsed.path
-        domain = "view-source:" + urlparse(page_url).netloc
-        path = urlparse(page_url).path
+        page_url_parsed = urlparse(url_parsed.path)
+        domain = "view-source:" + page_url_parsed.netloc
+        path = page_url_parsed.path
     else:
         domain = url_parsed.netloc
         path = url_parsed.path
 
-    domain_without_www = re.sub("^www\.", "", domain)
-
-    # Preserve the query parameters that identify Panda3D topics and forums.
-    if domain_without_www == "panda3d.org":
-
-        # Note that even though a URL for a Panda3D topic might include both
-        # a topic number and a forum number, a few tests on my part showed that
-        # the forum number isn't actually needed.  The topic numbers
-        # are probably unique and independent of forum number.
-        if re.match("(/forums)?/viewtopic.php", path) and re.search(r"(^|&)t=", query):
-            topic_id = re.search(r"(^|&)t=(\d+)", query).group(2)
-            return domain_without_www + path + "?t=" + topic_id
-        elif re.match("(/forums)?/viewforum.php", path) and re.search(r"(^|&)f=", query):
-            forum_id = re.search(r"(^|&)f=(\d+)", query).group(2)
-            return domain_without_www + path + "?f=" + forum_id
-        elif path == "/showss.php" and re.search(r"(^|&)shot=", query):
-            shot_name = re.search(r"(^|&)shot=([^&]+)", query).group(2)
-            return domain_without_www + path + "?shot=" + shot_name
-
-    elif domain_without_www == "youtube.com" and path == "/watch" and re.search(r"(^|&)v=", query):
-        video_id = re.search(r"(^|&)v=(\w+)", query).group(2)
-        return domain_without_www + path + "?v=" + video_id
-
-    elif domain_without_www == "groups.google.com":
-
-        # Convert all Google Groups forums and topics into their own URLs
-        if re.search(r"^!topic/", fragment) or re.search(r"^!forum/", fragment):
-            return domain_without_www + path + fragment
-
-        # Coalesce all search anywhere on Google Groups into one URL
-        if re.search(r"^!searchin", fragment):
-            return domain_without_www + path + "!searchin"
-
-    # Tigsource forums and topics all get their own URLs too
-    # We do topics before forums in case topic pages also have a
-    # forum ID as part of their query parameters
-    elif domain_without_www == "forums.tigsource.com":
-        if re.search(r"(^|&)topic=", query):
-            topic_id = re.search(r"(^|&)topic=([0-9.]+)", query).group(2)
-            return domain_without_www + path + "?topic=" + topic_id
-        elif re.search(r"(^|&)board=", query):
-            board_id = re.search(r"(^|&)board=([0-9.]+)", query).group(2)
-            return domain_without_www + path + "?board=" + board_id
-        elif re.search(r"(^|&)action=search2", query):
-            return domain_without_www + path + "?action=search2"
-
-    # r.search.yahoo.com links from this study tended to be redirects.  I expect
-    # that they were encountered as someone clicked on a search result from Yahoo.
-    # Here, we make all redirects just be one single URL.
-    elif domain_without_www == "r.search.yahoo.com" and path.startswith("/_ylt="):
-        return domain_without_www + "/_ylt=redirect"
-
-    # Stack Overflow questions can be referred to by their number alone, and by their number
-    # and a longer readable name, and after that there can be the ID of an answer.
-    # We consider the all to be the same page.
-    elif domain_without_www == "stackoverflow.com" and re.search(r"^/questions/\d+/", path):
-        question_id = re.search(r"^/questions/(\d+)/", path).group(1)
-        return domain_without_www + "/questions/" + question_id
-
-    # If this is the experiment site, return just one domain.  This squashes all visits
-    # to the experiment site into just one URL
-    elif (domain_without_www == "searchlogger.tutorons.com" or
-            domain_without_www == "bluejeans.com"):
-        return domain_without_www
-
-    # Squash all browser pages (new tabs, preferences pages, etc.) into one unique URL
-    elif scheme == "about":
-        return "browser_page"
+    if domain.startswith("www."):
+        domain = domain[len("www."):]
+
+    # Most domains don't have any special rules, and can be standardized right away.
+    domain_rules = COMPILED_STANDARDIZATION_RULES.get(domain)
+    if domain_rules is None:
+        return domain + path
+
+    url_parts = {
+        'domain': domain,
+        'path': path,
+        'query': url_parsed.query,
+        'fragment': url_parsed.fragment,
+    }
+    for patterns, template in domain_rules:
+        template_values = url_parts
+        for part, pattern in patterns:
+            match = pattern.search(url_parts[part])
+            if match is None:
+                break
+            group_values = match.groupdict()
+            if group_values:
+                template_values = dict(template_values, **group_values)
+        else:
+            return template.format(**template_values)
+
+    return domain + path
+
+
+def standardize_urls(
+        urls, process_count=None, parallel_threshold=PARALLEL_STANDARDIZATION_THRESHOLD):
+    '''
+    Standardize many URLs at once.  Each distinct URL is only standardized once.
+    If there are at least `parallel_threshold` distinct URLs, the work is split across a pool
+    of `process_count` processes (by default, one for each CPU).
+    Returns a dictionary from each distinct URL to its standardized URL.
+    '''
+    distinct_urls = list(set(urls))
 
-    return domain_without_www + path
+    if len(distinct_urls) < parallel_threshold:
+        standardized_urls = [standardize_url(url) for url in distinct_urls]
+    else:
+        pool = multiprocessing.Pool(process_count)
+        try:
+            standardized_urls = pool.map(
+                standardize_url, distinct_urls, PARALLEL_STANDARDIZATION_CHUNK_SIZE)
+        finally:
+            pool.close()
+            pool.join()
+
+    return dict(zip(distinct_urls, standardized_urls))
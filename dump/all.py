@@ -0,0 +1,207 @@
+#! /usr/bin/env python
+# -*- coding: utf-8 -*-
+
+from __future__ import unicode_literals
+import logging
+import contextlib
+import importlib
+import multiprocessing
+import os
+import os.path
+import shutil
+import sqlite3
+import tempfile
+import time
+import traceback
+
+from dump import COMPRESSORS
+from models import db_proxy, init_database
+import location_visits, location_ratings, confidence_ratings, package_comparisons,\
+    package_documentation_quality, package_community_quality, package_preference,\
+    concern_ranks, open_responses, na_responses, perception_changes, location_events,\
+    participant_backgrounds, navigation_ngrams, page_type_visits, analytics_database
+
+
+logger = logging.getLogger('data')
+
+# All dumps of records to files.  (The navigation graph is left out, as it draws an image,
+# and needs graph-tool, which most installations don't have.)
+DUMP_MODULES = [
+    location_visits, location_ratings, confidence_ratings, package_comparisons,
+    package_documentation_quality, package_community_quality, package_preference,
+    concern_ranks, open_responses, na_responses, perception_changes, location_events,
+    participant_backgrounds, navigation_ngrams, page_type_visits, analytics_database,
+]
+
+# The database that a worker process inherited from the parent process.  We keep a
+# reference to it so it's never garbage collected in the worker, which would close
+# the connection that the worker shares with the parent.
+_parent_database = None
+
+
+@contextlib.contextmanager
+def _database_snapshot(db_type):
+    '''
+    Take a snapshot of the database that all dumps can read from, so that they are
+    consistent with each other even if the database is changed while they run.
+    Yields the name of a copy of the database for SQLite, or the ID of an exported
+    snapshot for Postgres, which is valid until the context is exited.
+    '''
+    database = db_proxy.obj
+
+    if db_type == 'postgres':
+        with database.transaction():
+            database.execute_sql("SET TRANSACTION ISOLATION LEVEL REPEATABLE READ")
+            snapshot_id = database.execute_sql("SELECT pg_export_snapshot()").fetchone()[0]
+            yield None, snapshot_id
+
+    else:
+        # Copy the database while holding a lock that keeps other processes from writing to it.
+        snapshot_file, snapshot_filename = tempfile.mkstemp(
+            prefix='snapshot-', suffix='.db',
+            dir=os.path.dirname(os.path.abspath(database.database)),
+        )
+        os.close(snapshot_file)
+        connection = sqlite3.connect(database.database, isolation_level=None)
+        try:
+            connection.execute("BEGIN IMMEDIATE")
+            shutil.copyfile(database.database, snapshot_filename)
+        finally:
+            connection.rollback()
+            connection.close()
+
+        try:
+            yield snapshot_filename, None
+        finally:
+            os.remove(snapshot_filename)
+
+
+@contextlib.contextmanager
+def _snapshot_transaction(snapshot_id):
+    ''' On Postgres, read from an exported snapshot for the duration of this context. '''
+    if snapshot_id is None:
+        yield
+    else:
+        database = db_proxy.obj
+        with database.transaction():
+            database.execute_sql("SET TRANSACTION ISOLATION LEVEL REPEATABLE READ")
+            database.execute_sql("SET TRANSACTION SNAPSHOT %s", (snapshot_id,))
+            yield
+
+
+def _initialize_worker(db_type, db_config, sqlite_filename):
+    global _parent_database
+    _parent_database = db_proxy.obj
+    init_database(db_type, config_filename=db_config, sqlite_filename=sqlite_filename)
+
+
+def _run_dump(task):
+    '''
+    Run one dump in a worker process.  Returns the name of the dump, how long it took,
+    and either the number of rows dumped, or a description of the error if it failed.
+    '''
+    module_name, snapshot_id, dump_kwargs = task
+    module = importlib.import_module(module_name)
+
+    start_time = time.time()
+    try:
+        with _snapshot_transaction(snapshot_id):
+            row_count = module.main(**dump_kwargs)
+    except Exception:
+        return module_name, time.time() - start_time, None, traceback.format_exc()
+    return module_name, time.time() - start_time, row_count, None
+
+
+def main(page_types_json_filename, process_count, db, db_config, compress, columnar, since_last,
+         no_cache, *args, **kwargs):
+
+    dump_kwargs = {
+        'page_types_json_filename': page_types_json_filename,
+        'compress': compress,
+        'columnar': columnar,
+        'no_cache': no_cache,
+    }
+    # Dumps without watermarks are always dumped in full.
+    dump_modules = DUMP_MODULES
+    if since_last:
+        dump_kwargs['since_last'] = True
+        dump_modules = [
+            module for module in DUMP_MODULES
+            if getattr(module.main, 'dump_watermark', None) is not None
+        ]
+
+    start_time = time.time()
+    results = []
+
+    with _database_snapshot(db) as (sqlite_filename, snapshot_id):
+        pool = multiprocessing.Pool(
+            process_count,
+            initializer=_initialize_worker,
+            initargs=(db, db_config, sqlite_filename),
+        )
+        try:
+            tasks = [(module.__name__, snapshot_id, dump_kwargs) for module in dump_modules]
+            for result in pool.imap_unordered(_run_dump, tasks):
+                module_name, _, _, error = result
+                logger.info("%s dump %s", module_name, "failed" if error else "finished")
+                results.append(result)
+        finally:
+            pool.close()
+            pool.join()
+
+    results.sort()
+    logger.info("Ran %d dumps in %.1f seconds:", len(results), time.time() - start_time)
+    for module_name, seconds, row_count, error in results:
+        if error is None:
+            logger.info("  %-40s %8.1fs %10d rows", module_name, seconds, row_count)
+        else:
+            logger.error("  %-40s %8.1fs     FAILED\n%s", module_name, seconds, error)
+    return results
+
+
+def configure_parser(parser):
+    parser.description = "Run all dumps at once in parallel, reading from one " +\
+        "snapshot of the database so that the dumps are consistent with each other."
+    parser.add_argument(
+        "page_types_json_filename",
+        help=(
+            "Name of a JSON file that maps URLs to file types.  " +
+            "The format of each row should be:" +
+            "\"<url>\": {\"main_type\": \"<main type>\", \"types\": " +
+            "[<list of all relevant types>]}"
+        )
+    )
+    parser.add_argument(
+        '--process-count',
+        type=int,
+        help="How many dumps to run at once (default: one per CPU)."
+    )
+    parser.add_argument(
+        '--compress',
+        choices=sorted(COMPRESSORS.keys()),
+        help="Compress the dump files as they're written with this type of compression."
+    )
+    parser.add_argument(
+        '--columnar',
+        action='store_true',
+        help=(
+            "Dump rows to numpy archives of typed columns instead of text " +
+            "files, which can be loaded much faster for analysis."
+        )
+    )
+    parser.add_argument(
+        '--since-last',
+        action='store_true',
+        help=(
+            "Only run dumps that can dump just the rows added since they were last run, " +
+            "and only dump those rows."
+        )
+    )
+    parser.add_argument(
+        '--no-cache',
+        action='store_true',
+        help=(
+            "Dump records even if nothing a dump reads has changed since " +
+            "an earlier dump, which would otherwise be reused."
+        )
+    )
@@ -0,0 +1,167 @@
+#! /usr/bin/env python
+# -*- coding: utf-8 -*-
+
+from __future__ import unicode_literals
+import logging
+import os
+import os.path
+from peewee import SqliteDatabase, fn
+
+from dump import make_dump_filename
+from models import db_proxy, stream_query, TaskPeriod, LocationVisit, LocationRating,\
+    NavigationVertex, NavigationEdge, NavigationNgram, UniqueUrl, UrlDocumentFrequency, UniqueCue
+
+
+logger = logging.getLogger('data')
+ANALYTICS_DATABASE_FILE_EXTENSION = '.db'
+ANALYTICS_ROWS_PER_INSERT = 10000
+
+# The computed tables that are copied to the analytics database.  Vertices come before
+# edges, as edges refer to them.
+ANALYTICS_MODELS = [
+    TaskPeriod,
+    LocationVisit,
+    LocationRating,
+    NavigationVertex,
+    NavigationEdge,
+    NavigationNgram,
+    UniqueUrl,
+    UrlDocumentFrequency,
+    UniqueCue,
+]
+
+# Indexes for common analyses, built in addition to the indexes declared on each model.
+ANALYTICS_INDEXES = [
+    (TaskPeriod, [TaskPeriod.user_id, TaskPeriod.task_index]),
+    (LocationVisit, [LocationVisit.user_id, LocationVisit.task_index]),
+    (LocationVisit, [LocationVisit.user_id, LocationVisit.concern_index]),
+    (LocationRating, [LocationRating.user_id, LocationRating.task_index]),
+    (NavigationEdge, [NavigationEdge.source_vertex, NavigationEdge.target_vertex]),
+    (NavigationNgram, [NavigationNgram.user_id, NavigationNgram.concern_index]),
+]
+
+
+def _quote(name):
+    return '"' + name + '"'
+
+
+def _copy_table_with_attach(source_db, model, compute_index):
+    '''
+    Copy one version of a table from a SQLite database to the attached analytics database
+    without passing the rows through Python.  Columns are listed by name, in case
+    migrations have left them in a different order in the source table.
+    '''
+    table = _quote(model._meta.db_table)
+    columns = ', '.join([_quote(field.db_column) for field in model._meta.sorted_fields])
+    cursor = source_db.execute_sql(
+        "INSERT INTO analytics." + table + " (" + columns + ") " +
+        "SELECT " + columns + " FROM main." + table + " WHERE " +
+        _quote(model.compute_index.db_column) + " = ?",
+        (compute_index,)
+    )
+    return cursor.rowcount
+
+
+def _copy_table_with_inserts(analytics_db, model, compute_index):
+    ''' Copy one version of a table from any database to the analytics database, in batches. '''
+    fields = model._meta.sorted_fields
+    insert_sql = "INSERT INTO %s (%s) VALUES (%s)" % (
+        _quote(model._meta.db_table),
+        ', '.join([_quote(field.db_column) for field in fields]),
+        ', '.join(['?'] * len(fields)),
+    )
+    rows = model.select(*fields).where(model.compute_index == compute_index).tuples()
+
+    row_count = 0
+    batch = []
+    with analytics_db.atomic():
+        for row in stream_query(rows):
+            batch.append(row)
+            if len(batch) >= ANALYTICS_ROWS_PER_INSERT:
+                analytics_db.get_cursor().executemany(insert_sql, batch)
+                row_count += len(batch)
+                batch = []
+        if len(batch) > 0:
+            analytics_db.get_cursor().executemany(insert_sql, batch)
+            row_count += len(batch)
+    return row_count
+
+
+def _create_indexes(analytics_db):
+    for model in ANALYTICS_MODELS:
+        for field in model._fields_to_index():
+            analytics_db.create_index(model, [field], field.unique)
+        for fields, unique in model._meta.indexes:
+            analytics_db.create_index(model, fields, unique)
+    for model, fields in ANALYTICS_INDEXES:
+        analytics_db.create_index(model, fields)
+
+
+def export_analytics_database(filename):
+    '''
+    Copy the most recently computed version of each computed table into a standalone
+    SQLite database, with the same tables and columns as the source database.
+    If the source database is SQLite, rows are copied within SQLite by attaching
+    the new database; otherwise, they are read and inserted in batches.
+    Indexes are built after all rows have been copied, which is much faster than
+    updating them for each row.  Returns a dictionary from table name to row count.
+    '''
+    source_db = db_proxy.obj
+    analytics_db = SqliteDatabase(filename)
+    analytics_db.connect()
+    for model in ANALYTICS_MODELS:
+        analytics_db.create_table(model)
+
+    # Find the latest version of each table before copying any of them.
+    compute_indexes = [
+        (model, model.select(fn.Max(model.compute_index)).scalar())
+        for model in ANALYTICS_MODELS
+    ]
+
+    row_counts = {}
+    if isinstance(source_db, SqliteDatabase):
+        analytics_db.close()
+        source_db.execute_sql("ATTACH DATABASE ? AS analytics", (filename,))
+        try:
+            with source_db.atomic():
+                for model, compute_index in compute_indexes:
+                    row_counts[model._meta.db_table] =\
+                        _copy_table_with_attach(source_db, model, compute_index)
+        finally:
+            source_db.execute_sql("DETACH DATABASE analytics")
+        analytics_db.connect()
+    else:
+        for model, compute_index in compute_indexes:
+            row_counts[model._meta.db_table] =\
+                _copy_table_with_inserts(analytics_db, model, compute_index)
+
+    _create_indexes(analytics_db)
+    analytics_db.execute_sql("ANALYZE")
+    analytics_db.close()
+    return row_counts
+
+
+def main(*args, **kwargs):
+
+    # The database is built in a temporary file and then moved into place,
+    # so that a partially-built database is never left where analysts would find it.
+    dump_path = make_dump_filename(__name__, ANALYTICS_DATABASE_FILE_EXTENSION)
+    temporary_path = dump_path + '.tmp'
+    if os.path.exists(temporary_path):
+        os.remove(temporary_path)
+    try:
+        row_counts = export_analytics_database(temporary_path)
+        os.rename(temporary_path, dump_path)
+    finally:
+        if os.path.exists(temporary_path):
+            os.remove(temporary_path)
+
+    for table_name, row_count in sorted(row_counts.items()):
+        logger.info("Copied %d rows of %s", row_count, table_name)
+    logger.info("Saved analytics database to %s", dump_path)
+    return sum(row_counts.values())
+
+
+def configure_parser(parser):
+    parser.description = "Copy the most recently computed version of each computed table " +\
+        "into a standalone SQLite database that can be queried for analysis."
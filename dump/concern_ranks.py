@@ -5,16 +5,16 @@ from __future__ import unicode_literals
 import logging
 
 from dump import dump_csv
-from models import Postquestionnaire
+from models import Postquestionnaire, stream_query
 
 
 logger = logging.getLogger('data')
 
 
-@dump_csv(__name__, ["User", "Rank", "Concern"])
+@dump_csv(__name__, ["User", "Rank", "Concern"], sources=[Postquestionnaire])
 def main(*args, **kwargs):
 
-    for questionnaire in Postquestionnaire.select():
+    for questionnaire in stream_query(Postquestionnaire.select()):
         yield [
             [questionnaire.user_id, 1, questionnaire.concern_rank1],
             [questionnaire.user_id, 2, questionnaire.concern_rank2],
@@ -4,26 +4,32 @@
 from __future__ import unicode_literals
 import logging
 
-from compute.task_periods import _get_concern_index
+from compute.task_periods import concern_index_expression
 from dump import dump_csv
-from models import Question
+from models import Question, stream_query
 
 
 logger = logging.getLogger('data')
 
 
-@dump_csv(__name__, ["User", "Question Index", "Concern Index", "Concern", "Confidence"])
+@dump_csv(
+    __name__, ["User", "Question Index", "Concern Index", "Concern", "Confidence"],
+    sources=[Question])
 def main(*args, **kwargs):
 
-    for question in Question.select():
-        concern_index = _get_concern_index(question.user_id, question.question_index)
-        yield [[
-            question.user_id,
-            question.question_index,
-            concern_index,
-            question.concern,
-            question.likert_confidence,
-        ]]
+    questions = (
+        Question
+        .select(
+            Question.user_id,
+            Question.question_index,
+            concern_index_expression(Question.user_id, Question.question_index),
+            Question.concern,
+            Question.likert_confidence,
+        )
+        .tuples()
+    )
+    for question in stream_query(questions):
+        yield [question]
 
     raise StopIteration
 
@@ -5,13 +5,35 @@ from __future__ import unicode_literals
 import logging
 import functools
 from datetime import datetime
+import hashlib
 import json
 import codecs
+import errno
 import time
+import os
 import os.path
+import sys
+import zlib
+import bz2
+from peewee import fn, SQL
+
+from _columnar import run_and_dump_columnar
+from _page_types import hash_file
+from models import get_table_version
 
 
 logger = logging.getLogger('data')
+CSV_LINES_PER_WRITE = 1000
+
+# By default, files opened with `codecs.open` are line-buffered, which means each line is
+# flushed to disk as it's written.  We give dump files a large buffer instead.
+DUMP_FILE_BUFFER_SIZE = 1024 * 1024
+
+# Dumps streamed to standard output are written through a much smaller buffer, the size of
+# a pipe's buffer on Linux, so that a reader at the other end sees records soon after they're
+# dumped.  Writes block while the pipe is full, so no more than this is ever held back.
+STDOUT_BUFFER_SIZE = 64 * 1024
+COLUMNAR_FILE_EXTENSION = '.npz'
 
 
 '''
@@ -28,30 +50,84 @@ def my_func(*args, **kwargs):
 Will run my_func as a generator.  With each invokation of the generator, it will
 collect a JSON record or a list of records, and then dump those to a file
 with the basename "json-data".
+
+Dumps can also be given a `watermark`: a field that only increases as rows are added,
+like an ID or a compute index.  The watermark of each dump is saved to a manifest,
+and a dump run with the `since_last` option will only dump rows with a greater
+watermark to a new "delta" file, listed in the manifest with all earlier parts.
+Harvest functions for these dumps are passed the range of watermarks to dump
+as a `watermark_range` keyword argument.
+
+Some watermarks number whole generations of records rather than rows, like a compute
+index, where each new computation replaces the last.  These dumps should also be given
+`generation_watermark=True`.  Dumping one of them with `since_last` only makes a new dump
+if there's a new generation, and then dumps the whole generation to a new manifest that
+lists only it, so that earlier generations are never read as parts of the same dump.
+
+Dumps with named columns can be limited to some of their columns with the `columns` option.
+Harvest functions are passed the names of the columns being dumped as a `columns` keyword
+argument, so they can avoid fetching data that isn't needed.  They should still yield
+values for all columns (e.g., None for columns that aren't being dumped).
+
+The format of a dump with a watermark (its columns, file extension, compression, and
+whether it's columnar) is saved to its manifest.  All parts of a dump must have the same
+format, so a dump run with `since_last` in a different format than the manifest fails.
+
+Dumps can also list the models they read from as their `sources`.  Before one of these
+dumps is run, a fingerprint of its inputs is computed: the row count, highest ID, highest
+compute index, and version (see `models.TableVersion`) of each source, the contents of the
+page types file it's given, and the options it's run with.  If an earlier dump with the
+same fingerprint is still in the data/ directory, it's reused instead of dumping the same
+records again.  Commands that change rows in place must bump the version of their table
+for this to work.  As the fingerprint can't detect changes to a dump's code, run the dump
+with the `no_cache` option after changing it to make a fresh dump.
+
+Instead of a new file in the data/ directory, a dump can be written to another file with
+the `output` option, or streamed to standard output if `output` is "-".  These dumps aren't
+recorded in manifests or the cache.  If the reader of a dump streamed to standard output
+closes the pipe (e.g., `head`), the dump stops quietly.
 '''
 
 
-def dump_json(dest_basename):
-    ''' Iterate over a generator function and dump its JSON records to file. '''
+def dump_json(
+        dest_basename, compress=None, ndjson=False, watermark=None, generation_watermark=False,
+        sources=None):
+    '''
+    Iterate over a generator function and dump its JSON records to file.
+    By default, records are dumped as one JSON array.  If `ndjson` is True, they are
+    dumped as newline-delimited JSON (one record per line), which can be read
+    one record at a time, or split and processed in parallel.
+    '''
     return functools.partial(
         _wrap_harvest_func_with_dump_func,
-        dump_func=run_and_dump_json,
+        dump_func=run_and_dump_ndjson if ndjson else run_and_dump_json,
         dest_basename=dest_basename,
-        file_extension='.json',
+        file_extension='.ndjson' if ndjson else '.json',
+        compress=compress,
+        watermark=watermark,
+        generation_watermark=generation_watermark,
+        sources=sources,
     )
 
 
-def dump_text(dest_basename):
+def dump_text(
+        dest_basename, compress=None, watermark=None, generation_watermark=False, sources=None):
     ''' Iterate over a generator function to dump the text lines it yields to a file. '''
     return functools.partial(
         _wrap_harvest_func_with_dump_func,
         dump_func=run_and_dump_text,
         dest_basename=dest_basename,
         file_extension='.txt',
+        compress=compress,
+        watermark=watermark,
+        generation_watermark=generation_watermark,
+        sources=sources,
     )
 
 
-def dump_csv(dest_basename, column_names, delimiter=','):
+def dump_csv(
+        dest_basename, column_names, delimiter=',', compress=None, watermark=None,
+        generation_watermark=False, sources=None):
     ''' Iterate over a generator function to dump the text lines it yields to a file. '''
     return functools.partial(
         _wrap_harvest_func_with_dump_func,
@@ -62,15 +138,94 @@ def dump_csv(dest_basename, column_names, delimiter=','):
         ),
         dest_basename=dest_basename,
         file_extension='.csv',
+        compress=compress,
+        column_names=column_names,
+        watermark=watermark,
+        generation_watermark=generation_watermark,
+        sources=sources,
     )
 
 
-def make_dump_filename(dest_basename, file_extension):
+def dump_columnar(
+        dest_basename, column_names, watermark=None, generation_watermark=False, sources=None):
+    '''
+    Iterate over a generator function to dump the rows it yields to a file of typed columns.
+    See `_columnar` for a description of the format.
+    '''
+    return functools.partial(
+        _wrap_harvest_func_with_dump_func,
+        dump_func=None,
+        dest_basename=dest_basename,
+        file_extension=COLUMNAR_FILE_EXTENSION,
+        column_names=column_names,
+        columnar=True,
+        watermark=watermark,
+        generation_watermark=generation_watermark,
+        sources=sources,
+    )
+
+
+def _make_gzip_compressor():
+    # Adding 16 to the window size makes zlib write a gzip header and trailer.
+    return zlib.compressobj(zlib.Z_DEFAULT_COMPRESSION, zlib.DEFLATED, 16 + zlib.MAX_WBITS)
+
+
+def _make_xz_compressor():
+    # 'lzma' is only in the standard library from Python 3.3.  On Python 2,
+    # it can be installed from PyPI as 'backports.lzma'.
+    try:
+        import lzma
+    except ImportError:
+        try:
+            from backports import lzma
+        except ImportError:
+            raise ImportError(
+                "The \"lzma\" module is needed to compress dumps with xz.  " +
+                "On Python 2, install it with \"pip install backports.lzma\"."
+            )
+    return lzma.LZMACompressor()
+
+
+# For each type of compression, the extension added to the dump's filename,
+# and a function that creates a new compressor.
+COMPRESSORS = {
+    'gzip': ('.gz', _make_gzip_compressor),
+    'bz2': ('.bz2', bz2.BZ2Compressor),
+    'xz': ('.xz', _make_xz_compressor),
+}
+
+
+class CompressedFile(object):
+    '''
+    A binary file that compresses everything written to it.  Data is passed through
+    the compressor as it's written, so only the compressor's own window and the
+    file's buffer are ever held in memory.
+    '''
+    def __init__(self, file_, compressor):
+        self.file = file_
+        self.compressor = compressor
+
+    def write(self, data):
+        compressed_data = self.compressor.compress(data)
+        if compressed_data:
+            self.file.write(compressed_data)
+
+    def close(self):
+        try:
+            self.file.write(self.compressor.flush())
+        finally:
+            self.file.close()
+
+
+def make_dump_filename(dest_basename, file_extension, compress=None):
     '''
     Create the name of a file for the results of a data "dump".
+    If the dump is compressed, the compression type's extension is added to the name.
     One side-effect of this function is the creation of a 'dump' directory where
     this file can be saved.
     '''
+    if compress is not None:
+        file_extension += COMPRESSORS[compress][0]
     full_filename = dest_basename + '-' + time.strftime("%Y-%m-%d_%H:%M:%S") + file_extension
     if not os.path.exists('data'):
         os.makedirs('data')
@@ -78,68 +233,439 @@ def make_dump_filename(dest_basename, file_extension):
     return dump_path
 
 
-def _wrap_harvest_func_with_dump_func(harvest_func, dump_func, dest_basename, file_extension):
+def open_dump_file(dump_path, compress=None):
+    ''' Open a file for writing a dump to, which encodes all text written to it as UTF-8. '''
+    if compress is None:
+        return codecs.open(dump_path, 'w', encoding='utf-8', buffering=DUMP_FILE_BUFFER_SIZE)
+    _, make_compressor = COMPRESSORS[compress]
+    compressor = make_compressor()
+    compressed_file = CompressedFile(open(dump_path, 'wb', DUMP_FILE_BUFFER_SIZE), compressor)
+    return codecs.getwriter('utf-8')(compressed_file)
+
+
+def open_stdout_dump_file(compress=None):
+    '''
+    Open standard output for writing a dump to, encoding all text written to it as UTF-8.
+    Standard output is duplicated, so that closing this file leaves `sys.stdout` open.
+    '''
+    compressor = COMPRESSORS[compress][1]() if compress is not None else None
+    sys.stdout.flush()
+    stdout_file = os.fdopen(os.dup(sys.stdout.fileno()), 'wb', STDOUT_BUFFER_SIZE)
+    if compressor is not None:
+        stdout_file = CompressedFile(stdout_file, compressor)
+    return codecs.getwriter('utf-8')(stdout_file)
+
+
+def make_manifest_filename(dest_basename):
+    ''' Create the name of the manifest that lists all parts of a dump with a watermark. '''
+    return os.path.join('data', dest_basename + '-manifest.json')
+
+
+def load_manifest(dest_basename):
+    ''' Load the manifest for a dump, or return None if the dump hasn't been run yet. '''
+    manifest_filename = make_manifest_filename(dest_basename)
+    if not os.path.exists(manifest_filename):
+        return None
+    with open(manifest_filename) as manifest_file:
+        return json.load(manifest_file)
+
+
+def _save_json(filename, value):
+    # The file is written to a temporary file first and then moved into place,
+    # so that it's never left partially written.
+    temporary_filename = filename + '.tmp'
+    with open(temporary_filename, 'w') as json_file:
+        json.dump(value, json_file, indent=2)
+    os.rename(temporary_filename, filename)
+
+
+def _list_or_none(values):
+    return list(values) if values is not None else None
+
+
+def _start_manifest(watermark, dump_format):
+    ''' Create an empty manifest for a dump with a watermark, in a format. '''
+    manifest = {
+        'watermark_field': watermark.model_class._meta.db_table + '.' + watermark.name,
+        'parts': [],
+    }
+    manifest.update(dump_format)
+    return manifest
+
+
+def _add_manifest_part(manifest, filename, rows, low_watermark, high_watermark):
+    ''' List a new part of a dump in its manifest, and advance the manifest's watermark. '''
+    manifest['watermark'] = high_watermark
+    manifest['parts'].append({
+        'filename': filename,
+        'rows': rows,
+        'low_watermark': low_watermark,
+        'high_watermark': high_watermark,
+    })
+
+
+def _check_manifest_format(dest_basename, manifest, dump_format):
+    ''' Raise a ValueError if a dump's format differs from the format of its manifest. '''
+    differences = [
+        "%s %s (not %s)" % (key, json.dumps(manifest.get(key)), json.dumps(dump_format[key]))
+        for key in sorted(dump_format.keys())
+        if manifest.get(key) != dump_format[key]
+    ]
+    if differences:
+        raise ValueError(
+            "The last dump of %s had a different format: %s.  All parts of a dump must " %
+            (dest_basename, ", ".join(differences)) +
+            "have the same format, so it has to be dumped in full instead.")
+
+
+def _save_manifest(dest_basename, manifest):
+    _save_json(make_manifest_filename(dest_basename), manifest)
+
+
+def make_cache_filename(dest_basename):
+    ''' Create the name of the file that lists earlier dumps by the fingerprint of their inputs. '''
+    return os.path.join('data', dest_basename + '-cache.json')
+
+
+def load_dump_cache(dest_basename):
+    '''
+    Load the cache of earlier dumps, a dictionary from the fingerprint of a dump's inputs to
+    the name of its file and the number of rows in it.  Dumps whose files have been removed
+    from the data/ directory are left out.
+    '''
+    cache_filename = make_cache_filename(dest_basename)
+    if not os.path.exists(cache_filename):
+        return {}
+    with open(cache_filename) as cache_file:
+        cache = json.load(cache_file)
+    return {
+        fingerprint: entry for fingerprint, entry in cache.items()
+        if os.path.exists(os.path.join('data', entry['filename']))
+    }
+
+
+def fingerprint_dump_inputs(sources, options, page_types_json_filename=None):
+    '''
+    Compute a fingerprint of everything a dump reads: the row count, highest ID, highest
+    compute index (for computed records), and version of each source model, the contents of
+    the page types file, if one is used, and a dictionary of the options the dump was run with.
+    The row count and highest ID show when rows have been added or deleted, and the version
+    shows when rows have been changed in place, or deleted and replaced with the same IDs.
+    '''
+    source_stats = {}
+    for model in sources:
+        aggregates = [fn.Count(SQL('*')), fn.Max(model._meta.primary_key)]
+        if 'compute_index' in model._meta.fields:
+            aggregates.append(fn.Max(model._meta.fields['compute_index']))
+        source_stats[model._meta.db_table] = list(model.select(*aggregates).tuples().get()) +\
+            [get_table_version(model)]
+
+    page_types_hash = None
+    if page_types_json_filename is not None:
+        page_types_hash = hash_file(page_types_json_filename)
+
+    inputs = {
+        'sources': source_stats,
+        'page_types_sha1': page_types_hash,
+        'options': options,
+    }
+    return hashlib.sha1(json.dumps(inputs, sort_keys=True, default=str)).hexdigest()
+
+
+def in_watermark_range(field, watermark_range):
+    ''' Make a condition that selects rows with a value of `field` in a range of watermarks. '''
+    low_watermark, high_watermark = watermark_range
+    condition = (field <= high_watermark)
+    if low_watermark is not None:
+        condition &= (field > low_watermark)
+    return condition
+
+
+def select_columns(column_fields, columns):
+    '''
+    Get the fields to select for a dump whose columns are each read from one field.
+    `column_fields` is an ordered dictionary from each column's name to its field.
+    Columns that aren't being dumped are selected as NULL, so that rows always have
+    the same shape, but data that won't be dumped is never fetched.
+    '''
+    return [
+        field if column_name in columns else SQL('NULL')
+        for column_name, field in column_fields.items()
+    ]
+
+
+def _project_rows(harvest_func, column_indexes, *args, **kwargs):
+    for row_list in harvest_func(*args, **kwargs):
+        yield [[row[index] for index in column_indexes] for row in row_list]
+
+
+def _wrap_harvest_func_with_dump_func(
+        harvest_func, dump_func, dest_basename, file_extension, compress=None,
+        column_names=None, columnar=False, watermark=None, generation_watermark=False,
+        sources=None):
 
     @functools.wraps(harvest_func)
     def harvest_and_dump(*args, **kwargs):
-        dump_path = make_dump_filename(dest_basename, file_extension)
-        with codecs.open(dump_path, 'w', encoding='utf-8') as dump_file:
-            dump_func(harvest_func, dump_file, *args, **kwargs)
-
+        '''
+        Dump the records from the harvest function to a file.  Returns how many were dumped,
+        or None if they were streamed to standard output and the reader stopped reading.
+        '''
+
+        # The type of compression, and whether to dump rows to typed columns, can be chosen
+        # when the dump is run (e.g., with the '--compress' and '--columnar' command line
+        # options), overriding the decorator's defaults.
+        dump_compress = kwargs.pop('compress', None) or compress
+        dump_columnar = kwargs.pop('columnar', False) or columnar
+        since_last = kwargs.pop('since_last', False)
+        no_cache = kwargs.pop('no_cache', False)
+        output = kwargs.pop('output', None)
+
+        if dump_columnar:
+            if column_names is None:
+                raise ValueError("Only dumps with named columns can be dumped to typed columns.")
+            # Columns are stored uncompressed so they can be memory-mapped.
+            if dump_compress is not None:
+                raise ValueError("Columnar dumps can't be compressed.")
+        if since_last and watermark is None:
+            raise ValueError("Only dumps with a watermark can dump the rows since the last dump.")
+        if output is not None:
+            if since_last:
+                raise ValueError(
+                    "Dumps of the rows since the last dump can only be saved to the data/ " +
+                    "directory, where they're listed in the dump's manifest.")
+            if output == '-' and dump_columnar:
+                raise ValueError("Columnar dumps are zip archives, which can't be streamed.")
+
+        # Choose which columns to dump.  The harvest function is told which columns are being
+        # dumped, and then only those columns of the rows it yields are written.
+        columns = kwargs.pop('columns', None)
+        dump_harvest_func = harvest_func
+        dump_column_names = column_names
+        dump_rows_func = dump_func
+        if column_names is not None:
+            columns = columns or column_names
+            unknown_columns = [column for column in columns if column not in column_names]
+            if unknown_columns:
+                raise ValueError(
+                    "Unknown columns %s.  Columns must be some of: %s" %
+                    (unknown_columns, column_names))
+            kwargs['columns'] = columns
+            if list(columns) != list(column_names):
+                dump_harvest_func = functools.partial(
+                    _project_rows, harvest_func,
+                    [column_names.index(column) for column in columns],
+                )
+                dump_column_names = list(columns)
+                if dump_func is not None:
+                    dump_rows_func = functools.partial(dump_func, column_names=dump_column_names)
+        elif columns is not None:
+            raise ValueError("Only dumps with named columns can be limited to some columns.")
+
+        dump_format = {
+            'file_extension': COLUMNAR_FILE_EXTENSION if dump_columnar else file_extension,
+            'compress': None if dump_columnar else dump_compress,
+            'columnar': bool(dump_columnar),
+            'columns': _list_or_none(columns),
+        }
+
+        # If the inputs haven't changed since an earlier dump, reuse it instead.  Delta dumps
+        # are never cached, as the watermarks already keep them from dumping rows twice.
+        fingerprint = None
+        if sources is not None and not since_last and output is None:
+            fingerprint = fingerprint_dump_inputs(
+                sources, dump_format, kwargs.get('page_types_json_filename'))
+            cached_dump = load_dump_cache(dest_basename).get(fingerprint)
+
+            # A full dump with a watermark starts a new manifest, so reusing one means
+            # pointing the manifest back at it.  Dumps cached before their watermarks were
+            # saved to the cache can't be listed in a manifest, so they're dumped again.
+            if watermark is not None and cached_dump is not None and\
+                    'high_watermark' not in cached_dump:
+                cached_dump = None
+
+            if cached_dump is not None and not no_cache:
+                logger.info(
+                    "Inputs to %s haven't changed since it was dumped to %s.  Reusing that dump.",
+                    dest_basename, cached_dump['filename'])
+                if watermark is not None:
+                    manifest = _start_manifest(watermark, dump_format)
+                    _add_manifest_part(
+                        manifest, cached_dump['filename'], cached_dump['rows'],
+                        None, cached_dump['high_watermark'])
+                    _save_manifest(dest_basename, manifest)
+                return cached_dump['rows']
+
+        # Find the range of watermarks to dump.  The highest watermark is found before
+        # the dump starts, so that rows added during the dump are saved for the next one.
+        if watermark is not None:
+            manifest = load_manifest(dest_basename) if since_last else None
+            if manifest is not None:
+                _check_manifest_format(dest_basename, manifest, dump_format)
+            low_watermark = manifest['watermark'] if manifest is not None else None
+            high_watermark = watermark.model_class.select(fn.Max(watermark)).scalar()
+            if low_watermark is not None and (
+                    high_watermark is None or high_watermark <= low_watermark):
+                logger.info("No new rows to dump since the last dump of %s.", dest_basename)
+                return 0
+
+            # A new generation replaces all earlier ones, so it's dumped in full to a new
+            # manifest, rather than added to the manifest as another part of the same dump.
+            if generation_watermark:
+                manifest = None
+                low_watermark = None
+            kwargs['watermark_range'] = (low_watermark, high_watermark)
+
+        # Delta files are named by the watermark they start after, as well as the time
+        # they were made, in case two of them are made within the same second.
+        part_basename = dest_basename
+        if watermark is not None and low_watermark is not None:
+            part_basename += '-since-' + str(low_watermark)
+
+        if dump_columnar:
+            dump_path = output or make_dump_filename(part_basename, COLUMNAR_FILE_EXTENSION)
+            row_count = run_and_dump_columnar(
+                dump_harvest_func, dump_path, dump_column_names, *args, **kwargs)
+        else:
+            if output == '-':
+                dump_path = None
+                dump_file = open_stdout_dump_file(dump_compress)
+            else:
+                dump_path = output or make_dump_filename(
+                    part_basename, file_extension, dump_compress)
+                dump_file = open_dump_file(dump_path, dump_compress)
+            try:
+                try:
+                    row_count = dump_rows_func(dump_harvest_func, dump_file, *args, **kwargs)
+                finally:
+                    dump_file.close()
+            except IOError as error:
+                # The reader of a dump streamed through a pipe may stop before the end
+                # (like `head`).  There's no one left to dump to, so we just stop.
+                if dump_path is not None or error.errno != errno.EPIPE:
+                    raise
+                logger.info("The reader of %s closed the pipe.  Stopping the dump.", dest_basename)
+                return None
+
+        # Record this part of the dump in the manifest.  A full dump starts a new manifest.
+        if watermark is not None and output is None:
+            if manifest is None:
+                manifest = _start_manifest(watermark, dump_format)
+            _add_manifest_part(
+                manifest, os.path.basename(dump_path), row_count, low_watermark, high_watermark)
+            _save_manifest(dest_basename, manifest)
+
+        # Record the dump in the cache.  If it replaced an earlier dump made within the same
+        # second, the earlier dump's entry is dropped, as its file now has different records.
+        if fingerprint is not None:
+            dump_filename = os.path.basename(dump_path)
+            cache = {
+                cached_fingerprint: entry
+                for cached_fingerprint, entry in load_dump_cache(dest_basename).items()
+                if entry['filename'] != dump_filename
+            }
+            cache[fingerprint] = {'filename': dump_filename, 'rows': row_count}
+            if watermark is not None:
+                cache[fingerprint]['high_watermark'] = high_watermark
+            _save_json(make_cache_filename(dest_basename), cache)
+
+        return row_count
+
+    # Mark the function as one that dumps to a file, so that dump options can be offered for it.
+    harvest_and_dump.dump_file_extension = file_extension
+    harvest_and_dump.dump_column_names = column_names
+    harvest_and_dump.dump_watermark = watermark
+    harvest_and_dump.dump_generation_watermark = generation_watermark
+    harvest_and_dump.dump_sources = sources
     return harvest_and_dump
 
 
 def run_and_dump_text(harvest_func, dump_file, *args, **kwargs):
 
+    line_count = 0
     for line_list in harvest_func(*args, **kwargs):
         for line in line_list:
             dump_file.write(line + '\n')
+            line_count += 1
 
+    return line_count
 
-def run_and_dump_csv(harvest_func, dump_file, column_names, delimiter, *args, **kwargs):
 
-    def make_csv_line(record):
-        # Convert all elements of the record into good CSV:
-        # encapsulate all strings within double quotes, and
-        # convert all other data types to writable strings.
-        for index, item in enumerate(record):
-            if type(item) == str or type(item) == unicode:
-                escaped_string = item.replace('\r\n', "<newline>")
-                escaped_string = escaped_string.replace('\n', "<newline>")
-                record[index] = '"' + escaped_string + '"'
-            elif isinstance(item, datetime):
-                record[index] = item.isoformat()
-            else:
-                record[index] = str(item)
-        return delimiter.join(record) + '\n'
+def _format_csv_item(item):
+    '''
+    Convert an item into good CSV: encapsulate all strings within double quotes
+    (replacing newlines with "<newline>"), and convert all other data types to writable strings.
+    '''
+    item_type = type(item)
+    if item_type is unicode or item_type is str:
+        if '\n' in item:
+            item = item.replace('\r\n', "<newline>").replace('\n', "<newline>")
+        return '"' + item + '"'
+    elif isinstance(item, datetime):
+        return item.isoformat()
+    return str(item)
+
 
-    dump_file.write(make_csv_line(column_names))
+def _make_csv_line(record, delimiter):
+    return delimiter.join([_format_csv_item(item) for item in record]) + '\n'
 
+
+def run_and_dump_csv(harvest_func, dump_file, column_names, delimiter, *args, **kwargs):
+
+    dump_file.write(_make_csv_line(column_names, delimiter))
+
+    # Lines are collected and written in large chunks, rather than one at a time,
+    # as each write to the file has to be encoded and passed through the file's buffers.
+    lines = []
+    line_count = 0
     for line_list in harvest_func(*args, **kwargs):
         for line in line_list:
-            dump_file.write(make_csv_line(line))
+            lines.append(_make_csv_line(line, delimiter))
+        if len(lines) >= CSV_LINES_PER_WRITE:
+            dump_file.write(''.join(lines))
+            line_count += len(lines)
+            lines = []
+
+    dump_file.write(''.join(lines))
+    return line_count + len(lines)
+
+
+def _convert_to_json(value):
+    # The JSON encoder only calls this for values it doesn't know how to encode.
+    if isinstance(value, datetime):
+        return value.isoformat()
+    raise TypeError(repr(value) + " is not JSON serializable")
+
+
+# One encoder is shared by all dumps.  Non-JSON data (like datetimes) is converted
+# by the encoder as it meets it, so records don't have to be checked and copied first.
+JSON_ENCODER = json.JSONEncoder(default=_convert_to_json)
 
 
 def run_and_dump_json(harvest_func, dump_file, *args, **kwargs):
 
     dump_file.write('[\n')
-    first_record = True
+    record_count = 0
+    encode = JSON_ENCODER.encode
 
     for value_list in harvest_func(*args, **kwargs):
         for record in value_list:
 
-            if not first_record:
+            if record_count > 0:
                 dump_file.write(',\n')
 
-            # Convert non-JSON data to JSON
-            cleaned_record = {}
-            for field, value in record.items():
-                if isinstance(value, datetime):
-                    cleaned_record[field] = value.isoformat()
-                else:
-                    cleaned_record[field] = value
-
-            dump_file.write(json.dumps(cleaned_record))
-            first_record = False
+            dump_file.write(encode(record))
+            record_count += 1
 
     dump_file.write('\n]')
+    return record_count
+
+
+def run_and_dump_ndjson(harvest_func, dump_file, *args, **kwargs):
+
+    record_count = 0
+    encode = JSON_ENCODER.encode
+    for value_list in harvest_func(*args, **kwargs):
+        dump_file.write(''.join([encode(record) + '\n' for record in value_list]))
+        record_count += len(value_list)
+
+    return record_count
@@ -3,29 +3,37 @@
 
 from __future__ import unicode_literals
 import logging
+from collections import OrderedDict
 
-from dump import dump_csv
-from models import LocationEvent
+from dump import dump_csv, in_watermark_range, select_columns
+from models import LocationEvent, stream_query
 
 
 logger = logging.getLogger('data')
-
-
-@dump_csv(__name__, [
-    "Id", "User", "Visit Date", "Log Date", "Title", "URL", "Event type", "Tab ID"])
-def main(*args, **kwargs):
-
-    for event in LocationEvent.select():
-        yield [[
-            event.id,
-            event.user_id,
-            event.visit_date,
-            event.log_date,
-            event.title,
-            event.url,
-            event.event_type,
-            event.tab_id,
-        ]]
+COLUMN_FIELDS = OrderedDict([
+    ("Id", LocationEvent.id),
+    ("User", LocationEvent.user_id),
+    ("Visit Date", LocationEvent.visit_date),
+    ("Log Date", LocationEvent.log_date),
+    ("Title", LocationEvent.title),
+    ("URL", LocationEvent.url),
+    ("Event type", LocationEvent.event_type),
+    ("Tab ID", LocationEvent.tab_id),
+])
+
+
+@dump_csv(
+    __name__, COLUMN_FIELDS.keys(), watermark=LocationEvent.id, sources=[LocationEvent])
+def main(watermark_range, columns, *args, **kwargs):
+
+    events = (
+        LocationEvent
+        .select(*select_columns(COLUMN_FIELDS, columns))
+        .where(in_watermark_range(LocationEvent.id, watermark_range))
+        .tuples()
+    )
+    for event in stream_query(events):
+        yield [event]
 
     raise StopIteration
 
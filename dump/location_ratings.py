@@ -3,13 +3,13 @@
 
 from __future__ import unicode_literals
 import logging
-from peewee import fn
 from urlparse import urlparse
-import json
+from peewee import SQL
 
 from dump import dump_csv
 from _urls import standardize_url
-from models import LocationRating
+from _page_types import load_page_type_lookup
+from models import LocationRating, stream_query
 
 
 logger = logging.getLogger('data')
@@ -18,52 +18,65 @@ PILOT_MAX_USER_ID = 4
 
 @dump_csv(__name__, [
     "Compute Index", "User", "Task Index", "Concern Index", "URL", "Domain", "Page Type",
-    "Rating", "Page Title", "Visit Date"])
-def main(page_types_json_filename, *args, **kwargs):
+    "Rating", "Page Title", "Visit Date"],
+    watermark=LocationRating.compute_index, generation_watermark=True,
+    sources=[LocationRating])
+def main(page_types_json_filename, watermark_range, columns, *args, **kwargs):
 
-    with open(page_types_json_filename) as page_types_file:
-        page_types = json.load(page_types_file)
+    page_types = load_page_type_lookup(page_types_json_filename)
 
     # Only dump the most recently computed location ratings (ignore all others).
-    latest_compute_index = LocationRating.select(fn.Max(LocationRating.compute_index)).scalar()
+    # This is the highest compute index in the range of watermarks given for this dump.
+    _, latest_compute_index = watermark_range
     ratings = (
         LocationRating
-        .select()
+        .select(
+            LocationRating.user_id,
+            LocationRating.task_index,
+            LocationRating.concern_index,
+            LocationRating.url,
+            LocationRating.rating,
+            # Titles can be long, so they're only fetched if they'll be dumped.
+            LocationRating.title if "Page Title" in columns else SQL('NULL'),
+            LocationRating.visit_date,
+        )
         .where(
             LocationRating.compute_index == latest_compute_index
         )
+        .tuples()
     )
 
     # Store a list of URLs for which labels are missing
     urls_without_labels = set()
 
-    for rating in ratings:
+    for user_id, task_index, concern_index, url, rating, title, visit_date in\
+            stream_query(ratings):
 
         # Get the domain name of where this rating happened
-        url_parsed = urlparse(rating.url)
+        url_parsed = urlparse(url)
         domain = url_parsed.netloc.lstrip("www.")
 
         # Fetch semantic labels for this URL
         # Store missing URLs for non-pilot study participants.
         # Currently, it's not important for us to be able to classify URLs for pilot participants.
-        unique_url = standardize_url(rating.url)
+        unique_url = standardize_url(url)
         if unique_url not in page_types:
-            if rating.user_id > PILOT_MAX_USER_ID:
+            if user_id > PILOT_MAX_USER_ID:
                 urls_without_labels.add(unique_url)
         else:
             page_type = page_types[unique_url]['main_type']
 
         yield [[
-            rating.compute_index,
-            rating.user_id,
-            rating.task_index,
-            rating.concern_index,
-            rating.url,
+            latest_compute_index,
+            user_id,
+            task_index,
+            concern_index,
+            url,
             domain,
             page_type,
-            rating.rating,
-            rating.title,
-            rating.visit_date,
+            rating,
+            title,
+            visit_date,
         ]]
 
     # Print out a list of URLs for which labels were not found
@@ -3,13 +3,13 @@
 
 from __future__ import unicode_literals
 import logging
-from peewee import fn
 from urlparse import urlparse
-import json
+from peewee import SQL
 
 from dump import dump_csv
 from _urls import standardize_url
-from models import LocationVisit
+from _page_types import load_page_type_lookup
+from models import LocationVisit, stream_query
 
 
 logger = logging.getLogger('data')
@@ -20,26 +20,40 @@ PILOT_MAX_USER_ID = 4
     "Compute Index", "User", "Task Index", "Concern Index", "Tab ID", "URL",
     "Unique URL", "Domain", "Path", "Fragment", "Query", "Page Type",
     "Page Title", "Start Time", "End Time", "Time passed (s)"],
-    delimiter='|')
-def main(page_types_json_filename, *args, **kwargs):
+    delimiter='|', watermark=LocationVisit.compute_index, generation_watermark=True,
+    sources=[LocationVisit])
+def main(page_types_json_filename, watermark_range, columns, *args, **kwargs):
 
-    with open(page_types_json_filename) as page_types_file:
-        page_types = json.load(page_types_file)
+    page_types = load_page_type_lookup(page_types_json_filename)
 
     # Only dump the most recently computed location visits (ignore all others).
-    latest_compute_index = LocationVisit.select(fn.Max(LocationVisit.compute_index)).scalar()
+    # This is the highest compute index in the range of watermarks given for this dump.
+    _, latest_compute_index = watermark_range
     visits = (
         LocationVisit
-        .select()
+        .select(
+            LocationVisit.user_id,
+            LocationVisit.task_index,
+            LocationVisit.concern_index,
+            LocationVisit.tab_id,
+            LocationVisit.url,
+            LocationVisit.standard_url,
+            # Titles can be long, so they're only fetched if they'll be dumped.
+            LocationVisit.title if "Page Title" in columns else SQL('NULL'),
+            LocationVisit.start,
+            LocationVisit.end,
+        )
         .where(
             LocationVisit.compute_index == latest_compute_index,
         )
+        .tuples()
     )
 
     # Store a list of URLs for which labels are missing
     urls_without_labels = set()
 
-    for visit in visits:
+    for user_id, task_index, concern_index, tab_id, url, standard_url, title, start, end in\
+            stream_query(visits):
 
         # Split URL into the constituent parts that can be used
         # to uniquely identify this URL in relation to others.
@@ -47,7 +61,7 @@ def main(page_types_json_filename, *args, **kwargs):
         # page, this isn't always true.  Take the forum PHP script for Panda3D as an example.
         # The same is true with fragments, specifically for Google Groups, where fragments
         # are used to select different groups and topics.
-        url_parsed = urlparse(visit.url)
+        url_parsed = urlparse(url)
         path = url_parsed.path
         fragment = url_parsed.fragment
         query = url_parsed.query
@@ -56,32 +70,32 @@ def main(page_types_json_filename, *args, **kwargs):
         # Fetch semantic labels for this URL
         # Store missing URLs for non-pilot study participants.
         # Currently, it's not important for us to be able to classify URLs for pilot participants.
-        unique_url = standardize_url(visit.url)
+        unique_url = standard_url or standardize_url(url)
         if unique_url not in page_types:
-            if visit.user_id > PILOT_MAX_USER_ID:
+            if user_id > PILOT_MAX_USER_ID:
                 urls_without_labels.add(unique_url)
         else:
             page_type = page_types[unique_url]['main_type']
 
-        time_passed = visit.end - visit.start
+        time_passed = end - start
         seconds = time_passed.seconds + (time_passed.microseconds / float(1000000))
 
         yield [[
-            visit.compute_index,
-            visit.user_id,
-            visit.task_index,
-            visit.concern_index,
-            visit.tab_id,
-            visit.url,
+            latest_compute_index,
+            user_id,
+            task_index,
+            concern_index,
+            tab_id,
+            url,
             unique_url,
             domain,
             path,
             fragment,
             query,
             page_type,
-            visit.title,
-            visit.start,
-            visit.end,
+            title,
+            start,
+            end,
             seconds,
         ]]
 
@@ -5,7 +5,7 @@ from __future__ import unicode_literals
 import logging
 
 from dump import dump_csv
-from models import Question, Postquestionnaire, PackageComparison
+from models import Question, Postquestionnaire, PackageComparison, stream_query
 
 
 logger = logging.getLogger('data')
@@ -15,10 +15,12 @@ logger = logging.getLogger('data')
 # This is because we can easily filter down to a specific question with the
 # "Question" column, and it keeps us from writing a dozen dump scripts
 # that will all have nearly equivalent logic.
-@dump_csv(__name__, ["User", "Question", "N/A"])
+@dump_csv(
+    __name__, ["User", "Question", "N/A"],
+    sources=[Question, PackageComparison, Postquestionnaire])
 def main(*args, **kwargs):
 
-    for question in Question.select():
+    for question in stream_query(Question.select()):
         comparison_title = "Task " + str(question.question_index) + " package comparison"
         confidence_title = "Task " + str(question.question_index) + " confidence"
         yield [
@@ -26,7 +28,7 @@ def main(*args, **kwargs):
             [question.user_id, confidence_title, question.na_likert_confidence],
         ]
 
-    for comparison in PackageComparison.select():
+    for comparison in stream_query(PackageComparison.select()):
         yield [
             [comparison.user_id, "Preference " + comparison.stage, comparison.na_likert_preference],
             [comparison.user_id, "Documentation Quality " + comparison.stage,
@@ -35,7 +37,7 @@ def main(*args, **kwargs):
                 comparison.na_likert_quality_community],
         ]
 
-    for postquestionnaire in Postquestionnaire.select():
+    for postquestionnaire in stream_query(Postquestionnaire.select()):
         yield [
             [postquestionnaire.user_id, "Perception Change",
                 postquestionnaire.na_likert_perception_change]
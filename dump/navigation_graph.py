@@ -7,7 +7,7 @@ from peewee import fn
 import numpy as np
 
 from dump import make_dump_filename
-from models import NavigationVertex, NavigationEdge
+from models import NavigationVertex, NavigationEdge, stream_query
 
 
 logger = logging.getLogger('data')
@@ -71,7 +71,7 @@ def main(compute_index, output_format, *args, **kwargs):
     edge_models = NavigationEdge.select().where(NavigationEdge.compute_index == compute_index)
 
     # Add vertices to graph and save vertex properties
-    for vertex_model in vertex_models:
+    for vertex_model in stream_query(vertex_models):
 
         # Add a vertex to the graph and save its properties
         vertex = graph.add_vertex()
@@ -82,7 +82,7 @@ def main(compute_index, output_format, *args, **kwargs):
         vertex_occurrences.append(vertex_model.occurrences)
 
     # Add edges to the graph and save their properties
-    for edge_model in edge_models:
+    for edge_model in stream_query(edge_models):
         graph.add_edge(
             # We look up vertices using the '_vertex_id' properties because this is already
             # retrieved in the fetched rows.  Note that if we want to look it up by
@@ -3,25 +3,34 @@
 
 from __future__ import unicode_literals
 import logging
+from collections import OrderedDict
 
-from dump import dump_csv
-from models import NavigationNgram
+from dump import dump_csv, in_watermark_range, select_columns
+from models import NavigationNgram, stream_query
 
 
 logger = logging.getLogger('data')
-
-
-@dump_csv(__name__, ["Compute Index", "User", "Concern Index", "Length", "Ngram"])
-def main(*args, **kwargs):
-
-    for ngram in NavigationNgram.select():
-        yield [[
-            ngram.compute_index,
-            ngram.user_id,
-            ngram.concern_index,
-            ngram.length,
-            ngram.ngram,
-        ]]
+COLUMN_FIELDS = OrderedDict([
+    ("Compute Index", NavigationNgram.compute_index),
+    ("User", NavigationNgram.user_id),
+    ("Concern Index", NavigationNgram.concern_index),
+    ("Length", NavigationNgram.length),
+    ("Ngram", NavigationNgram.ngram),
+])
+
+
+@dump_csv(
+    __name__, COLUMN_FIELDS.keys(), watermark=NavigationNgram.id, sources=[NavigationNgram])
+def main(watermark_range, columns, *args, **kwargs):
+
+    ngrams = (
+        NavigationNgram
+        .select(*select_columns(COLUMN_FIELDS, columns))
+        .where(in_watermark_range(NavigationNgram.id, watermark_range))
+        .tuples()
+    )
+    for ngram in stream_query(ngrams):
+        yield [ngram]
 
     raise StopIteration
 
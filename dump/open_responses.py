@@ -4,9 +4,9 @@
 from __future__ import unicode_literals
 import logging
 
-from compute.task_periods import _get_concern_index
+from compute.task_periods import concern_index_expression
 from dump import dump_csv
-from models import Strategy, Question, PackagePair
+from models import Strategy, Question, PackagePair, stream_query
 
 
 logger = logging.getLogger('data')
@@ -28,43 +28,69 @@ for concern in CONCERNS_SHORTHAND:
     column_names.append("Evidence of " + concern)
 
 
-@dump_csv(__name__, column_names, delimiter='|')
+@dump_csv(__name__, column_names, delimiter='|', sources=[PackagePair, Question, Strategy])
 def main(*args, **kwargs):
 
-    # Fetch distinct user IDs from the question data
-    user_ids = [
-        question.user_id for question in
-        Question.select(Question.user_id).group_by(Question.user_id)
-    ]
+    # Fetch the pair of packages that each participant used.
+    # If a participant somehow has more than one pair, the first one is used.
+    package_pairs = {}
+    package_pair_rows = (
+        PackagePair
+        .select(PackagePair.user_id, PackagePair.package1, PackagePair.package2)
+        .order_by(PackagePair.id)
+        .tuples()
+    )
+    for user_id, package1, package2 in stream_query(package_pair_rows):
+        package_pairs.setdefault(user_id, (package1, package2))
+
+    # Build a blank record for each participant who answered questions, that we can
+    # index by concern index, and save all "evidence" question responses, in concern order.
+    user_records = {}
+    questions = (
+        Question
+        .select(
+            Question.user_id,
+            concern_index_expression(Question.user_id, Question.question_index),
+            Question.evidence,
+        )
+        .order_by(Question.id)
+        .tuples()
+    )
+    for user_id, concern_index, evidence in stream_query(questions):
+        if user_id not in user_records:
+            user_records[user_id] = {
+                'strategies': ["No response." for _ in range(len(CONCERNS_SHORTHAND))],
+                'evidence': ["No response." for _ in range(len(CONCERNS_SHORTHAND))],
+            }
+        user_records[user_id]['evidence'][concern_index] = evidence
+
+    # Save all of the "strategy" question responses, in concern order
+    strategies = (
+        Strategy
+        .select(
+            Strategy.user_id,
+            concern_index_expression(Strategy.user_id, Strategy.question_index),
+            Strategy.strategy,
+        )
+        .order_by(Strategy.id)
+        .tuples()
+    )
+    for user_id, concern_index, strategy in stream_query(strategies):
+        if user_id not in user_records:
+            continue
+        user_records[user_id]['strategies'][concern_index] = strategy
 
     # Yield a record of all participant responses for each participant
-    for user_id in user_ids:
-
-        # Build a new blank record for this participant that we can index by concern index.
-        user_record = {
-            'strategies': ["No response." for _ in range(len(CONCERNS_SHORTHAND))],
-            'evidence': ["No response." for _ in range(len(CONCERNS_SHORTHAND))],
-        }
-
-        # Fetch a reference to the pair of packages that the participant used
-        package_pair = PackagePair.select().where(PackagePair.user_id == user_id).first()
-
-        # Save all of the "evidence" question responses, in concern order
-        for question in Question.select().where(Question.user_id == user_id):
-            concern_index = _get_concern_index(user_id, question.question_index)
-            user_record['evidence'][concern_index] = question.evidence
-
-        # Save all of the "strategy" question responses, in concern order
-        for strategy in Strategy.select().where(Strategy.user_id == user_id):
-            concern_index = _get_concern_index(user_id, strategy.question_index)
-            user_record['strategies'][concern_index] = strategy.strategy
+    for user_id in sorted(user_records.keys()):
 
         # Assemble and return a single row of a CSV file for the user
+        user_record = user_records[user_id]
+        package1, package2 = package_pairs[user_id]
         response_list = [
             "Search study responses",
             "Participant " + str(user_id),
-            package_pair.package1,
-            package_pair.package2,
+            package1,
+            package2,
         ]
         response_list.extend(user_record['strategies'])
         response_list.extend(user_record['evidence'])
@@ -4,10 +4,10 @@
 from __future__ import unicode_literals
 import logging
 
-from compute.task_periods import _get_concern_index
+from compute.task_periods import concern_index_expression
 from dump import dump_csv
 from _clean_data import normalize_user_id
-from models import Question, PackagePair
+from models import Question, PackagePair, stream_query
 
 
 logger = logging.getLogger('data')
@@ -22,7 +22,7 @@ def _standardize_package_name(package_name):
 @dump_csv(__name__, [
     "User", "Question Index", "Concern Index",
     "Comparison Rating", "Package 1", "Package 2"
-])
+], sources=[Question, PackagePair])
 def main(*args, **kwargs):
 
     # Join the questions table on the packagepair table so that
@@ -37,6 +37,8 @@ def main(*args, **kwargs):
         .select(
             Question.user_id,
             Question.question_index,
+            concern_index_expression(Question.user_id, Question.question_index)
+            .alias('concern_index'),
             Question.likert_comparison_evidence,
             PackagePair.package1,
             PackagePair.package2,
@@ -45,12 +47,11 @@ def main(*args, **kwargs):
         .naive()
     )
 
-    for question in questions:
-        concern_index = _get_concern_index(question.user_id, question.question_index)
+    for question in stream_query(questions):
         yield [[
             normalize_user_id(question.user_id),
             question.question_index,
-            concern_index,
+            question.concern_index,
             question.likert_comparison_evidence,
             _standardize_package_name(question.package1),
             _standardize_package_name(question.package2),
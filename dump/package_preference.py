@@ -5,7 +5,7 @@ from __future__ import unicode_literals
 import logging
 
 from dump import dump_csv
-from models import PackageComparison, PackagePair
+from models import PackageComparison, PackagePair, stream_query
 
 
 logger = logging.getLogger('data')
@@ -17,7 +17,9 @@ def _standardize_package_name(package_name):
     return lower_case
 
 
-@dump_csv(__name__, ["User", "Stage", "Comparison Rating", "Package 1", "Package 2"])
+@dump_csv(
+    __name__, ["User", "Stage", "Comparison Rating", "Package 1", "Package 2"],
+    sources=[PackageComparison, PackagePair])
 def main(*args, **kwargs):
 
     # See the note on formulating this query in `dump/package_comparisons.py`
@@ -34,7 +36,7 @@ def main(*args, **kwargs):
         .naive()
     )
 
-    for comparison in comparisons:
+    for comparison in stream_query(comparisons):
         yield [[
             comparison.user_id,
             comparison.stage,
@@ -0,0 +1,46 @@
+#! /usr/bin/env python
+# -*- coding: utf-8 -*-
+
+from __future__ import unicode_literals
+import logging
+from peewee import fn
+
+from dump import dump_csv
+from models import LocationVisit, PageType, stream_query
+
+
+logger = logging.getLogger('data')
+
+
+@dump_csv(
+    __name__, ["Compute Index", "Page Type", "Visits", "Participants"],
+    sources=[LocationVisit, PageType])
+def main(*args, **kwargs):
+
+    # Count the visits to each type of page, for the most recently computed location visits.
+    # This relies on the page types having been imported into the database, and on the visits
+    # having been saved with their standardized URLs, so that the database can do the grouping.
+    latest_compute_index = LocationVisit.select(fn.Max(LocationVisit.compute_index)).scalar()
+    page_type_counts = (
+        LocationVisit
+        .select(
+            PageType.main_type,
+            fn.Count(LocationVisit.id),
+            fn.Count(fn.Distinct(LocationVisit.user_id)),
+        )
+        .join(PageType, on=(LocationVisit.standard_url == PageType.url))
+        .where(LocationVisit.compute_index == latest_compute_index)
+        .group_by(PageType.main_type)
+        .order_by(PageType.main_type)
+        .tuples()
+    )
+
+    for main_type, visit_count, participant_count in stream_query(page_type_counts):
+        yield [[latest_compute_index, main_type, visit_count, participant_count]]
+
+    raise StopIteration
+
+
+def configure_parser(parser):
+    parser.description = "Dump counts of visits to each type of page.  Page types must first " +\
+        "be imported with the 'import page_types' command."
@@ -3,35 +3,39 @@
 
 from __future__ import unicode_literals
 import logging
+from collections import OrderedDict
 
-from dump import dump_csv
-from models import Prequestionnaire
+from dump import dump_csv, select_columns
+from models import Prequestionnaire, stream_query
 
 
 logger = logging.getLogger('data')
 
 
-@dump_csv(__name__, [
-    "User", "Years Programming", "Years Programming with Python",
-    "Years Programming Professionally", "Reason to Write Code",
-    "Programming Proficiency", "Python Proficiency", "Occupation",
-    "Occupation (Other)", "Gender",
+COLUMN_FIELDS = OrderedDict([
+    ("User", Prequestionnaire.user_id),
+    ("Years Programming", Prequestionnaire.programming_years),
+    ("Years Programming with Python", Prequestionnaire.python_years),
+    ("Years Programming Professionally", Prequestionnaire.professional_years),
+    ("Reason to Write Code", Prequestionnaire.coding_reason),
+    ("Programming Proficiency", Prequestionnaire.programming_proficiency),
+    ("Python Proficiency", Prequestionnaire.python_proficiency),
+    ("Occupation", Prequestionnaire.occupation),
+    ("Occupation (Other)", Prequestionnaire.occupation_other),
+    ("Gender", Prequestionnaire.gender),
 ])
-def main(*args, **kwargs):
-
-    for questionnaire in Prequestionnaire.select():
-        yield [[
-            questionnaire.user_id,
-            questionnaire.programming_years,
-            questionnaire.python_years,
-            questionnaire.professional_years,
-            questionnaire.coding_reason,
-            questionnaire.programming_proficiency,
-            questionnaire.python_proficiency,
-            questionnaire.occupation,
-            questionnaire.occupation_other,
-            questionnaire.gender,
-        ]]
+
+
+@dump_csv(__name__, COLUMN_FIELDS.keys(), sources=[Prequestionnaire])
+def main(columns, *args, **kwargs):
+
+    questionnaires = (
+        Prequestionnaire
+        .select(*select_columns(COLUMN_FIELDS, columns))
+        .tuples()
+    )
+    for questionnaire in stream_query(questionnaires):
+        yield [questionnaire]
 
     raise StopIteration
 
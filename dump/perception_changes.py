@@ -3,19 +3,31 @@
 
 from __future__ import unicode_literals
 import logging
+from collections import OrderedDict
 
-from dump import dump_csv
-from models import Postquestionnaire
+from dump import dump_csv, select_columns
+from models import Postquestionnaire, stream_query
 
 
 logger = logging.getLogger('data')
 
 
-@dump_csv(__name__, ["User", "Perception change"])
-def main(*args, **kwargs):
+COLUMN_FIELDS = OrderedDict([
+    ("User", Postquestionnaire.user_id),
+    ("Perception change", Postquestionnaire.likert_perception_change),
+])
 
-    for postquestionnaire in Postquestionnaire.select():
-        yield [[postquestionnaire.user_id, postquestionnaire.likert_perception_change]]
+
+@dump_csv(__name__, COLUMN_FIELDS.keys(), sources=[Postquestionnaire])
+def main(columns, *args, **kwargs):
+
+    postquestionnaires = (
+        Postquestionnaire
+        .select(*select_columns(COLUMN_FIELDS, columns))
+        .tuples()
+    )
+    for postquestionnaire in stream_query(postquestionnaires):
+        yield [postquestionnaire]
 
     raise StopIteration
 
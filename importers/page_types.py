@@ -0,0 +1,52 @@
+#! /usr/bin/env python
+# -*- coding: utf-8 -*-
+
+from __future__ import unicode_literals
+import logging
+import json
+
+from dump._page_types import load_page_type_lookup
+from models import PageType, BatchInserter, bump_table_version
+
+
+logger = logging.getLogger('data')
+PAGE_TYPE_BATCH_SIZE = 100
+
+
+def import_page_types(page_type_lookup):
+    '''
+    Replace the contents of the page type table with the records in a page type lookup.
+    The lookup is a dictionary from standardized URL to a dictionary with its main type,
+    whether it's a redirect, and the list of all of its types.
+    '''
+    page_type_inserter = BatchInserter(PageType, batch_size=PAGE_TYPE_BATCH_SIZE)
+    with PageType._meta.database.atomic(), page_type_inserter:
+        PageType.delete().execute()
+        bump_table_version(PageType)
+        for url, url_info in page_type_lookup.items():
+            page_type_inserter.insert({
+                'url': url,
+                'main_type': url_info['main_type'],
+                'redirect': url_info['redirect'],
+                'types': json.dumps(url_info.get('types', [])),
+            })
+
+
+def main(page_types_json_filename, *args, **kwargs):
+    page_type_lookup = load_page_type_lookup(page_types_json_filename)
+    import_page_types(page_type_lookup)
+    logger.info("Imported page types for %d URLs", len(page_type_lookup))
+
+
+def configure_parser(parser):
+    parser.description = "Import a page type lookup into the database, replacing any " +\
+        "page types imported before."
+    parser.add_argument(
+        "page_types_json_filename",
+        help=(
+            "Name of a JSON file that maps URLs to file types.  " +
+            "The format of each row should be:" +
+            "\"<url>\": {\"main_type\": \"<main type>\", \"types\": " +
+            "[<list of all relevant types>]}"
+        )
+    )
@@ -0,0 +1,21 @@
+#! /usr/bin/env python
+# -*- coding: utf-8 -*-
+
+from __future__ import unicode_literals
+import logging
+from playhouse.migrate import migrate
+from peewee import TextField, BooleanField
+
+
+logger = logging.getLogger('data')
+
+
+def forward(migrator):
+    migrate(
+        migrator.add_column('locationvisit', 'standard_url', TextField(null=True)),
+        migrator.add_column('locationvisit', 'page_type', TextField(null=True)),
+        migrator.add_column('locationvisit', 'is_redirect', BooleanField(null=True)),
+        migrator.add_index('locationvisit', ('standard_url',), False),
+        migrator.add_index('locationvisit', ('page_type',), False),
+        migrator.add_index('locationvisit', ('is_redirect',), False),
+    )
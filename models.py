@@ -5,7 +5,7 @@ from __future__ import unicode_literals
 import logging
 import datetime
 import json
-import copy
+import time
 from peewee import Model, SqliteDatabase, Proxy, PostgresqlDatabase,\
     IntegerField, DateTimeField, TextField, BooleanField, FloatField, ForeignKeyField
 
@@ -17,15 +17,39 @@ DATABASE_NAME = 'searchlogger'
 db_proxy = Proxy()
 
 
+# The most parameters that can be bound to one query.  For SQLite, this is the default
+# SQLITE_MAX_VARIABLE_NUMBER of SQLite versions before 3.32.  For other databases, it's
+# the limit for Postgres, which is lower than MySQL's.
+SQLITE_MAX_VARIABLES = 999
+MAX_VARIABLES = 32767
+
+
+def get_max_variables(database):
+    ''' Get the most parameters that can be bound to one query for a database. '''
+    if isinstance(database, Proxy):
+        database = database.obj
+    if isinstance(database, SqliteDatabase):
+        return SQLITE_MAX_VARIABLES
+    return MAX_VARIABLES
+
+
 class BatchInserter(object):
     '''
     A class for saving database records in batches.
     Save rows to the batch inserter, and it will save the rows to
     the database after it has been given a batch size of rows.
     Make sure to call the `flush` method when you're finished using it
-    to save any rows that haven't yet been saved.
+    to save any rows that haven't yet been saved, or use it as a context manager:
+
+        with BatchInserter(UniqueUrl, batch_size=100) as url_inserter:
+            url_inserter.insert({...})
+
+    which flushes the remaining rows and logs how quickly rows were inserted on exit
+    (unless an exception was raised, in which case the remaining rows are dropped).
 
-    Assumes all models have been initialized to connect to db_proxy.
+    Rows are saved through whichever database the model is bound to (usually db_proxy).
+    Each batch is split into as many queries as it takes to stay under the database's
+    limit on the number of parameters in one query.
     '''
     def __init__(self, ModelType, batch_size, fill_missing_fields=False):
         '''
@@ -39,6 +63,22 @@ class BatchInserter(object):
         self.batch_size = batch_size
         self.pad_data = fill_missing_fields
 
+        # The names of all fields given for rows in the current batch, collected as
+        # rows are inserted, so that rows only need to be padded once when they're saved.
+        self.field_names = set()
+
+        # Statistics for reporting how quickly rows were inserted
+        self.row_count = 0
+        self.insert_seconds = 0.0
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exception_type, exception_value, traceback):
+        if exception_type is None:
+            self.flush()
+            self.log_stats()
+
     def insert(self, row):
         '''
         Save a row to the database.
@@ -46,36 +86,57 @@ class BatchInserter(object):
         and each value is the value of the row for that column.
         '''
         self.rows.append(row)
+        if self.pad_data:
+            self.field_names.update(row)
         if len(self.rows) >= self.batch_size:
             self.flush()
 
     def flush(self):
+        # Peewee can't insert an empty list of rows, so there's nothing to do here.
+        if len(self.rows) == 0:
+            return
         if self.pad_data:
             self._pad_data(self.rows)
-        with db_proxy.atomic():
-            self.ModelType.insert_many(self.rows).execute()
+
+        # Each row binds at most one parameter for each of the model's fields
+        # (including fields that Peewee fills in with their defaults).
+        max_variables = get_max_variables(self.ModelType._meta.database)
+        rows_per_query = max(1, max_variables // len(self.ModelType._meta.fields))
+
+        start_time = time.time()
+        with self.ModelType._meta.database.atomic():
+            for start_index in range(0, len(self.rows), rows_per_query):
+                self.ModelType.insert_many(
+                    self.rows[start_index:start_index + rows_per_query]).execute()
+        self.insert_seconds += time.time() - start_time
+
+        self.row_count += len(self.rows)
         self.rows = []
+        self.field_names = set()
+
+    def log_stats(self):
+        ''' Log how many rows were inserted and how quickly, if any were inserted. '''
+        if self.row_count > 0:
+            logger.info(
+                "Inserted %d rows of %s in %.2f seconds (%.0f rows per second)",
+                self.row_count, self.ModelType.__name__, self.insert_seconds,
+                self.row_count / max(self.insert_seconds, 1e-6),
+            )
 
     def _pad_data(self, rows):
         '''
         Before we can bulk insert rows using Peewee, they all need to have the same
-        fields.  This method adds the missing fields to all rows to make
-        sure they all describe the same fields.  It does this destructively
-        to the rows provided as input.
+        fields.  This method adds the missing fields to the rows that don't have all
+        of them, using the names of the fields collected as rows were inserted.
+        It does this destructively to the rows provided as input.
         '''
-        # Collect the union of all field names
-        field_names = set()
-        for row in rows:
-            field_names = field_names.union(row.keys())
-
         # We'll enforce that default for all unspecified fields is NULL
-        default_data = {field_name: None for field_name in field_names}
-
-        # Pad each row with the missing fields
-        for i, _ in enumerate(rows):
-            updated_data = copy.copy(default_data)
-            updated_data.update(rows[i])
-            rows[i] = updated_data
+        field_count = len(self.field_names)
+        for i, row in enumerate(rows):
+            if len(row) < field_count:
+                updated_data = dict.fromkeys(self.field_names)
+                updated_data.update(row)
+                rows[i] = updated_data
 
 
 class ProxyModel(Model):
@@ -99,6 +160,17 @@ class Command(ProxyModel):
     arguments = TextField()
 
 
+class TableVersion(ProxyModel):
+    '''
+    A count of how many times the existing rows of a table have been changed in place
+    (updated, or deleted and replaced), rather than added to.  Commands that change rows
+    in place call `bump_table_version`, so that dumps can tell the table has changed
+    even when its row count and highest ID are the same as before.
+    '''
+    table_name = TextField(unique=True)
+    version = IntegerField(default=0)
+
+
 class Prequestionnaire(ProxyModel):
     ''' A questionnaire with information about a participant's background. '''
 
@@ -176,6 +248,13 @@ class LocationVisit(ProxyModel):
     start = DateTimeField()
     end = DateTimeField()
 
+    # The URL after standardization (see `dump._urls.standardize_url`), and the type of the
+    # page from a page type lookup, so that queries can group and filter by them directly.
+    # The page type fields are null if no lookup was given or it didn't include the URL.
+    standard_url = TextField(index=True, null=True)
+    page_type = TextField(index=True, null=True)
+    is_redirect = BooleanField(index=True, null=True)
+
 
 class LocationRating(ProxyModel):
     ''' A user rating of a location they found for a task. '''
@@ -258,6 +337,21 @@ class UniqueUrl(ProxyModel):
     unique = BooleanField(index=True)
 
 
+class UrlDocumentFrequency(ProxyModel):
+    '''
+    A count of how many participants and concerns a URL was visited for, and a score
+    of how distinctive the URL is, like the inverse document frequency of a term.
+    '''
+    # Keep a record of when this record was computed
+    compute_index = IntegerField(index=True)
+    date = DateTimeField(default=datetime.datetime.now)
+
+    url = TextField(index=True)
+    user_count = IntegerField(index=True)
+    concern_count = IntegerField(index=True)
+    distinctiveness = FloatField(index=True)
+
+
 class UniqueCue(ProxyModel):
     ''' A record of whether a cue a participant mentioned was unique. '''
     # Keep a record of when this record was computed
@@ -273,6 +367,17 @@ class UniqueCue(ProxyModel):
     unique = BooleanField(index=True)
 
 
+class PageType(ProxyModel):
+    '''
+    The type of page at a standardized URL, imported from a page type lookup file.
+    Join this with the `standard_url` of other records to group them by page type.
+    '''
+    url = TextField(unique=True)  # standardized URL
+    main_type = TextField(index=True)
+    redirect = BooleanField(index=True)
+    types = TextField()  # JSON-encoded list of all relevant types
+
+
 class Question(ProxyModel):
     '''
     Answers to a set of follow-up questions we ask users after
@@ -349,7 +454,7 @@ class Strategy(ProxyModel):
         db_table = 'form_strategy'
 
 
-def init_database(db_type, config_filename=None):
+def init_database(db_type, config_filename=None, sqlite_filename=None):
 
     if db_type == 'postgres':
 
@@ -368,15 +473,39 @@ def init_database(db_type, config_filename=None):
         if 'port' in pg_config:
             config['port'] = pg_config['port']
 
-        db = PostgresqlDatabase(DATABASE_NAME, **config)
+        # The extended Postgres database lets us read large queries with server-side cursors.
+        # It's imported here as it requires psycopg2, which is only needed for Postgres.
+        from playhouse.postgres_ext import PostgresqlExtDatabase
+        db = PostgresqlExtDatabase(DATABASE_NAME, register_hstore=False, **config)
 
     # Sqlite is the default type of database.
+    # A different file can be given, for instance to read from a snapshot of the database.
     elif db_type == 'sqlite' or not db_type:
-        db = SqliteDatabase(DATABASE_NAME + '.db')
+        db = SqliteDatabase(sqlite_filename or DATABASE_NAME + '.db')
 
     db_proxy.initialize(db)
 
 
+def stream_query(query):
+    '''
+    Iterate over the results of a select query without caching them, so that memory
+    use stays flat no matter how many rows the query returns.  Peewee normally keeps
+    every row it has read in case the query is iterated over again.
+    On Postgres, rows are read from a named (server-side) cursor, a chunk at a time.
+    On SQLite, the database's cursor already steps through rows as they are read.
+    '''
+    database = query.database
+    if isinstance(database, Proxy):
+        database = database.obj
+
+    if isinstance(database, PostgresqlDatabase):
+        from playhouse.postgres_ext import PostgresqlExtDatabase, ServerSide
+        if isinstance(database, PostgresqlExtDatabase):
+            return ServerSide(query)
+
+    return query.iterator()
+
+
 def create_tables():
     db_proxy.create_tables([
         Command,
@@ -387,5 +516,27 @@ def create_tables():
         NavigationEdge,
         NavigationNgram,
         UniqueUrl,
+        UrlDocumentFrequency,
         UniqueCue,
+        PageType,
+        TableVersion,
     ], safe=True)
+
+
+def bump_table_version(ModelType):
+    '''
+    Record that the existing rows of a model's table have been changed in place.
+    Call this in the same transaction as the change.
+    '''
+    table_name = ModelType._meta.db_table
+    updated_count = TableVersion.update(version=TableVersion.version + 1).where(
+        TableVersion.table_name == table_name).execute()
+    if updated_count == 0:
+        TableVersion.create(table_name=table_name, version=1)
+
+
+def get_table_version(ModelType):
+    ''' Get how many times the existing rows of a model's table have been changed in place. '''
+    version = TableVersion.select(TableVersion.version).where(
+        TableVersion.table_name == ModelType._meta.db_table).scalar()
+    return version or 0
@@ -511,3 +511,42 @@ class ComputeLocationVisitsTest(TestCase):
         visits = LocationVisit.select()
         visit = visits[0]
         self.assertEqual(visit.end, datetime.datetime(2000, 1, 1, 12, 0, 2, 0))
+
+    def _create_events_for_one_visit(self, url):
+        time = datetime.datetime(2000, 1, 1, 12, 0, 1, 0)
+        create_task_period(
+            start=datetime.datetime(2000, 1, 1, 12, 0, 0, 0),
+            end=datetime.datetime(2000, 1, 1, 12, 3, 0, 0),
+        )
+        create_location_event(
+            log_date=time,
+            visit_date=time,
+            event_type="Tab activated",
+            tab_id='1',
+            url=url,
+        )
+        create_location_event(
+            log_date=time + datetime.timedelta(seconds=1),
+            visit_date=time + datetime.timedelta(seconds=1),
+            event_type="Tab activated",
+            tab_id='2',
+        )
+
+    def test_save_standardized_url_with_visit(self):
+
+        self._create_events_for_one_visit(url="http://www.site.com/path?query=1")
+        compute_location_visits()
+        visit = LocationVisit.select().first()
+        self.assertEqual(visit.standard_url, "site.com/path")
+        self.assertIsNone(visit.page_type)
+        self.assertIsNone(visit.is_redirect)
+
+    def test_save_page_type_with_visit_if_lookup_provided(self):
+
+        self._create_events_for_one_visit(url="http://www.site.com/path?query=1")
+        compute_location_visits(page_type_lookup={
+            "site.com/path": {"main_type": "page_type_1", "redirect": True},
+        })
+        visit = LocationVisit.select().first()
+        self.assertEqual(visit.page_type, "page_type_1")
+        self.assertEqual(visit.is_redirect, True)
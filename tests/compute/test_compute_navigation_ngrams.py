@@ -5,7 +5,7 @@ from __future__ import unicode_literals
 import logging
 import datetime
 
-from compute.navigation_ngrams import compute_navigation_ngrams
+from compute.navigation_ngrams import compute_navigation_ngrams, NGRAM_BATCH_SIZE
 from tests.base import TestCase
 from tests.modelfactory import create_location_visit
 from models import LocationVisit, NavigationNgram
@@ -155,3 +155,20 @@ class ComputeLocationVisitsTest(TestCase):
         self.assertEqual(ngram_models.count(), 1)
         ngram = ngram_models.first()
         self.assertEqual(ngram.ngram, "page_type_1, page_type_2")
+
+    def test_save_ngrams_that_span_more_than_one_batch(self):
+
+        # Create more visits than the number of n-grams saved in one batch,
+        # alternating between two types of pages.
+        for visit_index in range(NGRAM_BATCH_SIZE + 10):
+            create_location_visit(
+                url="page1" if visit_index % 2 == 0 else "page2",
+                start=datetime.datetime(2000, 1, 1, 12, 0, 0) +
+                datetime.timedelta(seconds=visit_index),
+                end=datetime.datetime(2000, 1, 1, 12, 0, 0) +
+                datetime.timedelta(seconds=visit_index + 1),
+            )
+
+        compute_navigation_ngrams(length=2, page_type_lookup=PAGE_TYPE_LOOKUP)
+        ngram_models = NavigationNgram.select()
+        self.assertEqual(ngram_models.count(), NGRAM_BATCH_SIZE + 9)
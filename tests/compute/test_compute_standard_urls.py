@@ -0,0 +1,50 @@
+#! /usr/bin/env python
+# -*- coding: utf-8 -*-
+
+from __future__ import unicode_literals
+import logging
+
+from compute.standard_urls import compute_standard_urls
+from tests.base import TestCase
+from tests.modelfactory import create_location_visit
+from models import LocationVisit, TableVersion, get_table_version
+
+
+logger = logging.getLogger('data')
+
+
+class ComputeStandardUrlsTest(TestCase):
+
+    def __init__(self, *args, **kwargs):
+        super(self.__class__, self).__init__(
+            [LocationVisit, TableVersion],
+            *args, **kwargs
+        )
+
+    def test_fill_in_missing_standard_urls_and_page_types(self):
+
+        create_location_visit(url="http://www.site.com/path?q=1")
+        create_location_visit(url="http://www.site.com/path?q=2")
+
+        compute_standard_urls(page_type_lookup={
+            "site.com/path": {"main_type": "page_type_1", "redirect": False},
+        })
+        for visit in LocationVisit.select():
+            self.assertEqual(visit.standard_url, "site.com/path")
+            self.assertEqual(visit.page_type, "page_type_1")
+            self.assertEqual(visit.is_redirect, False)
+
+    def test_dont_overwrite_existing_standard_urls(self):
+
+        create_location_visit(url="http://www.site.com/path", standard_url="saved_url")
+        compute_standard_urls()
+        visit = LocationVisit.select().first()
+        self.assertEqual(visit.standard_url, "saved_url")
+
+    def test_bump_version_of_visits_if_any_were_updated(self):
+
+        create_location_visit(url="http://www.site.com/path")
+        compute_standard_urls()
+        self.assertEqual(get_table_version(LocationVisit), 1)
+        compute_standard_urls()
+        self.assertEqual(get_table_version(LocationVisit), 1)
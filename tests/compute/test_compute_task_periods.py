@@ -7,9 +7,9 @@ import datetime
 import unittest
 
 from compute.task_periods import compute_task_periods
-from compute.task_periods import _get_concern_index, CONCERN_COUNT
+from compute.task_periods import _get_concern_index, concern_index_expression, CONCERN_COUNT
 from tests.base import TestCase
-from tests.modelfactory import create_question_event
+from tests.modelfactory import create_question_event, create_task_period
 from models import QuestionEvent, TaskPeriod
 
 
@@ -196,3 +196,31 @@ class ComputeConcernIndexTest(unittest.TestCase):
 
     def test_task_0_has_concern_index_of_negative_1(self):
         self.assertEqual(_get_concern_index(8, 0), -1)
+
+
+class ConcernIndexExpressionTest(TestCase):
+
+    def __init__(self, *args, **kwargs):
+        super(self.__class__, self).__init__([TaskPeriod], *args, **kwargs)
+
+    def test_expression_matches_concern_index_computed_in_python(self):
+        for user_id in range(15):
+            for task_index in range(8):
+                create_task_period(user_id=user_id, task_index=task_index)
+
+        rows = TaskPeriod.select(
+            TaskPeriod.user_id,
+            TaskPeriod.task_index,
+            concern_index_expression(TaskPeriod.user_id, TaskPeriod.task_index),
+        ).tuples()
+        self.assertEqual(len(rows), 15 * 8)
+        for user_id, task_index, concern_index in rows:
+            self.assertEqual(concern_index, _get_concern_index(user_id, task_index))
+
+    def test_filter_by_concern_index(self):
+        create_task_period(user_id=8, task_index=2)
+        create_task_period(user_id=8, task_index=3)
+        create_task_period(user_id=8, task_index=0)
+        task_periods = TaskPeriod.select().where(
+            concern_index_expression(TaskPeriod.user_id, TaskPeriod.task_index) == 4)
+        self.assertEqual([period.task_index for period in task_periods], [2])
@@ -3,8 +3,10 @@
 
 from __future__ import unicode_literals
 import logging
+import io
+import unittest
 
-from compute.unique_cues import compute_unique_cues
+from compute.unique_cues import compute_unique_cues, _iterate_json_array
 from tests.base import TestCase
 from models import UniqueCue
 
@@ -64,3 +66,36 @@ class ComputeLocationVisitsTest(TestCase):
         self.assertIn((1, "Cue 1", False), records)
         self.assertIn((1, "Cue 2", True), records)
         self.assertIn((2, "Cue 1", False), records)
+
+    def test_cues_can_be_read_from_any_iterable(self):
+
+        compute_unique_cues(iter([
+            {'participant_id': 1, 'cue': "Cue 1"},
+            {'participant_id': 2, 'cue': "Cue 2"},
+        ]))
+        records = [(c.participant_id, c.cue, c.unique) for c in UniqueCue.select()]
+        self.assertIn((1, "Cue 1", True), records)
+        self.assertIn((2, "Cue 2", True), records)
+
+
+class IterateJsonArrayTest(unittest.TestCase):
+
+    def test_read_elements_split_across_chunks(self):
+        # With a tiny chunk size, the elements, including the numbers at the end,
+        # will be split across many reads of the file.
+        json_file = io.StringIO(
+            '[{"participant_id": 1, "cue": "Cue, with ] brackets"}, 12345, -1.5e3]')
+        elements = list(_iterate_json_array(json_file, chunk_size=2))
+        self.assertEqual(elements, [
+            {'participant_id': 1, 'cue': "Cue, with ] brackets"},
+            12345,
+            -1.5e3,
+        ])
+
+    def test_read_empty_array(self):
+        elements = list(_iterate_json_array(io.StringIO(" [ ] "), chunk_size=1))
+        self.assertEqual(elements, [])
+
+    def test_fail_on_truncated_array(self):
+        with self.assertRaises(ValueError):
+            list(_iterate_json_array(io.StringIO('[{"cue": "Cue 1"}, '), chunk_size=2))
@@ -141,3 +141,18 @@ class ComputeLocationVisitsTest(TestCase):
         self.assertEqual(unique_urls.count(), 1)
         records = [(u.user_id, u.url, u.unique) for u in unique_urls]
         self.assertIn((4, "page1", True), records)
+
+    def test_url_shared_by_some_participants_is_unique_only_for_others_urls(self):
+
+        # Participants 3 and 4 share a URL, and participant 5 visits a URL on their own
+        create_location_visit(user_id=3, url="page1")
+        create_location_visit(user_id=4, url="page1")
+        create_location_visit(user_id=5, url="page2")
+
+        compute_unique_urls(page_type_lookup=PAGE_TYPE_LOOKUP)
+        unique_urls = UniqueUrl.select()
+        self.assertEqual(unique_urls.count(), 3)
+        records = [(u.user_id, u.url, u.unique) for u in unique_urls]
+        self.assertIn((3, "page1", False), records)
+        self.assertIn((4, "page1", False), records)
+        self.assertIn((5, "page2", True), records)
@@ -0,0 +1,80 @@
+#! /usr/bin/env python
+# -*- coding: utf-8 -*-
+
+from __future__ import unicode_literals
+import logging
+import math
+
+from compute.url_document_frequencies import compute_url_document_frequencies
+from tests.base import TestCase
+from tests.modelfactory import create_location_visit
+from models import LocationVisit, UrlDocumentFrequency
+
+
+logger = logging.getLogger('data')
+
+
+class ComputeUrlDocumentFrequenciesTest(TestCase):
+
+    def __init__(self, *args, **kwargs):
+        super(self.__class__, self).__init__(
+            [LocationVisit, UrlDocumentFrequency],
+            *args, **kwargs
+        )
+
+    def test_count_distinct_users_and_concerns_for_each_url(self):
+
+        # Participant 3 visits page1 twice for the same concern, and participant 4
+        # visits page1 for a different concern.  Only participant 4 visits page2.
+        create_location_visit(user_id=3, concern_index=1, url="page1")
+        create_location_visit(user_id=3, concern_index=1, url="page1")
+        create_location_visit(user_id=4, concern_index=2, url="page1")
+        create_location_visit(user_id=4, concern_index=2, url="page2")
+
+        compute_url_document_frequencies()
+        frequencies = UrlDocumentFrequency.select()
+        self.assertEqual(frequencies.count(), 2)
+
+        page1_frequency = frequencies.where(UrlDocumentFrequency.url == "page1").first()
+        self.assertEqual(page1_frequency.user_count, 2)
+        self.assertEqual(page1_frequency.concern_count, 2)
+
+        page2_frequency = frequencies.where(UrlDocumentFrequency.url == "page2").first()
+        self.assertEqual(page2_frequency.user_count, 1)
+        self.assertEqual(page2_frequency.concern_count, 1)
+
+    def test_url_visited_by_fewer_participants_is_more_distinctive(self):
+
+        create_location_visit(user_id=3, url="page1")
+        create_location_visit(user_id=4, url="page1")
+        create_location_visit(user_id=4, url="page2")
+
+        compute_url_document_frequencies()
+        frequencies = UrlDocumentFrequency.select()
+        page1_frequency = frequencies.where(UrlDocumentFrequency.url == "page1").first()
+        page2_frequency = frequencies.where(UrlDocumentFrequency.url == "page2").first()
+
+        # A URL that everyone visited isn't distinctive at all
+        self.assertAlmostEqual(page1_frequency.distinctiveness, 0)
+        self.assertAlmostEqual(page2_frequency.distinctiveness, math.log(2))
+
+    def test_urls_are_standardized_before_counting(self):
+
+        create_location_visit(user_id=3, url="http://www.site.com/path?q=1")
+        create_location_visit(user_id=4, url="http://site.com/path#fragment")
+
+        compute_url_document_frequencies()
+        frequencies = UrlDocumentFrequency.select()
+        self.assertEqual(frequencies.count(), 1)
+        frequency = frequencies.first()
+        self.assertEqual(frequency.url, "site.com/path")
+        self.assertEqual(frequency.user_count, 2)
+
+    def test_ignore_participants_with_excluded_user_ids(self):
+
+        create_location_visit(user_id=3, url="page1")
+        create_location_visit(user_id=4, url="page1")
+
+        compute_url_document_frequencies(exclude_users=[3])
+        frequency = UrlDocumentFrequency.select().first()
+        self.assertEqual(frequency.user_count, 1)
@@ -0,0 +1,108 @@
+#! /usr/bin/env python
+# -*- coding: utf-8 -*-
+
+from __future__ import unicode_literals
+import logging
+import os.path
+import shutil
+import tempfile
+import numpy as np
+
+from compute.url_overlaps import compute_url_overlaps, save_url_overlaps, load_url_overlaps
+from tests.base import TestCase
+from tests.modelfactory import create_location_visit
+from models import LocationVisit
+
+
+logger = logging.getLogger('data')
+
+
+def _lookup_similarities(similarities):
+    rows, columns, values = similarities
+    return {(row, column): value for row, column, value in zip(rows, columns, values)}
+
+
+class ComputeUrlOverlapsTest(TestCase):
+
+    def __init__(self, *args, **kwargs):
+        super(self.__class__, self).__init__(
+            [LocationVisit],
+            *args, **kwargs
+        )
+
+    def _create_visits(self):
+        # Participants 3 and 4 share one of three URLs they visited in total.
+        # Participant 5 visits a page that no one else does.
+        create_location_visit(user_id=3, url="page1")
+        create_location_visit(user_id=3, url="page2")
+        create_location_visit(user_id=4, url="page2")
+        create_location_visit(user_id=4, url="page3")
+        create_location_visit(user_id=5, url="page4")
+
+    def test_exact_similarity_is_jaccard_index_of_url_sets(self):
+
+        self._create_visits()
+        _, user_ids, similarities = compute_url_overlaps(method='exact')
+
+        self.assertEqual(user_ids, [3, 4, 5])
+        self.assertEqual(_lookup_similarities(similarities), {
+            (0, 0): 1,
+            (0, 1): np.float32(1 / 3.0),
+            (1, 1): 1,
+            (2, 2): 1,
+        })
+
+    def test_minhash_finds_identical_sets_and_skips_disjoint_sets(self):
+
+        create_location_visit(user_id=3, url="page1")
+        create_location_visit(user_id=3, url="page2")
+        create_location_visit(user_id=4, url="page1")
+        create_location_visit(user_id=4, url="page2")
+        create_location_visit(user_id=5, url="page3")
+
+        _, user_ids, similarities = compute_url_overlaps(method='minhash')
+        self.assertEqual(user_ids, [3, 4, 5])
+        self.assertEqual(_lookup_similarities(similarities), {
+            (0, 0): 1,
+            (0, 1): 1,
+            (1, 1): 1,
+            (2, 2): 1,
+        })
+
+    def test_overlaps_are_keyed_by_location_visit_compute_index(self):
+
+        create_location_visit(compute_index=1, user_id=3, url="page1")
+        create_location_visit(compute_index=2, user_id=4, url="page1")
+        visit_compute_index, user_ids, _ = compute_url_overlaps(method='exact')
+        self.assertEqual(visit_compute_index, 2)
+        self.assertEqual(user_ids, [4])
+
+    def _save_and_load(self, user_ids, similarities, dense):
+        temp_dir = tempfile.mkdtemp()
+        try:
+            filename = os.path.join(temp_dir, 'overlaps.npz')
+            save_url_overlaps(filename, user_ids, similarities)
+            return load_url_overlaps(filename, dense=dense)
+        finally:
+            shutil.rmtree(temp_dir)
+
+    def test_saved_overlaps_load_as_same_entries(self):
+
+        self._create_visits()
+        _, user_ids, similarities = compute_url_overlaps(method='exact')
+        loaded_user_ids, loaded_similarities = self._save_and_load(user_ids, similarities, False)
+
+        self.assertEqual(loaded_user_ids, user_ids)
+        self.assertEqual(
+            _lookup_similarities(loaded_similarities), _lookup_similarities(similarities))
+
+    def test_saved_overlaps_load_as_symmetric_matrix_if_dense(self):
+
+        self._create_visits()
+        _, user_ids, similarities = compute_url_overlaps(method='minhash')
+        _, loaded_similarities = self._save_and_load(user_ids, similarities, True)
+
+        self.assertEqual(loaded_similarities.shape, (3, 3))
+        self.assertTrue((loaded_similarities == loaded_similarities.T).all())
+        self.assertEqual(list(np.diag(loaded_similarities)), [1, 1, 1])
+        self.assertEqual(loaded_similarities[0, 2], 0)
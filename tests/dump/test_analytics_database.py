@@ -0,0 +1,74 @@
+#! /usr/bin/env python
+# -*- coding: utf-8 -*-
+
+from __future__ import unicode_literals
+import logging
+import tempfile
+import shutil
+import sqlite3
+import os.path
+from peewee import SqliteDatabase
+
+from tests.base import TestCase
+from tests.modelfactory import create_task_period, create_location_visit
+from dump.analytics_database import export_analytics_database, _copy_table_with_inserts,\
+    ANALYTICS_MODELS
+from models import TaskPeriod
+
+
+logger = logging.getLogger('data')
+
+
+class ExportAnalyticsDatabaseTest(TestCase):
+
+    def __init__(self, *args, **kwargs):
+        super(self.__class__, self).__init__(ANALYTICS_MODELS, *args, **kwargs)
+
+    def setUp(self):
+        self.temp_dir = tempfile.mkdtemp()
+        self.filename = os.path.join(self.temp_dir, 'analytics.db')
+
+    def tearDown(self):
+        shutil.rmtree(self.temp_dir)
+
+    def _query(self, sql):
+        connection = sqlite3.connect(self.filename)
+        try:
+            return connection.execute(sql).fetchall()
+        finally:
+            connection.close()
+
+    def test_copy_only_latest_version_of_each_table(self):
+        create_task_period(compute_index=0, user_id=1)
+        create_task_period(compute_index=1, user_id=2)
+        create_task_period(compute_index=1, user_id=3)
+        create_location_visit(compute_index=4, user_id=5, url="http://url.com")
+
+        row_counts = export_analytics_database(self.filename)
+
+        self.assertEqual(row_counts['taskperiod'], 2)
+        self.assertEqual(row_counts['locationvisit'], 1)
+        self.assertEqual(row_counts['navigationngram'], 0)
+        self.assertEqual(
+            self._query("SELECT user_id FROM taskperiod ORDER BY user_id"), [(2,), (3,)])
+        self.assertEqual(
+            self._query("SELECT compute_index, user_id, url FROM locationvisit"),
+            [(4, 5, "http://url.com")])
+
+    def test_build_indexes(self):
+        create_task_period()
+        export_analytics_database(self.filename)
+        index_names = [name for (name,) in self._query(
+            "SELECT name FROM sqlite_master WHERE type = 'index' AND tbl_name = 'taskperiod'")]
+        self.assertIn('taskperiod_user_id', index_names)
+        self.assertIn('taskperiod_user_id_task_index', index_names)
+
+    def test_copy_rows_with_inserts_from_other_databases(self):
+        create_task_period(compute_index=0, user_id=1)
+        create_task_period(compute_index=1, user_id=2)
+        analytics_db = SqliteDatabase(self.filename)
+        analytics_db.create_table(TaskPeriod)
+
+        self.assertEqual(_copy_table_with_inserts(analytics_db, TaskPeriod, 1), 1)
+        analytics_db.close()
+        self.assertEqual(self._query("SELECT compute_index, user_id FROM taskperiod"), [(1, 2)])
@@ -0,0 +1,122 @@
+#! /usr/bin/env python
+# -*- coding: utf-8 -*-
+
+from __future__ import unicode_literals
+import logging
+import unittest
+import tempfile
+import shutil
+import os
+import os.path
+from datetime import datetime
+import numpy as np
+
+from dump.dump import dump_csv
+from dump._columnar import run_and_dump_columnar, load_columnar_dump, INT_NULL,\
+    COLUMNAR_ROWS_PER_WRITE
+
+
+logger = logging.getLogger('data')
+COLUMN_NAMES = ["Index", "Seconds", "Start", "URL", "Missing"]
+
+
+class ColumnarDumpTest(unittest.TestCase):
+
+    def setUp(self):
+        self.temp_dir = tempfile.mkdtemp()
+        self.filename = os.path.join(self.temp_dir, 'dump.npz')
+
+    def tearDown(self):
+        shutil.rmtree(self.temp_dir)
+
+    def _dump(self, rows, column_names=COLUMN_NAMES):
+
+        def harvest():
+            for row in rows:
+                yield [row]
+
+        run_and_dump_columnar(harvest, self.filename, column_names)
+
+    def test_dump_typed_columns(self):
+        self._dump([
+            [1, 1.5, datetime(2000, 1, 1, 12, 0, 1, 5), "http://site.com/é", None],
+            [None, None, None, None, None],
+            [3, 2, datetime(1970, 1, 1), "http://site.com/é", None],
+        ])
+        columns = load_columnar_dump(self.filename)
+
+        self.assertEqual(list(columns.keys()), COLUMN_NAMES)
+        self.assertEqual(columns["Index"].dtype, np.int32)
+        self.assertEqual(list(columns["Index"]), [1, INT_NULL, 3])
+        self.assertEqual(columns["Seconds"][0], 1.5)
+        self.assertTrue(np.isnan(columns["Seconds"][1]))
+        self.assertEqual(columns["Seconds"][2], 2.0)
+        self.assertEqual(
+            columns["Start"][0], np.datetime64('2000-01-01T12:00:01.000005', 'us'))
+        # Missing timestamps are saved as NaT, the smallest 64-bit integer.
+        self.assertEqual(columns["Start"].astype(np.int64)[1], np.iinfo(np.int64).min)
+        self.assertEqual(columns["Start"].astype(np.int64)[2], 0)
+        self.assertEqual(list(columns["URL"].codes), [0, -1, 0])
+        self.assertEqual(columns["URL"].values, ["http://site.com/é"])
+        self.assertEqual(list(columns["Missing"].codes), [-1, -1, -1])
+        self.assertEqual(columns["Missing"].values, [])
+
+    def test_dump_column_with_leading_missing_values(self):
+        self._dump([[None], [None], [2]], column_names=["Index"])
+        columns = load_columnar_dump(self.filename)
+        self.assertEqual(list(columns["Index"]), [INT_NULL, INT_NULL, 2])
+
+    def test_memory_mapped_and_loaded_columns_match(self):
+        rows = [[index, float(index), datetime(2000, 1, 1), "url" + str(index % 7), None]
+                for index in range(COLUMNAR_ROWS_PER_WRITE + 5)]
+        self._dump(rows)
+
+        mapped_columns = load_columnar_dump(self.filename)
+        loaded_columns = load_columnar_dump(self.filename, mmap=False)
+        self.assertIsInstance(mapped_columns["Index"], np.memmap)
+        self.assertEqual(len(mapped_columns["Index"]), len(rows))
+        self.assertTrue(np.array_equal(mapped_columns["Index"], loaded_columns["Index"]))
+        self.assertTrue(np.array_equal(mapped_columns["URL"].codes, loaded_columns["URL"].codes))
+        self.assertEqual(mapped_columns["URL"].values, ["url" + str(i) for i in range(7)])
+
+    def test_archive_can_be_loaded_with_numpy(self):
+        self._dump([[1, 1.5, datetime(2000, 1, 1), "url", None]])
+        archive = np.load(self.filename)
+        self.assertEqual(list(archive["Index"]), [1])
+        self.assertEqual(archive["URL.values"].tobytes(), b"url")
+        archive.close()
+
+    def test_fail_on_integer_too_large_for_32_bits(self):
+        with self.assertRaises(ValueError):
+            self._dump([[2 ** 40]], column_names=["Index"])
+
+    def test_fail_on_values_of_different_types(self):
+        with self.assertRaises(ValueError):
+            self._dump([[1], ["one"]], column_names=["Index"])
+
+
+class DumpCsvAsColumnsTest(unittest.TestCase):
+
+    def setUp(self):
+        self.temp_dir = tempfile.mkdtemp()
+        self.original_dir = os.getcwd()
+        os.chdir(self.temp_dir)
+
+    def tearDown(self):
+        os.chdir(self.original_dir)
+        shutil.rmtree(self.temp_dir)
+
+    def test_dump_csv_to_columns_when_asked(self):
+
+        @dump_csv('dump', ["Index", "URL"])
+        def harvest(*args, **kwargs):
+            yield [[1, "url"]]
+
+        harvest(columnar=True)
+        filenames = os.listdir('data')
+        self.assertEqual(len(filenames), 1)
+        self.assertTrue(filenames[0].endswith('.npz'))
+
+        columns = load_columnar_dump(os.path.join('data', filenames[0]))
+        self.assertEqual(list(columns["Index"]), [1])
+        self.assertEqual(columns["URL"].values, ["url"])
@@ -5,7 +5,7 @@ from __future__ import unicode_literals
 import logging
 import unittest
 
-from dump._urls import standardize_url
+from dump._urls import standardize_url, standardize_urls
 
 
 logger = logging.getLogger('data')
@@ -94,3 +94,31 @@ class StandardizeUrlTest(unittest.TestCase):
     def test_bluejeans_site_standardizes_to_bluejeans_domain(self):
         standardized = standardize_url("http://bluejeans.com/long-path#some-fragment")
         self.assertEqual(standardized, "bluejeans.com")
+
+    def test_site_specific_rules_apply_after_removing_www_prefix(self):
+        standardized = standardize_url("http://www.youtube.com/watch?v=DRR9fOXkfRE&t=10")
+        self.assertEqual(standardized, "youtube.com/watch?v=DRR9fOXkfRE")
+
+    def test_site_without_matching_rule_is_domain_and_path(self):
+        standardized = standardize_url("http://panda3d.org/manual/index.php?title=Main")
+        self.assertEqual(standardized, "panda3d.org/manual/index.php")
+
+
+class StandardizeUrlsTest(unittest.TestCase):
+
+    def test_map_each_distinct_url_to_standardized_url(self):
+        standardized = standardize_urls([
+            "http://www.site.com/path?q=1",
+            "http://www.site.com/path?q=1",
+            "http://stackoverflow.com/questions/1000/long-name",
+        ])
+        self.assertEqual(standardized, {
+            "http://www.site.com/path?q=1": "site.com/path",
+            "http://stackoverflow.com/questions/1000/long-name": "stackoverflow.com/questions/1000",
+        })
+
+    def test_standardize_urls_in_process_pool(self):
+        urls = ["http://site.com/path" + str(i) + "?q=1" for i in range(10)]
+        standardized = standardize_urls(urls, process_count=2, parallel_threshold=0)
+        self.assertEqual(len(standardized), 10)
+        self.assertEqual(standardized["http://site.com/path3?q=1"], "site.com/path3")
@@ -0,0 +1,502 @@
+#! /usr/bin/env python
+# -*- coding: utf-8 -*-
+
+from __future__ import unicode_literals
+import logging
+import unittest
+import contextlib
+import sys
+import io
+import codecs
+import gzip
+import bz2
+import tempfile
+import shutil
+import os
+import os.path
+import json
+from datetime import datetime
+
+from tests.base import TestCase
+from tests.modelfactory import create_location_event, create_location_visit
+from dump.dump import run_and_dump_csv, CSV_LINES_PER_WRITE, open_dump_file,\
+    make_dump_filename, run_and_dump_json, run_and_dump_ndjson, dump_csv, load_manifest,\
+    in_watermark_range, select_columns, load_dump_cache, dump_text
+from dump import location_events, page_type_visits
+from importers.page_types import import_page_types
+from compute.standard_urls import compute_standard_urls
+from models import LocationEvent, LocationVisit, PageType, TableVersion
+
+
+logger = logging.getLogger('data')
+
+
+class RunAndDumpCsvTest(unittest.TestCase):
+
+    def _dump(self, harvest_func, column_names, delimiter=','):
+        dump_file = io.StringIO()
+        run_and_dump_csv(harvest_func, dump_file, column_names, delimiter)
+        return dump_file.getvalue()
+
+    def test_format_items_of_each_type(self):
+
+        def harvest():
+            yield [[1, "line1\r\nline2\nline3", None, 1.5, datetime(2000, 1, 1, 12, 0, 1)]]
+
+        contents = self._dump(harvest, ["a", "b", "c", "d", "e"], delimiter='|')
+        self.assertEqual(
+            contents,
+            '"a"|"b"|"c"|"d"|"e"\n' +
+            '1|"line1<newline>line2<newline>line3"|None|1.5|2000-01-01T12:00:01\n'
+        )
+
+    def test_dump_all_lines_across_many_writes(self):
+
+        def harvest():
+            for index in range(CSV_LINES_PER_WRITE + 1):
+                yield [[index, "text"]]
+            yield []
+
+        lines = self._dump(harvest, ["index", "text"]).splitlines()
+        self.assertEqual(len(lines), CSV_LINES_PER_WRITE + 2)
+        self.assertEqual(lines[1], '0,"text"')
+        self.assertEqual(lines[-1], str(CSV_LINES_PER_WRITE) + ',"text"')
+
+    def test_column_names_are_not_modified(self):
+
+        def harvest():
+            yield [[1]]
+
+        column_names = ["a"]
+        self._dump(harvest, column_names)
+        self._dump(harvest, column_names)
+        self.assertEqual(column_names, ["a"])
+
+
+class RunAndDumpJsonTest(unittest.TestCase):
+
+    def _harvest(self):
+        yield [
+            {'user': 1, 'start': datetime(2000, 1, 1, 12, 0, 1), 'title': "Title"},
+            {'user': 2, 'start': None, 'title': "Title 2"},
+        ]
+        yield [{'user': 3, 'start': datetime(2000, 1, 2), 'title': "Title 3"}]
+
+    def _dump(self, dump_func):
+        # Dump files encode the text written to them, like those opened by `open_dump_file`.
+        output = io.BytesIO()
+        dump_func(self._harvest, codecs.getwriter('utf-8')(output))
+        return output.getvalue().decode('utf-8')
+
+    def test_dump_records_as_json_array(self):
+        records = json.loads(self._dump(run_and_dump_json))
+        self.assertEqual(len(records), 3)
+        self.assertEqual(records[0]['start'], '2000-01-01T12:00:01')
+        self.assertIsNone(records[1]['start'])
+
+    def test_dump_records_as_ndjson(self):
+        lines = self._dump(run_and_dump_ndjson).splitlines()
+        self.assertEqual(len(lines), 3)
+        self.assertEqual(json.loads(lines[0]), {
+            'user': 1, 'start': '2000-01-01T12:00:01', 'title': "Title"})
+        self.assertEqual(json.loads(lines[2])['start'], '2000-01-02T00:00:00')
+
+    def test_fail_on_value_that_cant_be_converted_to_json(self):
+
+        def harvest():
+            yield [{'value': object()}]
+
+        with self.assertRaises(TypeError):
+            run_and_dump_ndjson(harvest, codecs.getwriter('utf-8')(io.BytesIO()))
+
+
+class CompressedDumpTest(unittest.TestCase):
+
+    def setUp(self):
+        self.temp_dir = tempfile.mkdtemp()
+        self.original_dir = os.getcwd()
+        os.chdir(self.temp_dir)
+
+    def tearDown(self):
+        os.chdir(self.original_dir)
+        shutil.rmtree(self.temp_dir)
+
+    def _write_dump(self, compress):
+        dump_path = make_dump_filename('dump', '.csv', compress)
+        dump_file = open_dump_file(dump_path, compress)
+        dump_file.write("été\n")
+        dump_file.write("line\n" * 10000)
+        dump_file.close()
+        return dump_path
+
+    def test_gzip_dump(self):
+        dump_path = self._write_dump('gzip')
+        self.assertTrue(dump_path.endswith('.csv.gz'))
+        gzip_file = gzip.open(dump_path)
+        self.assertEqual(gzip_file.read().decode('utf-8'), "été\n" + "line\n" * 10000)
+        gzip_file.close()
+
+    def test_bz2_dump(self):
+        dump_path = self._write_dump('bz2')
+        self.assertTrue(dump_path.endswith('.csv.bz2'))
+        bz2_file = bz2.BZ2File(dump_path)
+        self.assertEqual(bz2_file.read().decode('utf-8'), "été\n" + "line\n" * 10000)
+        bz2_file.close()
+
+    def test_uncompressed_dump(self):
+        dump_path = self._write_dump(None)
+        self.assertTrue(dump_path.endswith('.csv'))
+        with io.open(dump_path, encoding='utf-8') as dump_file:
+            self.assertEqual(dump_file.read(), "été\n" + "line\n" * 10000)
+
+
+@dump_csv('events', ["Id"], watermark=LocationEvent.id)
+def _dump_events(watermark_range, *args, **kwargs):
+    events = LocationEvent.select().where(in_watermark_range(LocationEvent.id, watermark_range))
+    for event in events.order_by(LocationEvent.id):
+        yield [[event.id]]
+
+
+@dump_csv(
+    'visits', ["Compute Index", "User"],
+    watermark=LocationVisit.compute_index, generation_watermark=True)
+def _dump_visits(watermark_range, *args, **kwargs):
+    _, latest_compute_index = watermark_range
+    visits = LocationVisit.select().where(LocationVisit.compute_index == latest_compute_index)
+    for visit in visits.order_by(LocationVisit.user_id):
+        yield [[visit.compute_index, visit.user_id]]
+
+
+class WatermarkDumpTest(TestCase):
+
+    def __init__(self, *args, **kwargs):
+        super(self.__class__, self).__init__(
+            [LocationEvent, LocationVisit, TableVersion], *args, **kwargs)
+
+    def setUp(self):
+        self.temp_dir = tempfile.mkdtemp()
+        self.original_dir = os.getcwd()
+        os.chdir(self.temp_dir)
+
+    def tearDown(self):
+        os.chdir(self.original_dir)
+        shutil.rmtree(self.temp_dir)
+
+    def _read_part(self, part):
+        with io.open(os.path.join('data', part['filename']), encoding='utf-8') as dump_file:
+            return dump_file.read().splitlines()[1:]
+
+    def test_dump_only_new_rows_since_last_dump(self):
+        first_event = create_location_event()
+        second_event = create_location_event()
+        self.assertEqual(_dump_events(since_last=True), 2)
+        third_event = create_location_event()
+        self.assertEqual(_dump_events(since_last=True), 1)
+
+        manifest = load_manifest('events')
+        self.assertTrue(manifest['watermark_field'].endswith('locationevent.id'))
+        self.assertEqual(manifest['watermark'], third_event.id)
+        self.assertEqual(len(manifest['parts']), 2)
+        self.assertEqual(
+            self._read_part(manifest['parts'][0]), [str(first_event.id), str(second_event.id)])
+        self.assertEqual(self._read_part(manifest['parts'][1]), [str(third_event.id)])
+        self.assertEqual(manifest['parts'][1]['low_watermark'], second_event.id)
+
+    def test_skip_dump_if_there_are_no_new_rows(self):
+        create_location_event()
+        _dump_events()
+        self.assertEqual(_dump_events(since_last=True), 0)
+        self.assertEqual(len(load_manifest('events')['parts']), 1)
+
+    def test_full_dump_starts_new_manifest(self):
+        create_location_event()
+        _dump_events()
+        create_location_event()
+        self.assertEqual(_dump_events(), 2)
+        manifest = load_manifest('events')
+        self.assertEqual(len(manifest['parts']), 1)
+        self.assertIsNone(manifest['parts'][0]['low_watermark'])
+
+    def test_save_columns_to_manifest(self):
+        create_location_event()
+        location_events.main(columns=["URL", "Id"])
+        self.assertEqual(load_manifest(location_events.__name__)['columns'], ["URL", "Id"])
+
+    def test_refuse_delta_with_different_columns_than_manifest(self):
+        create_location_event()
+        location_events.main(since_last=True)
+        create_location_event()
+        with self.assertRaises(ValueError):
+            location_events.main(since_last=True, columns=["Id"])
+
+        manifest = load_manifest(location_events.__name__)
+        self.assertEqual(len(manifest['parts']), 1)
+        self.assertEqual(manifest['columns'], location_events.main.dump_column_names)
+
+    def test_save_format_to_manifest(self):
+        create_location_event()
+        location_events.main(compress='gzip')
+        manifest = load_manifest(location_events.__name__)
+        self.assertEqual(manifest['file_extension'], '.csv')
+        self.assertEqual(manifest['compress'], 'gzip')
+        self.assertFalse(manifest['columnar'])
+
+    def test_refuse_delta_with_different_compression_than_manifest(self):
+        create_location_event()
+        location_events.main(since_last=True)
+        create_location_event()
+        with self.assertRaises(ValueError):
+            location_events.main(since_last=True, compress='gzip')
+        self.assertEqual(len(load_manifest(location_events.__name__)['parts']), 1)
+
+    def test_refuse_columnar_delta_of_text_dump(self):
+        create_location_event()
+        location_events.main(since_last=True)
+        create_location_event()
+        with self.assertRaises(ValueError):
+            location_events.main(since_last=True, columnar=True)
+        self.assertEqual(len(load_manifest(location_events.__name__)['parts']), 1)
+
+    def test_dump_delta_with_same_columns_as_manifest(self):
+        create_location_event()
+        location_events.main(since_last=True, columns=["Id"])
+        create_location_event()
+        self.assertEqual(location_events.main(since_last=True, columns=["Id"]), 1)
+        self.assertEqual(len(load_manifest(location_events.__name__)['parts']), 2)
+
+    def test_new_generation_replaces_earlier_parts(self):
+        create_location_visit(compute_index=0, user_id=1)
+        create_location_visit(compute_index=0, user_id=2)
+        self.assertEqual(_dump_visits(since_last=True), 2)
+        create_location_visit(compute_index=1, user_id=1)
+        create_location_visit(compute_index=1, user_id=2)
+        self.assertEqual(_dump_visits(since_last=True), 2)
+
+        manifest = load_manifest('visits')
+        self.assertEqual(manifest['watermark'], 1)
+        self.assertEqual(len(manifest['parts']), 1)
+        self.assertIsNone(manifest['parts'][0]['low_watermark'])
+        self.assertEqual(manifest['parts'][0]['high_watermark'], 1)
+        self.assertEqual(self._read_part(manifest['parts'][0]), ['1,1', '1,2'])
+
+    def test_skip_dump_if_there_is_no_new_generation(self):
+        create_location_visit(compute_index=0)
+        _dump_visits()
+        self.assertEqual(_dump_visits(since_last=True), 0)
+        self.assertEqual(len(load_manifest('visits')['parts']), 1)
+
+
+class ColumnProjectionTest(TestCase):
+
+    def __init__(self, *args, **kwargs):
+        super(self.__class__, self).__init__([LocationEvent, TableVersion], *args, **kwargs)
+
+    def setUp(self):
+        self.temp_dir = tempfile.mkdtemp()
+        self.original_dir = os.getcwd()
+        os.chdir(self.temp_dir)
+
+    def tearDown(self):
+        os.chdir(self.original_dir)
+        shutil.rmtree(self.temp_dir)
+
+    def _read_dump(self):
+        dump_filename = [name for name in os.listdir('data') if name.endswith('.csv')][0]
+        with io.open(os.path.join('data', dump_filename), encoding='utf-8') as dump_file:
+            return dump_file.read().splitlines()
+
+    def test_select_null_for_columns_not_dumped(self):
+        event = create_location_event(title="Title", url="http://url.com")
+        fields = select_columns(location_events.COLUMN_FIELDS, ["URL", "Id"])
+        row = LocationEvent.select(*fields).tuples().get()
+        self.assertEqual(row, (event.id, None, None, None, None, "http://url.com", None, None))
+
+    def test_dump_only_chosen_columns_in_chosen_order(self):
+        event = create_location_event(url="http://url.com")
+        location_events.main(columns=["URL", "Id"])
+        self.assertEqual(self._read_dump(), ['"URL","Id"', '"http://url.com",' + str(event.id)])
+
+    def test_dump_all_columns_by_default(self):
+        create_location_event()
+        location_events.main()
+        self.assertEqual(
+            self._read_dump()[0],
+            ','.join('"%s"' % name for name in location_events.COLUMN_FIELDS.keys()),
+        )
+
+    def test_fail_on_unknown_column(self):
+        with self.assertRaises(ValueError):
+            location_events.main(columns=["Not a column"])
+
+
+# A record of how many times the cached dump's harvest function has been run.
+_cached_dump_runs = []
+
+
+@dump_csv('cached-events', ["Id"], sources=[LocationEvent])
+def _dump_cached_events(*args, **kwargs):
+    _cached_dump_runs.append(kwargs)
+    for event in LocationEvent.select().order_by(LocationEvent.id):
+        yield [[event.id]]
+
+
+class DumpCacheTest(TestCase):
+
+    def __init__(self, *args, **kwargs):
+        super(self.__class__, self).__init__(
+            [LocationEvent, LocationVisit, PageType, TableVersion], *args, **kwargs)
+
+    def setUp(self):
+        self.temp_dir = tempfile.mkdtemp()
+        self.original_dir = os.getcwd()
+        os.chdir(self.temp_dir)
+        del _cached_dump_runs[:]
+
+    def tearDown(self):
+        os.chdir(self.original_dir)
+        shutil.rmtree(self.temp_dir)
+
+    def test_reuse_dump_if_inputs_havent_changed(self):
+        create_location_event()
+        create_location_event()
+        self.assertEqual(_dump_cached_events(), 2)
+        self.assertEqual(_dump_cached_events(), 2)
+        self.assertEqual(len(_cached_dump_runs), 1)
+        self.assertEqual(len(load_dump_cache('cached-events')), 1)
+
+    def test_dump_again_if_rows_were_added(self):
+        create_location_event()
+        _dump_cached_events()
+        create_location_event()
+        self.assertEqual(_dump_cached_events(), 2)
+        self.assertEqual(len(_cached_dump_runs), 2)
+
+    def test_dump_again_if_rows_were_deleted(self):
+        create_location_event()
+        event = create_location_event()
+        _dump_cached_events()
+        event.delete_instance()
+        self.assertEqual(_dump_cached_events(), 1)
+        self.assertEqual(len(_cached_dump_runs), 2)
+
+    def test_dump_again_with_different_options(self):
+        create_location_event()
+        _dump_cached_events()
+        _dump_cached_events(compress='gzip')
+        self.assertEqual(len(_cached_dump_runs), 2)
+
+    def test_dump_again_if_cached_dump_was_removed(self):
+        create_location_event()
+        _dump_cached_events()
+        for filename in os.listdir('data'):
+            if filename.endswith('.csv'):
+                os.remove(os.path.join('data', filename))
+        _dump_cached_events()
+        self.assertEqual(len(_cached_dump_runs), 2)
+
+    def test_dump_again_if_cache_is_disabled(self):
+        create_location_event()
+        _dump_cached_events()
+        _dump_cached_events(no_cache=True)
+        self.assertEqual(len(_cached_dump_runs), 2)
+
+    def test_point_manifest_at_reused_dump(self):
+        create_location_event()
+        location_events.main(compress='gzip')
+        location_events.main()
+        self.assertEqual(location_events.main(compress='gzip'), 1)
+
+        manifest = load_manifest(location_events.__name__)
+        self.assertEqual(manifest['compress'], 'gzip')
+        self.assertEqual(len(manifest['parts']), 1)
+        self.assertTrue(manifest['parts'][0]['filename'].endswith('.csv.gz'))
+
+        # Rows added since the reused dump can be dumped as a delta in the same format.
+        event = create_location_event()
+        self.assertEqual(location_events.main(since_last=True, compress='gzip'), 1)
+        manifest = load_manifest(location_events.__name__)
+        self.assertEqual(len(manifest['parts']), 2)
+        self.assertEqual(manifest['watermark'], event.id)
+
+    def _read_page_type_visits(self):
+        dump_filenames = sorted([
+            filename for filename in os.listdir('data')
+            if filename.startswith('dump.page_type_visits') and filename.endswith('.csv')
+        ])
+        with io.open(os.path.join('data', dump_filenames[-1]), encoding='utf-8') as dump_file:
+            return dump_file.read().splitlines()[1:]
+
+    def test_dump_again_if_page_types_were_reimported(self):
+        create_location_visit(standard_url="page1")
+        import_page_types({"page1": {"main_type": "Tutorial", "redirect": False}})
+        page_type_visits.main()
+        self.assertEqual(self._read_page_type_visits(), ['0,"Tutorial",1,1'])
+
+        # The new page types replace the old ones with the same IDs and row count.
+        import_page_types({"page1": {"main_type": "Forum", "redirect": False}})
+        page_type_visits.main()
+        self.assertEqual(self._read_page_type_visits(), ['0,"Forum",1,1'])
+
+    def test_dump_again_if_standard_urls_were_filled_in(self):
+        import_page_types({"site.com/path": {"main_type": "Tutorial", "redirect": False}})
+        create_location_visit(url="http://www.site.com/path")
+        page_type_visits.main()
+        self.assertEqual(self._read_page_type_visits(), [])
+
+        compute_standard_urls()
+        page_type_visits.main()
+        self.assertEqual(self._read_page_type_visits(), ['0,"Tutorial",1,1'])
+
+
+@dump_text('lines')
+def _dump_lines(line_count, *args, **kwargs):
+    for index in range(line_count):
+        yield ["line " + str(index)]
+
+
+@contextlib.contextmanager
+def _stdout_redirected(file_descriptor):
+    sys.stdout.flush()
+    original_stdout = os.dup(sys.stdout.fileno())
+    os.dup2(file_descriptor, sys.stdout.fileno())
+    try:
+        yield
+    finally:
+        os.dup2(original_stdout, sys.stdout.fileno())
+        os.close(original_stdout)
+
+
+class DumpOutputTest(unittest.TestCase):
+
+    def setUp(self):
+        self.temp_dir = tempfile.mkdtemp()
+        self.original_dir = os.getcwd()
+        os.chdir(self.temp_dir)
+
+    def tearDown(self):
+        os.chdir(self.original_dir)
+        shutil.rmtree(self.temp_dir)
+
+    def test_dump_to_chosen_file(self):
+        self.assertEqual(_dump_lines(2, output='lines.txt'), 2)
+        with io.open('lines.txt', encoding='utf-8') as dump_file:
+            self.assertEqual(dump_file.read(), "line 0\nline 1\n")
+        self.assertFalse(os.path.exists('data'))
+
+    def test_stream_dump_to_stdout(self):
+        read_end, write_end = os.pipe()
+        with _stdout_redirected(write_end):
+            row_count = _dump_lines(3, output='-')
+        os.close(write_end)
+        with os.fdopen(read_end, 'rb') as pipe:
+            self.assertEqual(pipe.read(), b"line 0\nline 1\nline 2\n")
+        self.assertEqual(row_count, 3)
+        self.assertFalse(os.path.exists('data'))
+
+    def test_stop_quietly_if_reader_closes_pipe(self):
+        read_end, write_end = os.pipe()
+        os.close(read_end)
+        with _stdout_redirected(write_end):
+            row_count = _dump_lines(100000, output='-')
+        os.close(write_end)
+        self.assertIsNone(row_count)
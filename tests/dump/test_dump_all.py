@@ -0,0 +1,146 @@
+#! /usr/bin/env python
+# -*- coding: utf-8 -*-
+
+from __future__ import unicode_literals
+import logging
+import unittest
+import tempfile
+import shutil
+import os
+import os.path
+import sqlite3
+
+from tests.modelfactory import create_location_event
+from dump import all as dump_all, location_events, page_type_visits
+from dump.all import _database_snapshot
+from models import db_proxy, init_database, LocationEvent, TableVersion
+
+
+logger = logging.getLogger('data')
+
+
+class DatabaseSnapshotTest(unittest.TestCase):
+
+    def setUp(self):
+        self.temp_dir = tempfile.mkdtemp()
+        self.filename = os.path.join(self.temp_dir, 'database.db')
+        connection = sqlite3.connect(self.filename)
+        connection.execute("CREATE TABLE record (value INTEGER)")
+        connection.execute("INSERT INTO record VALUES (1)")
+        connection.commit()
+        connection.close()
+        init_database('sqlite', sqlite_filename=self.filename)
+
+    def tearDown(self):
+        if not db_proxy.obj.is_closed():
+            db_proxy.obj.close()
+        db_proxy.initialize(None)
+        shutil.rmtree(self.temp_dir)
+
+    def _count_records(self, filename):
+        connection = sqlite3.connect(filename)
+        count = connection.execute("SELECT COUNT(*) FROM record").fetchone()[0]
+        connection.close()
+        return count
+
+    def test_snapshot_is_not_changed_by_later_writes(self):
+        with _database_snapshot('sqlite') as (snapshot_filename, snapshot_id):
+            self.assertIsNone(snapshot_id)
+            db_proxy.obj.execute_sql("INSERT INTO record VALUES (2)")
+            self.assertEqual(self._count_records(snapshot_filename), 1)
+            self.assertEqual(self._count_records(self.filename), 2)
+
+    def test_snapshot_is_removed_afterward(self):
+        with _database_snapshot('sqlite') as (snapshot_filename, _):
+            self.assertTrue(os.path.exists(snapshot_filename))
+        self.assertFalse(os.path.exists(snapshot_filename))
+
+
+class _RecordingHandler(logging.Handler):
+
+    def __init__(self):
+        logging.Handler.__init__(self)
+        self.messages = []
+
+    def emit(self, record):
+        self.messages.append((record.levelname, record.getMessage()))
+
+
+class DumpAllTest(unittest.TestCase):
+
+    def setUp(self):
+        self.temp_dir = tempfile.mkdtemp()
+        self.original_dir = os.getcwd()
+        os.chdir(self.temp_dir)
+
+        # Only the tables for location events are created, so that the page type visits
+        # dump fails for want of the location visits table.
+        init_database('sqlite', sqlite_filename=os.path.join(self.temp_dir, 'database.db'))
+        db_proxy.obj.create_tables([LocationEvent, TableVersion])
+        create_location_event()
+        create_location_event()
+
+        self.original_modules = dump_all.DUMP_MODULES
+        dump_all.DUMP_MODULES = [location_events, page_type_visits]
+        self.handler = _RecordingHandler()
+        logger.addHandler(self.handler)
+        self.original_level = logger.level
+        logger.setLevel(logging.INFO)
+
+    def tearDown(self):
+        logger.setLevel(self.original_level)
+        logger.removeHandler(self.handler)
+        dump_all.DUMP_MODULES = self.original_modules
+        if not db_proxy.obj.is_closed():
+            db_proxy.obj.close()
+        db_proxy.initialize(None)
+        os.chdir(self.original_dir)
+        shutil.rmtree(self.temp_dir)
+
+    def _run_all(self, since_last=False):
+        return dump_all.main(
+            page_types_json_filename=None, process_count=1, db='sqlite', db_config=None,
+            compress=None, columnar=False, since_last=since_last, no_cache=False,
+        )
+
+    def test_run_each_dump_from_snapshot_and_capture_errors(self):
+        results = self._run_all()
+
+        self.assertEqual([result[0] for result in results], [
+            location_events.__name__, page_type_visits.__name__])
+        _, events_seconds, events_row_count, events_error = results[0]
+        self.assertEqual(events_row_count, 2)
+        self.assertIsNone(events_error)
+        self.assertGreaterEqual(events_seconds, 0)
+        _, _, visits_row_count, visits_error = results[1]
+        self.assertIsNone(visits_row_count)
+        self.assertIn("no such table", visits_error)
+
+        # The snapshot the workers read from is removed after the dumps finish.
+        self.assertEqual(
+            [name for name in os.listdir(self.temp_dir) if name.startswith('snapshot-')], [])
+        self.assertEqual(
+            len([name for name in os.listdir('data') if name.endswith('.csv')]), 1)
+
+    def test_log_summary_of_rows_and_failures(self):
+        self._run_all()
+
+        summary_lines = [
+            (level, message) for level, message in self.handler.messages
+            if message.startswith("  ")
+        ]
+        self.assertEqual(len(summary_lines), 2)
+        self.assertEqual(summary_lines[0][0], 'INFO')
+        self.assertIn(location_events.__name__, summary_lines[0][1])
+        self.assertTrue(summary_lines[0][1].endswith(" 2 rows"))
+        self.assertEqual(summary_lines[1][0], 'ERROR')
+        self.assertIn(page_type_visits.__name__, summary_lines[1][1])
+        self.assertIn("FAILED", summary_lines[1][1])
+        self.assertTrue(any(
+            message.startswith("Ran 2 dumps") for _, message in self.handler.messages))
+
+    def test_only_run_dumps_with_watermarks_since_last(self):
+        self._run_all()
+        create_location_event()
+        results = self._run_all(since_last=True)
+        self.assertEqual(results, [(location_events.__name__, results[0][1], 1, None)])
@@ -0,0 +1,89 @@
+#! /usr/bin/env python
+# -*- coding: utf-8 -*-
+
+from __future__ import unicode_literals
+import logging
+import io
+import tempfile
+import shutil
+import os
+import os.path
+from playhouse.test_utils import count_queries
+
+from tests.base import TestCase
+from dump import open_responses
+from models import Question, Strategy, PackagePair, TableVersion
+
+
+logger = logging.getLogger('data')
+
+
+def _create_question(user_id, question_index, evidence):
+    return Question.create(
+        user_id=user_id,
+        question_index=question_index,
+        concern="concern",
+        likert_comparison_evidence=0,
+        na_likert_comparison_evidence=False,
+        evidence=evidence,
+        likert_confidence=0,
+        na_likert_confidence=False,
+    )
+
+
+class DumpOpenResponsesTest(TestCase):
+
+    def __init__(self, *args, **kwargs):
+        super(self.__class__, self).__init__(
+            [Question, Strategy, PackagePair, TableVersion], *args, **kwargs)
+
+    def setUp(self):
+        self.temp_dir = tempfile.mkdtemp()
+        self.original_dir = os.getcwd()
+        os.chdir(self.temp_dir)
+
+    def tearDown(self):
+        os.chdir(self.original_dir)
+        shutil.rmtree(self.temp_dir)
+
+    def _read_rows(self):
+        dump_filename = [name for name in os.listdir('data') if name.endswith('.csv')][0]
+        with io.open(os.path.join('data', dump_filename), encoding='utf-8') as dump_file:
+            return [line.split('|') for line in dump_file.read().splitlines()[1:]]
+
+    def test_assemble_each_participants_responses_in_concern_order(self):
+        # For participant 7 on task 1, the concern index is (7 % 6 + 1) % 6 = 2
+        PackagePair.create(user_id=7, package1="numpy", package2="scipy")
+        _create_question(7, 1, "Evidence")
+        Strategy.create(user_id=7, question_index=1, strategy="Strategy")
+
+        open_responses.main()
+        rows = self._read_rows()
+
+        self.assertEqual(len(rows), 1)
+        self.assertEqual(
+            rows[0][:4], ['"Search study responses"', '"Participant 7"', '"numpy"', '"scipy"'])
+        strategies, evidence = rows[0][4:10], rows[0][10:16]
+        self.assertEqual(strategies[2], '"Strategy"')
+        self.assertEqual(evidence[2], '"Evidence"')
+        self.assertEqual(strategies.count('"No response."'), 5)
+        self.assertEqual(evidence.count('"No response."'), 5)
+
+    def _create_participant(self, user_id):
+        PackagePair.create(user_id=user_id, package1="numpy", package2="scipy")
+        _create_question(user_id, 1, "Evidence")
+        Strategy.create(user_id=user_id, question_index=1, strategy="Strategy")
+
+    def test_number_of_queries_doesnt_grow_with_participants(self):
+        self._create_participant(1)
+        with count_queries() as counter:
+            open_responses.main(no_cache=True)
+        one_participant_query_count = counter.count
+
+        for user_id in range(2, 11):
+            self._create_participant(user_id)
+        with count_queries() as counter:
+            open_responses.main(no_cache=True)
+        self.assertEqual(counter.count, one_participant_query_count)
+        self.assertEqual(len(self._read_rows()), 10)
+
@@ -0,0 +1,73 @@
+#! /usr/bin/env python
+# -*- coding: utf-8 -*-
+
+from __future__ import unicode_literals
+import logging
+import io
+import tempfile
+import shutil
+import os
+import os.path
+
+from tests.base import TestCase
+from tests.modelfactory import create_location_visit
+from dump import page_type_visits
+from models import LocationVisit, PageType, TableVersion
+
+
+logger = logging.getLogger('data')
+
+
+def _create_page_type(url, main_type):
+    return PageType.create(url=url, main_type=main_type, redirect=False, types='[]')
+
+
+class DumpPageTypeVisitsTest(TestCase):
+
+    def __init__(self, *args, **kwargs):
+        super(self.__class__, self).__init__(
+            [LocationVisit, PageType, TableVersion], *args, **kwargs)
+
+    def setUp(self):
+        self.temp_dir = tempfile.mkdtemp()
+        self.original_dir = os.getcwd()
+        os.chdir(self.temp_dir)
+
+    def tearDown(self):
+        os.chdir(self.original_dir)
+        shutil.rmtree(self.temp_dir)
+
+    def _read_rows(self):
+        dump_filename = [name for name in os.listdir('data') if name.endswith('.csv')][0]
+        with io.open(os.path.join('data', dump_filename), encoding='utf-8') as dump_file:
+            return dump_file.read().splitlines()[1:]
+
+    def test_count_visits_and_participants_for_each_page_type(self):
+        _create_page_type("tutorial.com", "Tutorial")
+        _create_page_type("forum.com", "Forum")
+        _create_page_type("forum.com/thread", "Forum")
+
+        # Visits from an earlier computation shouldn't be counted.
+        create_location_visit(compute_index=0, user_id=1, standard_url="tutorial.com")
+        create_location_visit(compute_index=0, user_id=1, standard_url="forum.com")
+
+        create_location_visit(compute_index=1, user_id=1, standard_url="tutorial.com")
+        create_location_visit(compute_index=1, user_id=1, standard_url="tutorial.com")
+        create_location_visit(compute_index=1, user_id=2, standard_url="tutorial.com")
+        create_location_visit(compute_index=1, user_id=2, standard_url="forum.com")
+        create_location_visit(compute_index=1, user_id=2, standard_url="forum.com/thread")
+
+        page_type_visits.main()
+        self.assertEqual(self._read_rows(), [
+            '1,"Forum",2,1',
+            '1,"Tutorial",3,2',
+        ])
+
+    def test_skip_visits_to_pages_without_a_page_type(self):
+        _create_page_type("tutorial.com", "Tutorial")
+        create_location_visit(compute_index=0, user_id=1, standard_url="tutorial.com")
+        create_location_visit(compute_index=0, user_id=2, standard_url="unknown.com")
+        create_location_visit(compute_index=0, user_id=3, standard_url=None)
+
+        page_type_visits.main()
+        self.assertEqual(self._read_rows(), ['0,"Tutorial",1,1'])
@@ -0,0 +1,63 @@
+#! /usr/bin/env python
+# -*- coding: utf-8 -*-
+
+from __future__ import unicode_literals
+import logging
+import unittest
+import tempfile
+import shutil
+import json
+import os
+import os.path
+
+from dump._page_types import load_page_type_lookup, SNAPSHOT_EXTENSION
+
+
+logger = logging.getLogger('data')
+PAGE_TYPE_LOOKUP = {
+    "page1": {"main_type": "page_type_1", "redirect": False},
+}
+
+
+class LoadPageTypeLookupTest(unittest.TestCase):
+
+    def setUp(self):
+        self.temp_dir = tempfile.mkdtemp()
+        self.filename = os.path.join(self.temp_dir, 'page_types.json')
+        self._write_lookup(PAGE_TYPE_LOOKUP)
+
+    def tearDown(self):
+        shutil.rmtree(self.temp_dir)
+
+    def _write_lookup(self, lookup):
+        with open(self.filename, 'w') as page_types_file:
+            json.dump(lookup, page_types_file)
+
+    def test_load_lookup_and_save_snapshot(self):
+        lookup = load_page_type_lookup(self.filename)
+        self.assertEqual(lookup, PAGE_TYPE_LOOKUP)
+        self.assertTrue(os.path.exists(self.filename + SNAPSHOT_EXTENSION))
+
+    def test_load_lookup_from_snapshot(self):
+        os.utime(self.filename, (1000, 1000))
+        load_page_type_lookup(self.filename)
+        # If the lookup can be loaded after the JSON is made unreadable to the JSON parser
+        # (but with the same modification time and size), it must have come from the snapshot.
+        with open(self.filename, 'r+') as page_types_file:
+            page_types_file.write('!')
+        os.utime(self.filename, (1000, 1000))
+        self.assertEqual(load_page_type_lookup(self.filename), PAGE_TYPE_LOOKUP)
+
+    def test_rebuild_snapshot_when_lookup_changes(self):
+        load_page_type_lookup(self.filename)
+        new_lookup = {"page2": {"main_type": "page_type_2", "redirect": True}}
+        self._write_lookup(new_lookup)
+        # Make sure the modification time differs even on file systems with coarse timestamps
+        stat = os.stat(self.filename)
+        os.utime(self.filename, (stat.st_atime, stat.st_mtime + 10))
+        self.assertEqual(load_page_type_lookup(self.filename), new_lookup)
+
+    def test_rebuild_corrupt_snapshot(self):
+        with open(self.filename + SNAPSHOT_EXTENSION, 'wb') as snapshot_file:
+            snapshot_file.write(b'not a snapshot')
+        self.assertEqual(load_page_type_lookup(self.filename), PAGE_TYPE_LOOKUP)
@@ -0,0 +1,66 @@
+#! /usr/bin/env python
+# -*- coding: utf-8 -*-
+
+from __future__ import unicode_literals
+import logging
+import json
+from peewee import fn
+
+from importers.page_types import import_page_types
+from tests.base import TestCase
+from tests.modelfactory import create_location_visit
+from models import LocationVisit, PageType, TableVersion, get_table_version
+
+
+logger = logging.getLogger('data')
+PAGE_TYPE_LOOKUP = {
+    "page1": {"main_type": "page_type_1", "redirect": False, "types": ["page_type_1", "other"]},
+    "page2": {"main_type": "page_type_2", "redirect": False, "types": ["page_type_2"]},
+    "redirect": {"main_type": "redirect", "redirect": True, "types": ["redirect"]},
+}
+
+
+class ImportPageTypesTest(TestCase):
+
+    def __init__(self, *args, **kwargs):
+        super(self.__class__, self).__init__(
+            [LocationVisit, PageType, TableVersion],
+            *args, **kwargs
+        )
+
+    def test_import_one_record_per_url(self):
+
+        import_page_types(PAGE_TYPE_LOOKUP)
+        self.assertEqual(PageType.select().count(), 3)
+        page_type = PageType.select().where(PageType.url == "page1").first()
+        self.assertEqual(page_type.main_type, "page_type_1")
+        self.assertEqual(page_type.redirect, False)
+        self.assertEqual(json.loads(page_type.types), ["page_type_1", "other"])
+
+    def test_importing_again_replaces_old_page_types(self):
+
+        import_page_types(PAGE_TYPE_LOOKUP)
+        import_page_types({"page3": {"main_type": "page_type_3", "redirect": False}})
+        self.assertEqual([p.url for p in PageType.select()], ["page3"])
+
+    def test_visits_can_be_grouped_by_page_type_in_database(self):
+
+        import_page_types(PAGE_TYPE_LOOKUP)
+        create_location_visit(user_id=3, standard_url="page1")
+        create_location_visit(user_id=4, standard_url="page1")
+        create_location_visit(user_id=4, standard_url="page2")
+
+        counts = (
+            LocationVisit
+            .select(PageType.main_type, fn.Count(LocationVisit.id))
+            .join(PageType, on=(LocationVisit.standard_url == PageType.url))
+            .group_by(PageType.main_type)
+            .tuples()
+        )
+        self.assertEqual(dict(counts), {"page_type_1": 2, "page_type_2": 1})
+
+    def test_bump_version_of_page_types_each_import(self):
+
+        import_page_types(PAGE_TYPE_LOOKUP)
+        import_page_types(PAGE_TYPE_LOOKUP)
+        self.assertEqual(get_table_version(PageType), 2)
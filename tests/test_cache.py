@@ -0,0 +1,53 @@
+#! /usr/bin/env python
+# -*- coding: utf-8 -*-
+
+from __future__ import unicode_literals
+import logging
+import unittest
+
+from cache import LruCache, lru_cache
+
+
+logger = logging.getLogger('data')
+
+
+class LruCacheTest(unittest.TestCase):
+
+    def test_count_hits_and_misses(self):
+        cache = LruCache(capacity=2)
+        self.assertEqual(cache.lookup('a', lambda: 1), 1)
+        self.assertEqual(cache.lookup('a', lambda: 2), 1)
+        self.assertEqual(cache.hits, 1)
+        self.assertEqual(cache.misses, 1)
+
+    def test_evict_least_recently_used_entry_when_full(self):
+        cache = LruCache(capacity=2)
+        cache.lookup('a', lambda: 1)
+        cache.lookup('b', lambda: 2)
+        # Looking up 'a' makes 'b' the least recently used entry
+        cache.lookup('a', lambda: 1)
+        cache.lookup('c', lambda: 3)
+        self.assertEqual(cache.evictions, 1)
+        self.assertIn('a', cache.entries)
+        self.assertNotIn('b', cache.entries)
+
+    def test_resizing_evicts_entries_that_no_longer_fit(self):
+        cache = LruCache(capacity=3)
+        for key in ['a', 'b', 'c']:
+            cache.lookup(key, lambda: None)
+        cache.resize(1)
+        self.assertEqual(list(cache.entries.keys()), ['c'])
+        self.assertEqual(cache.evictions, 2)
+
+    def test_decorated_function_is_only_called_once_per_argument(self):
+        calls = []
+
+        @lru_cache(10)
+        def double(x):
+            calls.append(x)
+            return x * 2
+
+        self.assertEqual(double(2), 4)
+        self.assertEqual(double(2), 4)
+        self.assertEqual(calls, [2])
+        self.assertEqual(double.cache.hits, 1)
@@ -0,0 +1,91 @@
+#! /usr/bin/env python
+# -*- coding: utf-8 -*-
+
+from __future__ import unicode_literals
+import logging
+import datetime
+from playhouse.test_utils import count_queries
+
+from tests.base import TestCase
+from tests.modelfactory import create_location_event
+from models import LocationEvent, LocationVisit, UniqueUrl, stream_query, BatchInserter,\
+    SQLITE_MAX_VARIABLES
+
+
+logger = logging.getLogger('data')
+
+
+class StreamQueryTest(TestCase):
+
+    def __init__(self, *args, **kwargs):
+        super(self.__class__, self).__init__([LocationEvent], *args, **kwargs)
+
+    def test_stream_all_rows_without_caching_them(self):
+        create_location_event(user_id=1)
+        create_location_event(user_id=2)
+        create_location_event(user_id=3)
+
+        query = LocationEvent.select().order_by(LocationEvent.user_id)
+        user_ids = [event.user_id for event in stream_query(query)]
+        self.assertEqual(user_ids, [1, 2, 3])
+        self.assertEqual(query._qr._result_cache, [])
+
+    def test_stream_tuples(self):
+        create_location_event(user_id=1, url="http://url.com")
+        query = LocationEvent.select(LocationEvent.user_id, LocationEvent.url).tuples()
+        self.assertEqual(list(stream_query(query)), [(1, "http://url.com")])
+
+
+class BatchInserterTest(TestCase):
+
+    def __init__(self, *args, **kwargs):
+        super(self.__class__, self).__init__([UniqueUrl, LocationVisit], *args, **kwargs)
+
+    def _make_row(self, index):
+        return {'compute_index': 0, 'user_id': index, 'url': "http://url.com", 'unique': True}
+
+    def test_flush_remaining_rows_on_exit(self):
+        with BatchInserter(UniqueUrl, batch_size=10) as inserter:
+            for index in range(15):
+                inserter.insert(self._make_row(index))
+            self.assertEqual(UniqueUrl.select().count(), 10)
+        self.assertEqual(UniqueUrl.select().count(), 15)
+        self.assertEqual(inserter.row_count, 15)
+
+    def test_drop_remaining_rows_if_exception_raised(self):
+        with self.assertRaises(ValueError):
+            with BatchInserter(UniqueUrl, batch_size=10) as inserter:
+                inserter.insert(self._make_row(0))
+                raise ValueError()
+        self.assertEqual(UniqueUrl.select().count(), 0)
+
+    def test_split_batch_to_stay_under_variable_limit(self):
+        # Each row binds up to one variable for each of the model's fields.
+        rows_per_query = SQLITE_MAX_VARIABLES // len(UniqueUrl._meta.fields)
+        inserter = BatchInserter(UniqueUrl, batch_size=rows_per_query * 3)
+        for index in range(rows_per_query * 2 + 1):
+            inserter.insert(self._make_row(index))
+        with count_queries(only_select=False) as counter:
+            inserter.flush()
+        self.assertEqual(UniqueUrl.select().count(), rows_per_query * 2 + 1)
+        insert_queries = [query for query in counter.get_queries() if 'INSERT' in query.msg[0]]
+        self.assertEqual(len(insert_queries), 3)
+
+    def test_flush_nothing_without_querying(self):
+        inserter = BatchInserter(UniqueUrl, batch_size=10)
+        with count_queries(only_select=False) as counter:
+            inserter.flush()
+        self.assertEqual(counter.count, 0)
+
+    def test_fill_missing_fields_with_null(self):
+        row = {
+            'compute_index': 0, 'user_id': 0, 'task_index': 1, 'concern_index': 1,
+            'url': "http://url.com", 'tab_id': "1", 'title': "Title",
+            'start': datetime.datetime(2000, 1, 1), 'end': datetime.datetime(2000, 1, 1),
+        }
+        with BatchInserter(LocationVisit, batch_size=10, fill_missing_fields=True) as inserter:
+            inserter.insert(dict(row, user_id=1))
+            inserter.insert(dict(row, user_id=2, page_type="Tutorial"))
+        visits = LocationVisit.select(LocationVisit.user_id, LocationVisit.page_type)\
+            .order_by(LocationVisit.user_id).tuples()
+        self.assertEqual(list(visits), [(1, None), (2, "Tutorial")])